@@ -0,0 +1,32 @@
+"""
+Script de migration : crée l'index (ticket_id, created_at, id) sur comments
+utilisé par la pagination par curseur des commentaires d'un ticket
+"""
+from sqlalchemy import text
+from app.database import engine
+
+
+def migrate_database():
+    """Crée l'index composite des commentaires par ticket"""
+    try:
+        print("Début de la migration...")
+
+        with engine.connect() as conn:
+            conn.execute(text("SET statement_timeout = 0"))
+
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_comments_ticket_created
+                ON comments (ticket_id, created_at, id)
+            """))
+            print("OK - Index 'ix_comments_ticket_created' créé")
+
+            conn.commit()
+
+        print("\nMigration terminée avec succès !")
+
+    except Exception as e:
+        print(f"ERREUR lors de la migration: {e}")
+
+
+if __name__ == "__main__":
+    migrate_database()
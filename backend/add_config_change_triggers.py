@@ -0,0 +1,47 @@
+"""
+Script de migration : ajoute les triggers qui notifient les changements de configuration
+(tables roles, ticket_types, ticket_categories) sur le canal LISTEN/NOTIFY utilisé par app/config_cache.py
+"""
+from sqlalchemy import text
+from app.database import engine
+from app.config_cache import CONFIG_CHANGE_CHANNEL
+
+CONFIG_TABLES = ["roles", "ticket_types", "ticket_categories"]
+
+
+def migrate_database():
+    """Crée la fonction de notification et un trigger par table de configuration"""
+    try:
+        print("Début de la migration...")
+
+        with engine.connect() as conn:
+            conn.execute(text(f"""
+                CREATE OR REPLACE FUNCTION notify_ticket_config_change() RETURNS trigger AS $$
+                BEGIN
+                    PERFORM pg_notify('{CONFIG_CHANGE_CHANNEL}', TG_TABLE_NAME);
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql
+            """))
+            print("OK - Fonction 'notify_ticket_config_change' créée")
+
+            for table in CONFIG_TABLES:
+                trigger_name = f"{table}_config_change"
+                conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger_name} ON {table}"))
+                conn.execute(text(f"""
+                    CREATE TRIGGER {trigger_name}
+                    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+                    FOR EACH STATEMENT EXECUTE FUNCTION notify_ticket_config_change()
+                """))
+                print(f"OK - Trigger '{trigger_name}' créé sur '{table}'")
+
+            conn.commit()
+
+        print("\nMigration terminée avec succès !")
+
+    except Exception as e:
+        print(f"ERREUR lors de la migration: {e}")
+
+
+if __name__ == "__main__":
+    migrate_database()
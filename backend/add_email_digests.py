@@ -0,0 +1,64 @@
+"""
+Script de migration : digests de notifications par email
+- ajoute les colonnes de mode d'envoi sur users (tous les utilisateurs restent en envoi immédiat)
+- crée l'index partiel sur users.email_digest_next_at lu par le job des digests
+- crée l'index (user_id, id) sur notifications
+- date du retour à l'envoi immédiat (email_digest_switched_at), renseignée pour les derniers digests en attente
+"""
+from sqlalchemy import text
+from app.database import engine
+from app.digests import DIGEST_SETTLE_SECONDS
+
+
+def migrate_database():
+    """Ajoute les colonnes et index des digests de notifications"""
+    try:
+        print("Début de la migration...")
+
+        with engine.connect() as conn:
+            conn.execute(text("SET statement_timeout = 0"))
+
+            conn.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS email_digest_mode VARCHAR(20) NOT NULL DEFAULT 'immediate'"))
+            conn.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS email_digest_interval_minutes INTEGER"))
+            conn.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS email_digest_next_at TIMESTAMP"))
+            conn.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS email_digest_last_notification_id INTEGER NOT NULL DEFAULT 0"))
+            conn.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS email_digest_switched_at TIMESTAMP"))
+            print("OK - Colonnes de digest ajoutées à 'users'")
+
+            # Derniers digests planifiés avant l'ajout de la colonne : le changement de mode date de
+            # DIGEST_SETTLE_SECONDS avant leur échéance
+            result = conn.execute(
+                text("""
+                    UPDATE users
+                    SET email_digest_switched_at = email_digest_next_at - make_interval(secs => :settle)
+                    WHERE email_digest_mode = 'immediate'
+                      AND email_digest_next_at IS NOT NULL
+                      AND email_digest_switched_at IS NULL
+                """),
+                {"settle": DIGEST_SETTLE_SECONDS},
+            )
+            print(f"OK - Date de changement de mode renseignée pour {result.rowcount} dernier(s) digest(s) en attente")
+
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_users_email_digest_next_at
+                ON users (email_digest_next_at)
+                WHERE email_digest_next_at IS NOT NULL
+            """))
+            print("OK - Index 'ix_users_email_digest_next_at' créé")
+
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_notifications_user_id_id
+                ON notifications (user_id, id)
+            """))
+            print("OK - Index 'ix_notifications_user_id_id' créé")
+
+            conn.commit()
+
+        print("\nMigration terminée avec succès !")
+
+    except Exception as e:
+        print(f"ERREUR lors de la migration: {e}")
+
+
+if __name__ == "__main__":
+    migrate_database()
@@ -0,0 +1,70 @@
+"""
+Script de migration : ajoute la colonne status à la table reports
+(génération asynchrone des rapports : pending, running, done, failed)
+la colonne started_at (réservation par un worker, reprise des générations abandonnées)
+et l'index unique partiel qui interdit deux générations actives pour un même type et une même période
+"""
+from sqlalchemy import text
+from app.database import engine
+
+
+def migrate_database():
+    """Ajoute la colonne status à la table reports"""
+    try:
+        print("Début de la migration...")
+
+        with engine.connect() as conn:
+            result = conn.execute(text("""
+                SELECT column_name
+                FROM information_schema.columns
+                WHERE table_name = 'reports' AND column_name = 'status'
+            """))
+            columns = [row[0] for row in result]
+
+            if 'status' not in columns:
+                print("Ajout de la colonne 'status' dans la table 'reports'...")
+                # Les rapports existants sont considérés comme générés
+                conn.execute(text("""
+                    ALTER TABLE reports
+                    ADD COLUMN status VARCHAR(20) NOT NULL DEFAULT 'done'
+                """))
+                conn.execute(text("ALTER TABLE reports ALTER COLUMN status SET DEFAULT 'pending'"))
+                conn.commit()
+                print("OK - Colonne 'status' ajoutée dans 'reports'")
+            else:
+                print("OK - La colonne 'status' existe déjà dans 'reports'")
+
+            conn.execute(text("ALTER TABLE reports ADD COLUMN IF NOT EXISTS started_at TIMESTAMP NULL"))
+            conn.commit()
+            print("OK - Colonne 'started_at' présente dans 'reports'")
+
+            # Doublons actifs antérieurs à l'index : seule la demande la plus récente est conservée
+            conn.execute(text("""
+                UPDATE reports r
+                SET status = 'failed'
+                WHERE r.status IN ('pending', 'running')
+                  AND EXISTS (
+                      SELECT 1 FROM reports o
+                      WHERE o.report_type = r.report_type
+                        AND o.period_start = r.period_start
+                        AND o.period_end = r.period_end
+                        AND o.status IN ('pending', 'running')
+                        AND o.id > r.id
+                  )
+            """))
+            conn.execute(text("""
+                CREATE UNIQUE INDEX IF NOT EXISTS uq_reports_active_period
+                ON reports (report_type, period_start, period_end)
+                WHERE status IN ('pending', 'running')
+            """))
+            conn.commit()
+            print("OK - Index 'uq_reports_active_period' présent sur 'reports'")
+
+        print("\nMigration terminée avec succès !")
+
+    except Exception as e:
+        print(f"ERREUR lors de la migration: {e}")
+
+
+if __name__ == "__main__":
+    migrate_database()
@@ -0,0 +1,85 @@
+"""
+Script de migration : crée la table scheduled_actions et planifie les actions des tickets déjà résolus
+
+Pour chaque ticket au statut RESOLU, les rappels déjà envoyés (notifications existantes) ne sont pas
+replanifiés ; parmi les rappels dont l'échéance est passée, seul le plus récent est planifié
+(immédiatement), comme le faisait l'ancien passage horaire. La clôture automatique est planifiée
+à J+14 (immédiatement si cette date est dépassée).
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from app import models
+from app.database import SessionLocal, engine
+from app.scheduler import REMINDERS, RESOLUTION_ACTIONS
+
+
+def migrate_database():
+    """Crée la table scheduled_actions et planifie les actions des tickets résolus"""
+    try:
+        print("Début de la migration...")
+
+        models.ScheduledAction.__table__.create(bind=engine, checkfirst=True)
+        print("OK - Table 'scheduled_actions' créée")
+
+        db = SessionLocal()
+        try:
+            db.execute(text("SET statement_timeout = 0"))
+            now = datetime.utcnow()
+            already_scheduled = {
+                ticket_id
+                for (ticket_id,) in db.query(models.ScheduledAction.ticket_id).distinct()
+            }
+            tickets = (
+                db.query(models.Ticket)
+                .filter(models.Ticket.status == models.TicketStatus.RESOLU)
+                .all()
+            )
+            sent = {}
+            for ticket_id, notification_type in (
+                db.query(models.Notification.ticket_id, models.Notification.type)
+                .filter(models.Notification.type.in_([reminder[1] for reminder in REMINDERS.values()]))
+            ):
+                sent.setdefault(ticket_id, set()).add(notification_type)
+
+            count = 0
+            for ticket in tickets:
+                if ticket.id in already_scheduled:
+                    continue
+                resolved_at = ticket.resolved_at or now
+                past_reminder = None
+                planned = []
+                for action_type, days in RESOLUTION_ACTIONS:
+                    due_at = resolved_at + timedelta(days=days)
+                    if action_type in REMINDERS:
+                        if REMINDERS[action_type][1] in sent.get(ticket.id, set()):
+                            continue
+                        if due_at <= now:
+                            past_reminder = action_type
+                            continue
+                    planned.append((action_type, max(due_at, now)))
+                # Le rappel en retard passe avant une éventuelle clôture échue (même échéance, id plus petit)
+                if past_reminder is not None:
+                    planned.insert(0, (past_reminder, now))
+                for action_type, due_at in planned:
+                    db.add(models.ScheduledAction(
+                        action_type=action_type,
+                        ticket_id=ticket.id,
+                        due_at=due_at,
+                        state="pending",
+                    ))
+                count += len(planned)
+            db.commit()
+            print(f"OK - {count} action(s) planifiée(s) pour {len(tickets)} ticket(s) résolu(s)")
+        finally:
+            db.close()
+
+        print("\nMigration terminée avec succès !")
+
+    except Exception as e:
+        print(f"ERREUR lors de la migration: {e}")
+
+
+if __name__ == "__main__":
+    migrate_database()
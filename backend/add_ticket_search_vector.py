@@ -0,0 +1,109 @@
+"""
+Script de migration : recherche plein texte des tickets
+
+- ajoute la colonne tickets.search_vector (tsvector, configuration 'french')
+- crée les triggers qui la maintiennent à jour : titre (poids A), description (poids B)
+  et contenu des commentaires (poids C)
+- remplit la colonne pour les tickets existants
+- crée l'index GIN utilisé par GET /tickets/search
+
+Une colonne GENERATED ne peut pas référencer la table comments : le vecteur est donc
+maintenu par triggers plutôt que par une colonne générée.
+"""
+from sqlalchemy import text
+from app.database import engine
+
+
+def migrate_database():
+    """Ajoute la colonne search_vector, ses triggers et son index GIN"""
+    try:
+        print("Début de la migration...")
+
+        with engine.connect() as conn:
+            # Les opérations de remplissage et d'indexation peuvent dépasser le statement_timeout par défaut
+            conn.execute(text("SET statement_timeout = 0"))
+
+            conn.execute(text("ALTER TABLE tickets ADD COLUMN IF NOT EXISTS search_vector tsvector"))
+            print("OK - Colonne 'search_vector' présente dans 'tickets'")
+
+            conn.execute(text("""
+                CREATE OR REPLACE FUNCTION ticket_search_document(p_ticket_id INTEGER) RETURNS tsvector AS $$
+                    SELECT
+                        setweight(to_tsvector('french', coalesce(t.title, '')), 'A')
+                        || setweight(to_tsvector('french', coalesce(t.description, '')), 'B')
+                        || setweight(to_tsvector('french', coalesce(
+                            (SELECT string_agg(c.content, ' ') FROM comments c WHERE c.ticket_id = t.id), ''
+                        )), 'C')
+                    FROM tickets t
+                    WHERE t.id = p_ticket_id
+                $$ LANGUAGE sql STABLE
+            """))
+
+            # Tickets : recalcul avant écriture quand le titre ou la description change
+            conn.execute(text("""
+                CREATE OR REPLACE FUNCTION tickets_search_vector_update() RETURNS trigger AS $$
+                BEGIN
+                    NEW.search_vector :=
+                        setweight(to_tsvector('french', coalesce(NEW.title, '')), 'A')
+                        || setweight(to_tsvector('french', coalesce(NEW.description, '')), 'B')
+                        || setweight(to_tsvector('french', coalesce(
+                            (SELECT string_agg(c.content, ' ') FROM comments c WHERE c.ticket_id = NEW.id), ''
+                        )), 'C');
+                    RETURN NEW;
+                END;
+                $$ LANGUAGE plpgsql
+            """))
+            conn.execute(text("DROP TRIGGER IF EXISTS tickets_search_vector_trigger ON tickets"))
+            conn.execute(text("""
+                CREATE TRIGGER tickets_search_vector_trigger
+                BEFORE INSERT OR UPDATE OF title, description ON tickets
+                FOR EACH ROW EXECUTE FUNCTION tickets_search_vector_update()
+            """))
+            print("OK - Trigger 'tickets_search_vector_trigger' créé")
+
+            # Commentaires : recalcul du vecteur du ticket concerné
+            conn.execute(text("""
+                CREATE OR REPLACE FUNCTION comments_search_vector_update() RETURNS trigger AS $$
+                BEGIN
+                    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                        UPDATE tickets SET search_vector = ticket_search_document(OLD.ticket_id)
+                        WHERE id = OLD.ticket_id;
+                    END IF;
+                    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                        UPDATE tickets SET search_vector = ticket_search_document(NEW.ticket_id)
+                        WHERE id = NEW.ticket_id;
+                    END IF;
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql
+            """))
+            conn.execute(text("DROP TRIGGER IF EXISTS comments_search_vector_trigger ON comments"))
+            conn.execute(text("""
+                CREATE TRIGGER comments_search_vector_trigger
+                AFTER INSERT OR UPDATE OF content, ticket_id OR DELETE ON comments
+                FOR EACH ROW EXECUTE FUNCTION comments_search_vector_update()
+            """))
+            print("OK - Trigger 'comments_search_vector_trigger' créé")
+
+            result = conn.execute(text("""
+                UPDATE tickets SET search_vector = ticket_search_document(id)
+                WHERE search_vector IS NULL
+            """))
+            print(f"OK - {result.rowcount} tickets indexés")
+
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_tickets_search_vector
+                ON tickets USING gin (search_vector)
+            """))
+            print("OK - Index GIN 'ix_tickets_search_vector' créé")
+
+            conn.commit()
+
+        print("\nMigration terminée avec succès !")
+
+    except Exception as e:
+        print(f"ERREUR lors de la migration: {e}")
+
+
+if __name__ == "__main__":
+    migrate_database()
@@ -0,0 +1,101 @@
+"""
+Script de migration : moteur SLA
+- crée la table sla_policies et y insère les objectifs par défaut
+- ajoute les colonnes SLA sur tickets et l'index partiel sur sla_next_check_at
+- calcule les échéances des tickets ouverts existants (les alertes déjà échues sont marquées
+  comme émises pour ne pas notifier rétroactivement tout l'historique)
+"""
+from datetime import datetime
+
+from sqlalchemy import text
+
+from app import models
+from app.database import SessionLocal, engine
+from app.sla import (
+    DEFAULT_SLA_TARGETS,
+    RESOLUTION_PENDING_STATUSES,
+    apply_sla_deadlines,
+    next_sla_check,
+    pending_sla_events,
+)
+
+
+def migrate_database():
+    """Crée la table sla_policies, les colonnes SLA des tickets, puis calcule les échéances existantes"""
+    try:
+        print("Début de la migration...")
+
+        models.SlaPolicy.__table__.create(bind=engine, checkfirst=True)
+        print("OK - Table 'sla_policies' créée")
+
+        with engine.connect() as conn:
+            conn.execute(text("SET statement_timeout = 0"))
+
+            for priority, (response_minutes, resolution_minutes) in DEFAULT_SLA_TARGETS.items():
+                conn.execute(
+                    text("""
+                        INSERT INTO sla_policies (priority, type, response_minutes, resolution_minutes, updated_at)
+                        SELECT :priority, NULL, :response_minutes, :resolution_minutes, now()
+                        WHERE NOT EXISTS (
+                            SELECT 1 FROM sla_policies WHERE priority = :priority AND type IS NULL
+                        )
+                    """),
+                    {
+                        "priority": priority.name,
+                        "response_minutes": response_minutes,
+                        "resolution_minutes": resolution_minutes,
+                    },
+                )
+            print("OK - Objectifs SLA par défaut insérés")
+
+            conn.execute(text("ALTER TABLE tickets ADD COLUMN IF NOT EXISTS sla_response_due_at TIMESTAMP"))
+            conn.execute(text("ALTER TABLE tickets ADD COLUMN IF NOT EXISTS sla_resolution_due_at TIMESTAMP"))
+            conn.execute(text("ALTER TABLE tickets ADD COLUMN IF NOT EXISTS sla_next_check_at TIMESTAMP"))
+            conn.execute(text("ALTER TABLE tickets ADD COLUMN IF NOT EXISTS sla_notified INTEGER NOT NULL DEFAULT 0"))
+            print("OK - Colonnes SLA ajoutées à 'tickets'")
+
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_tickets_sla_next_check_at
+                ON tickets (sla_next_check_at)
+                WHERE sla_next_check_at IS NOT NULL
+            """))
+            print("OK - Index 'ix_tickets_sla_next_check_at' créé")
+
+            conn.commit()
+
+        # Échéances des tickets ouverts existants
+        db = SessionLocal()
+        try:
+            db.execute(text("SET statement_timeout = 0"))
+            now = datetime.utcnow()
+            count = 0
+            tickets = (
+                db.query(models.Ticket)
+                .filter(
+                    models.Ticket.status.in_(RESOLUTION_PENDING_STATUSES),
+                    models.Ticket.sla_resolution_due_at.is_(None),
+                )
+                .all()
+            )
+            for ticket in tickets:
+                apply_sla_deadlines(ticket)
+                notified = 0
+                for due, bit in pending_sla_events(ticket):
+                    if due <= now:
+                        notified |= bit
+                ticket.sla_notified = notified
+                ticket.sla_next_check_at = next_sla_check(ticket)
+                count += 1
+            db.commit()
+            print(f"OK - Échéances calculées pour {count} ticket(s) ouvert(s)")
+        finally:
+            db.close()
+
+        print("\nMigration terminée avec succès !")
+
+    except Exception as e:
+        print(f"ERREUR lors de la migration: {e}")
+
+
+if __name__ == "__main__":
+    migrate_database()
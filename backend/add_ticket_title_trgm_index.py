@@ -0,0 +1,35 @@
+"""
+Script de migration : active l'extension pg_trgm et crée l'index trigramme sur tickets.title
+utilisé par la détection des doublons à la création d'un ticket
+"""
+from sqlalchemy import text
+from app.database import engine
+
+
+def migrate_database():
+    """Crée l'extension pg_trgm et l'index GIN trigramme sur le titre des tickets"""
+    try:
+        print("Début de la migration...")
+
+        with engine.connect() as conn:
+            conn.execute(text("SET statement_timeout = 0"))
+
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            print("OK - Extension 'pg_trgm' activée")
+
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_tickets_title_trgm
+                ON tickets USING gin (title gin_trgm_ops)
+            """))
+            print("OK - Index 'ix_tickets_title_trgm' créé")
+
+            conn.commit()
+
+        print("\nMigration terminée avec succès !")
+
+    except Exception as e:
+        print(f"ERREUR lors de la migration: {e}")
+
+
+if __name__ == "__main__":
+    migrate_database()
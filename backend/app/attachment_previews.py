@@ -0,0 +1,126 @@
+"""
+Génération asynchrone des miniatures et aperçus des pièces jointes image
+
+Après l'envoi d'une image, un job est soumis à un pool de threads dédié. Les fichiers dérivés sont
+stockés à côté des originaux et adressés par l'empreinte SHA-256 de l'original : le job est
+idempotent (rien n'est régénéré si les fichiers existent déjà) et une même image envoyée plusieurs
+fois n'est traitée qu'une fois. Une fois générés, les variants disponibles sont enregistrés dans
+l'entrée JSONB de la pièce jointe (clé "previews").
+"""
+import os
+import tempfile
+import threading
+import warnings
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List
+
+from .attachments import patch_attachment, storage
+from .database import SessionLocal
+
+PREVIEW_WORKERS = int(os.getenv("PREVIEW_WORKERS", "2"))
+
+# Au-delà de ce nombre de pixels (en-tête de l'image), aucun aperçu n'est généré : un PNG de quelques
+# centaines de Ko peut déclarer des dimensions dont le décodage occuperait plusieurs Go de mémoire
+PREVIEW_MAX_PIXELS = int(os.getenv("PREVIEW_MAX_PIXELS", "50000000"))
+
+# Variants générés (boîte englobante en pixels), du plus grand au plus petit
+PREVIEW_VARIANTS = {
+    "preview": (1280, 1280),
+    "thumbnail": (256, 256),
+}
+PREVIEW_MEDIA_TYPE = "image/webp"
+
+PREVIEWABLE_CONTENT_TYPES = {"image/png", "image/jpeg", "image/gif", "image/webp", "image/bmp"}
+
+_executor = ThreadPoolExecutor(max_workers=PREVIEW_WORKERS, thread_name_prefix="preview-worker")
+_in_flight: Dict[str, Future] = {}
+_in_flight_lock = threading.Lock()
+
+
+def derived_path(sha256: str, variant: str) -> str:
+    return os.path.join(storage.root, "derived", sha256[:2], sha256[2:4], f"{sha256}.{variant}.webp")
+
+
+def is_previewable(entry: dict) -> bool:
+    return entry.get("content_type") in PREVIEWABLE_CONTENT_TYPES
+
+
+def generate_previews(sha256: str) -> List[str]:
+    """Génère les variants manquants d'une image stockée et renvoie la liste des variants disponibles"""
+    missing = [variant for variant in PREVIEW_VARIANTS if not os.path.isfile(derived_path(sha256, variant))]
+    if not missing:
+        return list(PREVIEW_VARIANTS)
+
+    from PIL import Image, ImageOps
+
+    with warnings.catch_warnings():
+        # Bombe de décompression signalée par Pillow (avertissement par défaut) : le job échoue
+        warnings.simplefilter("error", Image.DecompressionBombWarning)
+        with Image.open(storage.path_for(sha256)) as original:
+            width, height = original.size
+            if width * height > PREVIEW_MAX_PIXELS:
+                print(f"[PREVIEW] Image {sha256} ignorée : {width}x{height} pixels (limite {PREVIEW_MAX_PIXELS})")
+                return []
+            # Décodage JPEG réduit directement à la taille utile (bien plus rapide qu'un décodage complet)
+            original.draft("RGB", PREVIEW_VARIANTS["preview"])
+            image = ImageOps.exif_transpose(original)
+            image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+
+    for variant, box in PREVIEW_VARIANTS.items():
+        # Chaque variant est réduit depuis le précédent (plus grand), pas depuis l'original
+        image.thumbnail(box, Image.Resampling.LANCZOS)
+        if variant not in missing:
+            continue
+        destination = derived_path(sha256, variant)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(destination), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                image.save(tmp, format="WEBP", quality=80, method=4)
+            os.replace(tmp_path, destination)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+    return list(PREVIEW_VARIANTS)
+
+
+def _submit_generation(sha256: str) -> Future:
+    """Un seul job de génération par empreinte, même si plusieurs envois arrivent en même temps"""
+    with _in_flight_lock:
+        future = _in_flight.get(sha256)
+        if future is None:
+            future = _executor.submit(generate_previews, sha256)
+            _in_flight[sha256] = future
+            future.add_done_callback(lambda _: _forget(sha256))
+        return future
+
+
+def _forget(sha256: str) -> None:
+    with _in_flight_lock:
+        _in_flight.pop(sha256, None)
+
+
+def _record_previews(model, row_id: int, attachment_id: str, future: Future) -> None:
+    try:
+        variants = future.result()
+    except Exception as e:
+        print(f"[PREVIEW] Erreur lors de la génération des aperçus de la pièce jointe {attachment_id}: {e}")
+        return
+    db = SessionLocal()
+    try:
+        patch_attachment(db, model, row_id, attachment_id, {"previews": variants})
+        db.commit()
+    except Exception as e:
+        print(f"[PREVIEW] Impossible d'enregistrer les aperçus de la pièce jointe {attachment_id}: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+def schedule_previews(model, row_id: int, entry: dict) -> None:
+    """Planifie la génération des aperçus d'une pièce jointe image puis leur enregistrement dans le JSONB"""
+    if not is_previewable(entry):
+        return
+    future = _submit_generation(entry["sha256"])
+    future.add_done_callback(lambda f: _record_previews(model, row_id, entry["id"], f))
@@ -0,0 +1,174 @@
+"""
+Stockage des pièces jointes (tickets et commentaires)
+
+Les fichiers sont stockés sur le système de fichiers local, adressés par leur empreinte SHA-256 :
+un même fichier envoyé plusieurs fois n'est stocké qu'une seule fois. L'envoi est copié par blocs
+(mémoire constante quelle que soit la taille), haché au fil de l'eau puis renommé atomiquement
+à son emplacement définitif. Les métadonnées sont conservées dans les colonnes JSONB `attachments`.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import uuid
+from datetime import datetime
+from typing import BinaryIO, Optional, Tuple
+
+from sqlalchemy import func, literal, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Session
+from fastapi.responses import JSONResponse
+
+ATTACHMENTS_DIR = os.path.abspath(os.getenv("ATTACHMENTS_DIR", "storage/attachments"))
+MAX_ATTACHMENT_SIZE = int(os.getenv("MAX_ATTACHMENT_SIZE", str(25 * 1024 * 1024)))
+ATTACHMENT_CHUNK_SIZE = 1024 * 1024
+# Marge pour l'enveloppe multipart (délimiteurs, en-têtes de la partie) autour du fichier
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class AttachmentTooLarge(Exception):
+    pass
+
+
+class LocalAttachmentStorage:
+    """Stockage adressé par contenu : <racine>/<sha[:2]>/<sha[2:4]>/<sha>"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.tmp_dir = os.path.join(root, "tmp")
+
+    def path_for(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+
+    def exists(self, sha256: str) -> bool:
+        return os.path.isfile(self.path_for(sha256))
+
+    def save(self, source: BinaryIO, max_size: int = MAX_ATTACHMENT_SIZE) -> Tuple[str, int]:
+        """Copie un flux par blocs dans le stockage et renvoie (sha256, taille)"""
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        tmp = tempfile.NamedTemporaryFile(dir=self.tmp_dir, delete=False)
+        try:
+            with tmp:
+                while True:
+                    chunk = source.read(ATTACHMENT_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_size:
+                        raise AttachmentTooLarge()
+                    digest.update(chunk)
+                    tmp.write(chunk)
+                tmp.flush()
+                os.fsync(tmp.fileno())
+
+            sha256 = digest.hexdigest()
+            destination = self.path_for(sha256)
+            if os.path.isfile(destination):
+                # Déduplication : le contenu est déjà stocké
+                os.unlink(tmp.name)
+            else:
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                os.replace(tmp.name, destination)
+            return sha256, size
+        except BaseException:
+            if os.path.exists(tmp.name):
+                os.unlink(tmp.name)
+            raise
+
+
+storage = LocalAttachmentStorage(ATTACHMENTS_DIR)
+
+
+def build_attachment_entry(
+    sha256: str, size: int, filename: Optional[str], content_type: Optional[str], user_id: int
+) -> dict:
+    """Métadonnées d'une pièce jointe telles que stockées dans la colonne JSONB"""
+    return {
+        "id": uuid.uuid4().hex,
+        "sha256": sha256,
+        "filename": os.path.basename(filename or "") or sha256,
+        "content_type": content_type or "application/octet-stream",
+        "size": size,
+        "uploaded_by": user_id,
+        "uploaded_at": datetime.utcnow().isoformat(),
+    }
+
+
+def append_attachment(db: Session, model, row_id: int, entry: dict) -> int:
+    """
+    Ajoute une entrée au tableau JSONB `attachments` en une seule instruction UPDATE
+    (attachments || [entry]) : deux envois simultanés ne peuvent pas s'écraser.
+    """
+    return (
+        db.query(model)
+        .filter(model.id == row_id)
+        .update(
+            {
+                model.attachments: func.coalesce(model.attachments, text("'[]'::jsonb")).op("||")(
+                    literal([entry], JSONB)
+                )
+            },
+            synchronize_session=False,
+        )
+    )
+
+
+def patch_attachment(db: Session, model, row_id: int, attachment_id: str, patch: dict) -> int:
+    """
+    Fusionne `patch` dans l'entrée `attachment_id` du tableau JSONB, en une seule instruction UPDATE
+    (l'ordre des pièces jointes et les entrées ajoutées entre-temps sont préservés).
+    """
+    result = db.execute(
+        text(
+            f"""
+            UPDATE {model.__tablename__}
+            SET attachments = (
+                SELECT jsonb_agg(
+                    CASE WHEN elem->>'id' = :attachment_id THEN elem || CAST(:patch AS jsonb) ELSE elem END
+                    ORDER BY position
+                )
+                FROM jsonb_array_elements(attachments) WITH ORDINALITY AS t(elem, position)
+            )
+            WHERE id = :row_id AND jsonb_typeof(attachments) = 'array'
+            """
+        ),
+        {"attachment_id": attachment_id, "patch": json.dumps(patch), "row_id": row_id},
+    )
+    return result.rowcount
+
+
+def find_attachment(attachments, attachment_id: str) -> Optional[dict]:
+    for entry in attachments or []:
+        if isinstance(entry, dict) and entry.get("id") == attachment_id:
+            return entry
+    return None
+
+
+class AttachmentUploadLimitMiddleware:
+    """
+    Middleware ASGI : refuse (413) un envoi de pièce jointe dont le Content-Length annoncé dépasse
+    MAX_ATTACHMENT_SIZE, avant que le corps ne soit lu et copié dans un fichier temporaire.
+    Un envoi sans Content-Length (chunked) reste borné par LocalAttachmentStorage.save.
+    """
+
+    def __init__(self, app, max_size: int = MAX_ATTACHMENT_SIZE):
+        self.app = app
+        self.max_body_size = max_size + MULTIPART_OVERHEAD
+        self.max_size = max_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"].endswith("/attachments"):
+            for name, value in scope["headers"]:
+                if name == b"content-length":
+                    if value.isdigit() and int(value) > self.max_body_size:
+                        response = JSONResponse(
+                            {"detail": f"Attachment exceeds the maximum size of {self.max_size} bytes"},
+                            status_code=413,
+                            headers={"Connection": "close"},
+                        )
+                        await response(scope, receive, send)
+                        return
+                    break
+        await self.app(scope, receive, send)
@@ -0,0 +1,205 @@
+"""
+Cache en mémoire (par processus) des tables de configuration : types de tickets, catégories et rôles.
+Il sert aussi de registre des rôles (nom <-> id) pour les contrôles d'accès et les requêtes par rôle.
+
+Ces tables changent très rarement ; elles sont chargées au démarrage puis servies depuis la mémoire.
+La cohérence entre workers est assurée par PostgreSQL : des triggers (voir add_config_change_triggers.py)
+émettent un NOTIFY sur le canal CONFIG_CHANGE_CHANNEL à chaque modification, et chaque processus
+écoute ce canal dans un thread dédié pour recharger son cache.
+"""
+import hashlib
+import json
+import os
+import select
+import threading
+from typing import Dict, FrozenSet, List, Optional
+
+import psycopg2
+import psycopg2.extensions
+from sqlalchemy.orm import Session, joinedload
+
+from . import models, schemas
+from .database import DATABASE_URL, SessionLocal
+
+CONFIG_CHANGE_CHANNEL = "ticket_config_changed"
+
+# Durée de cache côté client : les clients revalident ensuite avec If-None-Match (réponse 304)
+CONFIG_CACHE_MAX_AGE = int(os.getenv("CONFIG_CACHE_MAX_AGE", "3600"))
+
+
+class ConfigCache:
+    """Cache versionné des types, catégories et rôles"""
+
+    def __init__(self):
+        self.version = 0
+        self.etag: Optional[str] = None
+        self._types: List[schemas.TicketTypeConfig] = []
+        self._categories: List[schemas.TicketCategoryConfig] = []
+        self._roles: List[schemas.RoleRead] = []
+        # Registre des rôles : nom -> id et id -> rôle, résolus une fois par rechargement
+        self._role_ids_by_name: Dict[str, int] = {}
+        self._roles_by_id: Dict[int, schemas.RoleRead] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._listener: Optional[threading.Thread] = None
+
+    def reload(self, db: Optional[Session] = None) -> None:
+        """Recharge les trois tables depuis la base et incrémente la version si le contenu a changé"""
+        own_session = db is None
+        if own_session:
+            db = SessionLocal()
+        try:
+            types = [
+                schemas.TicketTypeConfig.model_validate(t)
+                for t in (
+                    db.query(models.TicketTypeModel)
+                    .filter(models.TicketTypeModel.is_active.is_(True))
+                    .order_by(models.TicketTypeModel.label.asc())
+                    .all()
+                )
+            ]
+            categories = [
+                schemas.TicketCategoryConfig(
+                    id=cat.id,
+                    name=cat.name,
+                    description=cat.description,
+                    type_code=cat.ticket_type.code if cat.ticket_type else "",
+                    is_active=cat.is_active,
+                )
+                for cat in (
+                    db.query(models.TicketCategory)
+                    .options(joinedload(models.TicketCategory.ticket_type))
+                    .filter(models.TicketCategory.is_active.is_(True))
+                    .order_by(models.TicketCategory.name.asc())
+                    .all()
+                )
+            ]
+            roles = [
+                schemas.RoleRead.model_validate(r)
+                for r in db.query(models.Role).order_by(models.Role.id.asc()).all()
+            ]
+        finally:
+            if own_session:
+                db.close()
+
+        # L'ETag dépend uniquement du contenu : il est identique sur tous les workers
+        payload = json.dumps(
+            [
+                [t.model_dump() for t in types],
+                [c.model_dump() for c in categories],
+                [r.model_dump() for r in roles],
+            ],
+            sort_keys=True,
+            default=str,
+        )
+        etag = '"' + hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32] + '"'
+
+        with self._lock:
+            self._types = types
+            self._categories = categories
+            self._roles = roles
+            self._role_ids_by_name = {r.name: r.id for r in roles}
+            self._roles_by_id = {r.id: r for r in roles}
+            if etag != self.etag:
+                self.version += 1
+                self.etag = etag
+
+    def _ensure_loaded(self) -> None:
+        # Si le préchargement au démarrage a échoué (base indisponible), charger à la première demande
+        if self.etag is None:
+            self.reload()
+
+    def get_ticket_types(self) -> List[schemas.TicketTypeConfig]:
+        self._ensure_loaded()
+        return self._types
+
+    def get_ticket_categories(self, type_code: Optional[str] = None) -> List[schemas.TicketCategoryConfig]:
+        self._ensure_loaded()
+        categories = self._categories
+        if type_code:
+            return [cat for cat in categories if cat.type_code == type_code]
+        return categories
+
+    def get_roles(self) -> List[schemas.RoleRead]:
+        self._ensure_loaded()
+        return self._roles
+
+    def role_id(self, name: str) -> Optional[int]:
+        """Id du rôle portant ce nom (None si le rôle n'existe pas)"""
+        self._ensure_loaded()
+        return self._role_ids_by_name.get(name)
+
+    def role_ids(self, *names: str) -> FrozenSet[int]:
+        """Ensemble des ids des rôles nommés, pour des tests d'appartenance entiers"""
+        self._ensure_loaded()
+        ids = self._role_ids_by_name
+        return frozenset(ids[name] for name in names if name in ids)
+
+    def get_role(self, role_id: Optional[int]) -> Optional[schemas.RoleRead]:
+        self._ensure_loaded()
+        return self._roles_by_id.get(role_id)
+
+    def role_name(self, role_id: Optional[int]) -> str:
+        role = self.get_role(role_id)
+        return role.name if role else ""
+
+    def cache_headers(self) -> Dict[str, str]:
+        """En-têtes HTTP à renvoyer avec les réponses servies depuis le cache"""
+        self._ensure_loaded()
+        return {
+            "Cache-Control": f"private, max-age={CONFIG_CACHE_MAX_AGE}",
+            "ETag": self.etag,
+            "X-Config-Version": str(self.version),
+        }
+
+    def is_not_modified(self, if_none_match: Optional[str]) -> bool:
+        """Vrai si le client possède déjà la version courante (en-tête If-None-Match)"""
+        if not if_none_match:
+            return False
+        self._ensure_loaded()
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return self.etag in candidates or "*" in candidates
+
+    def start(self) -> None:
+        """Précharge le cache et démarre l'écoute des notifications de changement"""
+        try:
+            self.reload()
+        except Exception as e:
+            print(f"[CONFIG_CACHE] Préchargement impossible, chargement différé: {e}")
+        if self._listener is None or not self._listener.is_alive():
+            self._stop.clear()
+            self._listener = threading.Thread(
+                target=self._listen, name="config-cache-listener", daemon=True
+            )
+            self._listener.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _listen(self) -> None:
+        """Boucle LISTEN sur une connexion dédiée (hors pool) ; se reconnecte en cas d'erreur"""
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(DATABASE_URL, connect_timeout=5)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CONFIG_CHANGE_CHANNEL}")
+                # Des changements ont pu être manqués pendant une déconnexion
+                self.reload()
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], 5) == ([], [], []):
+                        continue
+                    conn.poll()
+                    if conn.notifies:
+                        conn.notifies.clear()
+                        self.reload()
+            except Exception as e:
+                print(f"[CONFIG_CACHE] Erreur d'écoute des notifications: {e}")
+                self._stop.wait(5)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+
+config_cache = ConfigCache()
@@ -0,0 +1,243 @@
+"""
+Digests de notifications par email
+
+Chaque utilisateur choisit son mode d'envoi (User.email_digest_mode) :
+- immediate : un email par événement (comportement historique)
+- interval  : un digest toutes les email_digest_interval_minutes minutes
+- daily     : un digest par jour à DIGEST_DAILY_HOUR (UTC)
+
+En mode digest, les emails d'événement ne lui sont plus envoyés (EmailService.send_rendered consulte
+digest_recipients) : le digest est construit à partir des lignes Notification créées depuis le précédent
+(curseur email_digest_last_notification_id), ce qui remplace des centaines de sessions SMTP par une seule.
+Le curseur n'avance qu'une fois le digest envoyé : en cas d'échec, nouvelle tentative après DIGEST_RETRY_SECONDS.
+
+process_email_digests s'exécute toutes les DIGEST_POLL_SECONDS secondes, ne lit que les utilisateurs dont
+email_digest_next_at est échu (index partiel) et les réserve avec FOR UPDATE SKIP LOCKED.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import models
+from .config_cache import config_cache
+from .database import SessionLocal
+from .email_service import email_service
+
+DIGEST_POLL_SECONDS = int(os.getenv("DIGEST_POLL_SECONDS", "60"))
+DIGEST_BATCH_SIZE = int(os.getenv("DIGEST_BATCH_SIZE", "100"))
+DIGEST_DAILY_HOUR = int(os.getenv("DIGEST_DAILY_HOUR", "7"))  # Heure UTC du digest quotidien
+DIGEST_DEFAULT_INTERVAL_MINUTES = int(os.getenv("DIGEST_DEFAULT_INTERVAL_MINUTES", "60"))
+DIGEST_MAX_ITEMS = int(os.getenv("DIGEST_MAX_ITEMS", "100"))  # Notifications détaillées par digest
+DIGEST_PREFERENCES_CACHE_SECONDS = int(os.getenv("DIGEST_PREFERENCES_CACHE_SECONDS", "60"))
+# Les notifications plus récentes attendent le passage suivant : une transaction encore ouverte peut
+# valider une notification d'id inférieur au curseur
+DIGEST_SETTLE_SECONDS = int(os.getenv("DIGEST_SETTLE_SECONDS", "30"))
+# Délai avant une nouvelle tentative quand l'envoi d'un digest échoue (SMTP indisponible, circuit ouvert)
+DIGEST_RETRY_SECONDS = int(os.getenv("DIGEST_RETRY_SECONDS", "300"))
+
+DIGEST_MODES = ("immediate", "interval", "daily")
+
+DASHBOARD_BY_ROLE = {
+    "DSI": "/dashboard/dsi",
+    "Admin": "/dashboard/dsi",
+    "Secrétaire DSI": "/dashboard/secretary",
+    "Adjoint DSI": "/dashboard/secretary",
+    "Technicien": "/dashboard/technician",
+}
+
+
+def next_digest_at(mode: str, interval_minutes: Optional[int], now: datetime) -> Optional[datetime]:
+    """Date du prochain digest pour un mode d'envoi"""
+    if mode == "interval":
+        return now + timedelta(minutes=interval_minutes or DIGEST_DEFAULT_INTERVAL_MINUTES)
+    if mode == "daily":
+        next_run = now.replace(hour=DIGEST_DAILY_HOUR, minute=0, second=0, microsecond=0)
+        return next_run if next_run > now else next_run + timedelta(days=1)
+    return None
+
+
+def set_digest_mode(db: Session, user: models.User, mode: str, interval_minutes: Optional[int] = None) -> None:
+    """Change le mode d'envoi d'un utilisateur (sans commit)"""
+    now = datetime.utcnow()
+    was_digest = (user.email_digest_mode or "immediate") != "immediate"
+    if mode != "immediate" and not was_digest:
+        # Les notifications existantes ont déjà été envoyées une par une
+        user.email_digest_last_notification_id = (
+            db.query(func.coalesce(func.max(models.Notification.id), 0))
+            .filter(models.Notification.user_id == user.id)
+            .scalar()
+        )
+    user.email_digest_mode = mode
+    user.email_digest_interval_minutes = interval_minutes if mode == "interval" else None
+    if mode == "immediate":
+        if was_digest:
+            # Dernier digest pour les notifications retenues jusqu'au changement de mode, une fois celles-ci
+            # stabilisées (DIGEST_SETTLE_SECONDS) : les plus récentes n'ont pas non plus été envoyées par email
+            user.email_digest_switched_at = now
+            user.email_digest_next_at = now + timedelta(seconds=DIGEST_SETTLE_SECONDS)
+        # Déjà en envoi immédiat : un dernier digest encore en attente est conservé
+    else:
+        user.email_digest_switched_at = None
+        user.email_digest_next_at = next_digest_at(mode, interval_minutes, now)
+    digest_recipients.invalidate()
+
+
+class _DigestRecipients:
+    """Adresses des utilisateurs en mode digest, rechargées au plus toutes les N secondes"""
+
+    def __init__(self):
+        self._emails: Set[str] = set()
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        self._loaded_at = 0.0
+
+    def immediate_only(self, to_emails: List[str]) -> List[str]:
+        """Retire les destinataires qui reçoivent leurs notifications en digest"""
+        if time.monotonic() - self._loaded_at > DIGEST_PREFERENCES_CACHE_SECONDS:
+            self._reload()
+        if not self._emails:
+            return to_emails
+        return [email for email in to_emails if not email or email.strip().lower() not in self._emails]
+
+    def _reload(self) -> None:
+        with self._lock:
+            db = SessionLocal()
+            try:
+                self._emails = {
+                    email.strip().lower()
+                    for (email,) in db.query(models.User.email).filter(
+                        models.User.email_digest_mode != "immediate",
+                        models.User.actif == True
+                    )
+                    if email
+                }
+            except Exception as e:
+                print(f"[DIGEST] Impossible de charger les préférences d'envoi, envoi immédiat pour tous: {e}")
+            finally:
+                db.close()
+            self._loaded_at = time.monotonic()
+
+
+digest_recipients = _DigestRecipients()
+
+
+def register_digest_filter() -> None:
+    email_service.recipient_filter = digest_recipients.immediate_only
+
+
+# --- Construction des digests -----------------------------------------------------------------------
+
+def _digest_email(user: models.User, notifications: List[models.Notification], total: int) -> Callable[[], bool]:
+    role = config_cache.role_name(user.role_id)
+    items = [
+        {
+            "time": notification.created_at.strftime("%d/%m %H:%M") if notification.created_at else "",
+            "message": notification.message,
+        }
+        for notification in notifications[-DIGEST_MAX_ITEMS:]
+    ]
+    rendered = email_service.render(
+        "notification_digest",
+        role=role,
+        recipient_name=user.full_name,
+        items=items,
+        total=total,
+        dashboard=DASHBOARD_BY_ROLE.get(role, "/dashboard/user"),
+    )
+    # Envoi confirmé même avec le transport asynchrone : le curseur n'avance qu'une fois le digest remis
+    return lambda: email_service.send_rendered([user.email], rendered, digestible=False, wait_delivery=True)
+
+
+def process_email_digests() -> int:
+    """Envoie les digests échus ; renvoie le nombre de digests envoyés"""
+    db: Session = SessionLocal()
+    sent = 0
+    failed = 0
+    try:
+        while True:
+            now = datetime.utcnow()
+            users = (
+                db.query(models.User)
+                .filter(models.User.email_digest_next_at <= now)
+                .order_by(models.User.email_digest_next_at)
+                .limit(DIGEST_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            if not users:
+                break
+
+            # Une seule requête pour les notifications en attente de tout le lot (index user_id, id)
+            settled_before = now - timedelta(seconds=DIGEST_SETTLE_SECONDS)
+            pending: Dict[int, List[models.Notification]] = {}
+            for notification in (
+                db.query(models.Notification)
+                .join(models.User, models.User.id == models.Notification.user_id)
+                .filter(
+                    models.Notification.user_id.in_([user.id for user in users]),
+                    models.Notification.id > models.User.email_digest_last_notification_id,
+                    models.Notification.created_at <= settled_before,
+                )
+                .order_by(models.Notification.user_id, models.Notification.id)
+            ):
+                pending.setdefault(notification.user_id, []).append(notification)
+
+            # (utilisateur, dernière notification couverte, envoi) : le curseur n'avance qu'après l'envoi
+            emails: List[Tuple[int, int, Callable[[], bool]]] = []
+            for user in users:
+                notifications = pending.get(user.id, [])
+                if user.email_digest_mode == "immediate":
+                    # Dernier digest : seules les notifications antérieures au changement de mode ont été
+                    # retenues, les suivantes sont déjà parties une par une (échéance décalée par les nouvelles
+                    # tentatives : la date du changement de mode est conservée à part)
+                    switched_at = user.email_digest_switched_at
+                    notifications = [notification for notification in notifications if notification.created_at <= switched_at]
+                if notifications:
+                    # Les notifications déjà lues dans l'application ne sont pas renvoyées
+                    unread = [notification for notification in notifications if not notification.read]
+                    if unread and user.actif and user.email and user.email.strip() and email_service.email_enabled:
+                        emails.append((user.id, notifications[-1].id, _digest_email(user, unread, len(unread))))
+                    else:
+                        user.email_digest_last_notification_id = notifications[-1].id
+                user.email_digest_next_at = next_digest_at(
+                    user.email_digest_mode, user.email_digest_interval_minutes, now
+                )
+            # Prochaines échéances enregistrées (et verrous libérés) avant les envois
+            db.commit()
+
+            for user_id, last_notification_id, send in emails:
+                query = db.query(models.User).filter(models.User.id == user_id)
+                if send():
+                    sent += 1
+                    # Sans reculer un curseur avancé entre-temps (changement de mode d'envoi)
+                    query.filter(models.User.email_digest_last_notification_id < last_notification_id).update(
+                        {"email_digest_last_notification_id": last_notification_id}, synchronize_session=False
+                    )
+                else:
+                    # Curseur inchangé : les mêmes notifications seront renvoyées à la prochaine tentative
+                    failed += 1
+                    query.update(
+                        {"email_digest_next_at": datetime.utcnow() + timedelta(seconds=DIGEST_RETRY_SECONDS)},
+                        synchronize_session=False,
+                    )
+                db.commit()
+
+            if len(users) < DIGEST_BATCH_SIZE:
+                break
+        if sent:
+            print(f"[DIGEST] {sent} digest(s) envoyé(s)")
+        if failed:
+            print(f"[DIGEST] {failed} digest(s) non envoyé(s), nouvelle tentative dans {DIGEST_RETRY_SECONDS} s")
+    except Exception as e:
+        print(f"[DIGEST] Erreur lors de l'envoi des digests: {e}")
+        db.rollback()
+    finally:
+        db.close()
+    return sent
@@ -0,0 +1,360 @@
+"""
+Assignation automatique des nouveaux tickets (optionnelle, AUTO_DISPATCH_ENABLED=true)
+
+Un nouveau ticket est assigné au technicien actif le moins chargé dont la spécialisation correspond
+au type ou à la catégorie du ticket (les techniciens sans spécialisation acceptent tous les tickets)
+et dont la charge est inférieure à sa capacité (User.max_tickets_capacity).
+
+La charge de chaque technicien (tickets ASSIGNE_TECHNICIEN / EN_COURS) est tenue en mémoire dans
+des tas (un par spécialisation). Elle est maintenue par des listeners de session : toute écriture
+qui change le technicien ou le statut d'un ticket (assign, reassign, assign-bulk, changements de
+statut, validation, clôture...) est répercutée au commit, sans appel explicite depuis les endpoints.
+Un resync complet depuis la base est fait au démarrage puis périodiquement (écritures faites par
+d'autres processus ou par des UPDATE en masse).
+"""
+import heapq
+import os
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+
+from . import models
+from .config_cache import config_cache
+from .database import SessionLocal
+
+AUTO_DISPATCH_ENABLED = os.getenv("AUTO_DISPATCH_ENABLED", "false").lower() == "true"
+# Capacité appliquée aux techniciens sans max_tickets_capacity (0 = illimitée)
+DISPATCH_DEFAULT_CAPACITY = int(os.getenv("DISPATCH_DEFAULT_CAPACITY", "0"))
+DISPATCH_RESYNC_MINUTES = int(os.getenv("DISPATCH_RESYNC_MINUTES", "5"))
+
+LOAD_STATUSES = (models.TicketStatus.ASSIGNE_TECHNICIEN, models.TicketStatus.EN_COURS)
+
+# Clé du groupe des techniciens sans spécialisation
+GENERALIST_POOL = ""
+
+
+def pool_key(value: Optional[str]) -> str:
+    return (value or "").strip().lower()
+
+
+class _Technician:
+    __slots__ = ("id", "pool", "capacity", "load")
+
+    def __init__(self, technician_id: int, pool: str, capacity: int, load: int = 0):
+        self.id = technician_id
+        self.pool = pool
+        self.capacity = capacity
+        self.load = load
+
+    def has_room(self) -> bool:
+        return not self.capacity or self.load < self.capacity
+
+
+class TechnicianLoadBoard:
+    """
+    Charge des techniciens, indexée par spécialisation.
+
+    Chaque groupe est un tas de (charge, id) à invalidation paresseuse : un changement de charge
+    pousse une nouvelle entrée, les entrées périmées sont écartées quand elles arrivent au sommet.
+    Un technicien à pleine capacité n'a aucune entrée valide et n'est jamais examiné.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._technicians: Dict[int, _Technician] = {}
+        self._heaps: Dict[str, List[Tuple[int, int]]] = {}
+        self._pool_sizes: Counter = Counter()
+
+    # --- Mise à jour -------------------------------------------------------------------------
+
+    def reset(self, technicians: Iterable[Tuple[int, Optional[str], Optional[int]]], loads: Dict[int, int]) -> None:
+        """Remplace tout l'état : technicians = (id, specialization, max_tickets_capacity)"""
+        with self._lock:
+            self._technicians = {}
+            self._heaps = {}
+            self._pool_sizes = Counter()
+            for technician_id, specialization, capacity in technicians:
+                self._add(technician_id, specialization, capacity, loads.get(technician_id, 0))
+
+    def upsert_technician(self, technician_id: int, specialization: Optional[str], capacity: Optional[int]) -> None:
+        with self._lock:
+            current = self._technicians.pop(technician_id, None)
+            load = 0
+            if current is not None:
+                self._pool_sizes[current.pool] -= 1
+                load = current.load
+            self._add(technician_id, specialization, capacity, load)
+
+    def remove_technician(self, technician_id: int) -> None:
+        with self._lock:
+            current = self._technicians.pop(technician_id, None)
+            if current is not None:
+                self._pool_sizes[current.pool] -= 1
+
+    def apply_deltas(self, deltas: Dict[int, int]) -> None:
+        """Applique des variations de charge (technician_id -> +n / -n)"""
+        with self._lock:
+            for technician_id, delta in deltas.items():
+                technician = self._technicians.get(technician_id)
+                if technician is None or not delta:
+                    continue
+                technician.load = max(technician.load + delta, 0)
+                self._push(technician)
+
+    # --- Sélection -----------------------------------------------------------------------------
+
+    def acquire(self, pools: Iterable[str]) -> Optional[int]:
+        """
+        Choisit le technicien le moins chargé (sous sa capacité) parmi les groupes donnés
+        et réserve immédiatement une unité de charge. Renvoie None si aucun n'est disponible.
+        """
+        with self._lock:
+            best: Optional[_Technician] = None
+            for pool in set(pools):
+                candidate = self._peek(pool)
+                if candidate is not None and (best is None or (candidate.load, candidate.id) < (best.load, best.id)):
+                    best = candidate
+            if best is None:
+                return None
+            best.load += 1
+            self._push(best)
+            return best.id
+
+    def release(self, technician_id: int) -> None:
+        """Annule une réservation faite par acquire() (transaction annulée)"""
+        self.apply_deltas({technician_id: -1})
+
+    def load_of(self, technician_id: int) -> Optional[int]:
+        technician = self._technicians.get(technician_id)
+        return technician.load if technician else None
+
+    def snapshot(self) -> List[dict]:
+        with self._lock:
+            return [
+                {"technician_id": t.id, "pool": t.pool, "load": t.load, "capacity": t.capacity or None}
+                for t in sorted(self._technicians.values(), key=lambda t: (t.load, t.id))
+            ]
+
+    # --- Interne (appelé sous verrou) ------------------------------------------------------------
+
+    def _add(self, technician_id: int, specialization: Optional[str], capacity: Optional[int], load: int) -> None:
+        technician = _Technician(
+            technician_id,
+            pool_key(specialization),
+            capacity if capacity is not None else DISPATCH_DEFAULT_CAPACITY,
+            load,
+        )
+        self._technicians[technician_id] = technician
+        self._pool_sizes[technician.pool] += 1
+        self._push(technician)
+
+    def _push(self, technician: _Technician) -> None:
+        if not technician.has_room():
+            return
+        heap = self._heaps.setdefault(technician.pool, [])
+        heapq.heappush(heap, (technician.load, technician.id))
+        # Compaction quand les entrées périmées dominent
+        if len(heap) > 4 * self._pool_sizes[technician.pool] + 64:
+            self._compact(technician.pool)
+
+    def _compact(self, pool: str) -> None:
+        heap = [
+            (t.load, t.id)
+            for t in self._technicians.values()
+            if t.pool == pool and t.has_room()
+        ]
+        heapq.heapify(heap)
+        self._heaps[pool] = heap
+
+    def _peek(self, pool: str) -> Optional[_Technician]:
+        heap = self._heaps.get(pool)
+        while heap:
+            load, technician_id = heap[0]
+            technician = self._technicians.get(technician_id)
+            if technician is not None and technician.pool == pool and technician.load == load and technician.has_room():
+                return technician
+            heapq.heappop(heap)
+        return None
+
+
+load_board = TechnicianLoadBoard()
+
+
+def candidate_pools(ticket: models.Ticket) -> List[str]:
+    """Groupes de techniciens pouvant traiter le ticket : type, catégorie et généralistes"""
+    ticket_type = ticket.type.value if isinstance(ticket.type, models.TicketType) else ticket.type
+    pools = [pool_key(ticket_type), GENERALIST_POOL]
+    if ticket.category:
+        pools.append(pool_key(ticket.category))
+    return pools
+
+
+# --- Synchronisation avec la base -----------------------------------------------------------------
+
+def resync_load_board(db: Optional[Session] = None) -> None:
+    """Recharge techniciens actifs et charges depuis la base"""
+    own_session = db is None
+    db = db or SessionLocal()
+    try:
+        technician_role_ids = config_cache.role_ids("Technicien")
+        technicians = (
+            db.query(models.User.id, models.User.specialization, models.User.max_tickets_capacity)
+            .filter(models.User.role_id.in_(technician_role_ids), models.User.actif == True)
+            .all()
+        )
+        loads = dict(
+            db.query(models.Ticket.technician_id, func.count(models.Ticket.id))
+            .filter(models.Ticket.technician_id.isnot(None), models.Ticket.status.in_(LOAD_STATUSES))
+            .group_by(models.Ticket.technician_id)
+            .all()
+        )
+        load_board.reset(technicians, loads)
+    except Exception as e:
+        print(f"[DISPATCH] Impossible de synchroniser la charge des techniciens: {e}")
+    finally:
+        if own_session:
+            db.close()
+
+
+def _counts_as_load(technician_id, ticket_status) -> bool:
+    return technician_id is not None and ticket_status in LOAD_STATUSES
+
+
+def _attribute_before_after(obj, attribute: str):
+    history = inspect(obj).attrs[attribute].history
+    current = getattr(obj, attribute)
+    if not history.has_changes():
+        return current, current
+    before = history.deleted[0] if history.deleted else None
+    return before, current
+
+
+def _load_after_flush(session: Session, flush_context) -> None:
+    deltas: Counter = session.info.setdefault("dispatch_load_deltas", Counter())
+    reserved = session.info.get("dispatch_reserved", {})
+    consumed = session.info.setdefault("dispatch_reserved_consumed", set())
+    users = session.info.setdefault("dispatch_users", {})
+
+    for obj in session.new:
+        if isinstance(obj, models.Ticket) and _counts_as_load(obj.technician_id, obj.status):
+            deltas[obj.technician_id] += 1
+        elif isinstance(obj, models.User):
+            users[obj.id] = (obj.role_id, obj.actif, obj.specialization, obj.max_tickets_capacity)
+
+    for obj in session.dirty:
+        if isinstance(obj, models.Ticket):
+            old_technician, new_technician = _attribute_before_after(obj, "technician_id")
+            old_status, new_status = _attribute_before_after(obj, "status")
+            old_counts = _counts_as_load(old_technician, old_status)
+            new_counts = _counts_as_load(new_technician, new_status)
+            if old_counts == new_counts and old_technician == new_technician:
+                continue
+            if old_counts:
+                deltas[old_technician] -= 1
+            if new_counts:
+                # Unité de charge déjà réservée par acquire() lors de l'assignation automatique
+                if reserved.get(obj.id) == new_technician and obj.id not in consumed:
+                    consumed.add(obj.id)
+                    continue
+                deltas[new_technician] += 1
+        elif isinstance(obj, models.User):
+            state = inspect(obj)
+            if any(
+                state.attrs[attr].history.has_changes()
+                for attr in ("role_id", "actif", "specialization", "max_tickets_capacity")
+            ):
+                users[obj.id] = (obj.role_id, obj.actif, obj.specialization, obj.max_tickets_capacity)
+
+    for obj in session.deleted:
+        if isinstance(obj, models.Ticket) and _counts_as_load(obj.technician_id, obj.status):
+            deltas[obj.technician_id] -= 1
+        elif isinstance(obj, models.User):
+            users[obj.id] = None
+
+
+def _load_after_commit(session: Session) -> None:
+    deltas = session.info.pop("dispatch_load_deltas", None)
+    users = session.info.pop("dispatch_users", None)
+    session.info.pop("dispatch_reserved", None)
+    session.info.pop("dispatch_reserved_consumed", None)
+    if users:
+        technician_role_ids = config_cache.role_ids("Technicien")
+        for user_id, values in users.items():
+            if values is None or values[0] not in technician_role_ids or not values[1]:
+                load_board.remove_technician(user_id)
+            else:
+                load_board.upsert_technician(user_id, values[2], values[3])
+    if deltas:
+        load_board.apply_deltas(deltas)
+
+
+def _load_after_transaction_end(session: Session, transaction) -> None:
+    """Transaction terminée sans commit (rollback, fermeture de session) : rien n'est appliqué"""
+    if transaction.parent is not None:
+        return
+    session.info.pop("dispatch_load_deltas", None)
+    session.info.pop("dispatch_users", None)
+    session.info.pop("dispatch_reserved_consumed", None)
+    # Réservations faites par acquire() pour une assignation qui n'a pas abouti
+    for technician_id in session.info.pop("dispatch_reserved", {}).values():
+        load_board.release(technician_id)
+
+
+def register_dispatch_listeners() -> None:
+    event.listen(SessionLocal, "after_flush", _load_after_flush)
+    event.listen(SessionLocal, "after_commit", _load_after_commit)
+    event.listen(SessionLocal, "after_transaction_end", _load_after_transaction_end)
+
+
+# --- Assignation automatique ----------------------------------------------------------------------
+
+def auto_dispatch_ticket(db: Session, ticket: models.Ticket) -> Optional[models.User]:
+    """
+    Assigne un ticket en attente au technicien disponible le moins chargé.
+    Ajoute historique et notifications à la session (commit à la charge de l'appelant)
+    et renvoie le technicien choisi, ou None si aucun n'est disponible.
+    """
+    if ticket.status != models.TicketStatus.EN_ATTENTE_ANALYSE or ticket.technician_id is not None:
+        return None
+    technician_id = load_board.acquire(candidate_pools(ticket))
+    if technician_id is None:
+        return None
+    db.info.setdefault("dispatch_reserved", {})[ticket.id] = technician_id
+
+    technician = db.get(models.User, technician_id)
+    if technician is None or not technician.actif:
+        # État en mémoire en retard sur la base : retirer ce technicien et ne pas assigner
+        db.info["dispatch_reserved"].pop(ticket.id, None)
+        load_board.remove_technician(technician_id)
+        return None
+
+    old_status = ticket.status
+    ticket.technician_id = technician_id
+    ticket.status = models.TicketStatus.ASSIGNE_TECHNICIEN
+    ticket.assigned_at = datetime.utcnow()
+    db.add(models.TicketHistory(
+        ticket_id=ticket.id,
+        old_status=old_status,
+        new_status=models.TicketStatus.ASSIGNE_TECHNICIEN,
+        user_id=None,  # Assignation effectuée par le système, pas par le créateur du ticket
+        reason="Assignation automatique (technicien disponible le moins chargé)",
+    ))
+    db.add(models.Notification(
+        user_id=technician_id,
+        type=models.NotificationType.ASSIGNATION,
+        ticket_id=ticket.id,
+        message=f"Un nouveau ticket #{ticket.number} vous a été assigné: {ticket.title}",
+        read=False
+    ))
+    db.add(models.Notification(
+        user_id=ticket.creator_id,
+        type=models.NotificationType.TICKET_ASSIGNE,
+        ticket_id=ticket.id,
+        message=f"Votre ticket #{ticket.number} a été assigné à un technicien: {ticket.title}",
+        read=False
+    ))
+    return technician
@@ -1,16 +1,39 @@
 """
 Service d'envoi d'emails pour les notifications de tickets
+
+Les contenus sont produits par les gabarits compilés de app/email_templates.py (templates/email/).
+Avec EMAIL_TRANSPORT=async, la livraison passe par le transport asyncio de app/email_transport.py :
+send_email met le message en file et rend la main immédiatement.
+
+Les sessions SMTP sont bornées dans le temps et protégées par le disjoncteur smtp_breaker : pendant une
+panne du relais, les envois échouent immédiatement au lieu d'occuper un worker jusqu'au délai réseau.
 """
 import smtplib
 import os
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from typing import List, Optional
-from urllib.parse import urlencode
+from typing import Callable, Iterable, List, Optional, Tuple
+import aiosmtplib
 from dotenv import load_dotenv
 
+from .email_templates import RenderedEmail, email_templates
+from .metrics import EMAIL_FAILURES, EMAIL_SEND_LATENCY, EMAIL_SENT
+from .email_transport import (
+    EMAIL_COMMAND_TIMEOUT_SECONDS,
+    EMAIL_CONNECT_TIMEOUT_SECONDS,
+    EMAIL_SEND_TIMEOUT_SECONDS,
+    SmtpSettings,
+    email_transport,
+    smtp_breaker,
+)
+
 load_dotenv()
 
+# Nombre maximal de destinataires (RCPT TO) par message groupé ; au-delà le groupe est découpé
+EMAIL_MAX_RECIPIENTS_PER_MESSAGE = int(os.getenv("EMAIL_MAX_RECIPIENTS_PER_MESSAGE", "50"))
+
 
 class EmailService:
     """Service pour envoyer des emails via SMTP"""
@@ -28,13 +51,97 @@ class EmailService:
         self.verify_ssl = os.getenv("VERIFY_SSL", "true").lower() == "true"
         self.app_base_url = os.getenv("APP_BASE_URL", "http://localhost:5173")
         self.email_enabled = os.getenv("EMAIL_ENABLED", "true").lower() == "true"
+        # smtplib (bloquant, un worker par envoi) ou async (aiosmtplib, boucle dédiée)
+        self.async_transport = os.getenv("EMAIL_TRANSPORT", "smtplib").lower() == "async"
+        # Filtre des destinataires des emails d'événement (digests : voir app/digests.py)
+        self.recipient_filter: Optional[Callable[[List[str]], List[str]]] = None
+    
+    def _build_message(
+        self,
+        to_emails: List[str],
+        subject: str,
+        body: str,
+        html_body: Optional[str] = None,
+        undisclosed: bool = False
+    ) -> MIMEMultipart:
+        msg = MIMEMultipart('alternative')
+        msg['From'] = f"{self.sender_name} <{self.sender_email}>"
+        # Envoi groupé : destinataires uniquement dans l'enveloppe SMTP, aucun ne voit les autres
+        msg['To'] = "undisclosed-recipients:;" if undisclosed else ", ".join(to_emails)
+        msg['Subject'] = subject
+        
+        # Corps en texte brut, puis HTML si fourni
+        msg.attach(MIMEText(body, 'plain', 'utf-8'))
+        if html_body:
+            msg.attach(MIMEText(html_body, 'html', 'utf-8'))
+        return msg
+    
+    def _template_context(self, **context) -> dict:
+        """Contexte commun à tous les gabarits (signature, URL de l'application)"""
+        return {"sender_name": self.sender_name, "app_base_url": self.app_base_url, "recipient_name": None, **context}
+    
+    def render(self, template: str, role: Optional[str] = None, locale: Optional[str] = None, **context) -> RenderedEmail:
+        """Rend un gabarit d'événement pour un destinataire"""
+        return email_templates.render(template, self._template_context(**context), locale=locale, role=role)
+    
+    def send_rendered(
+        self,
+        to_emails: List[str],
+        rendered: RenderedEmail,
+        digestible: bool = True,
+        wait_delivery: bool = False
+    ) -> bool:
+        """
+        Envoie un email déjà rendu
+        
+        Les destinataires en mode digest ne reçoivent pas les emails d'événement (digestible=True) :
+        l'événement leur parviendra dans leur prochain digest.
+        """
+        if digestible and self.recipient_filter:
+            to_emails = self.recipient_filter(to_emails)
+            if not to_emails:
+                return False
+        return self.send_email(
+            to_emails, rendered.subject, rendered.body, rendered.html_body, wait_delivery=wait_delivery
+        )
+    
+    def send_rendered_to_group(self, to_emails: List[str], rendered: RenderedEmail, digestible: bool = True) -> int:
+        """
+        Envoie un même contenu à plusieurs destinataires en un seul message (plusieurs RCPT TO),
+        découpé par EMAIL_MAX_RECIPIENTS_PER_MESSAGE ; renvoie le nombre de destinataires servis
+        """
+        if digestible and self.recipient_filter:
+            to_emails = self.recipient_filter(to_emails)
+        to_emails = list(dict.fromkeys(email for email in to_emails if email and email.strip()))
+        delivered = 0
+        for start in range(0, len(to_emails), EMAIL_MAX_RECIPIENTS_PER_MESSAGE):
+            chunk = to_emails[start:start + EMAIL_MAX_RECIPIENTS_PER_MESSAGE]
+            if self.send_email(chunk, rendered.subject, rendered.body, rendered.html_body, undisclosed=len(chunk) > 1):
+                delivered += len(chunk)
+        return delivered
+    
+    def broadcast(
+        self,
+        template: str,
+        recipients: Iterable[Tuple[str, Optional[str]]],
+        **context
+    ) -> int:
+        """
+        Diffuse un événement à des destinataires (email, rôle) : un rendu et un message par variante
+        de rôle, quel que soit le nombre de destinataires ; renvoie le nombre de destinataires servis
+        """
+        groups = email_templates.render_for_recipients(template, self._template_context(**context), recipients)
+        return sum(self.send_rendered_to_group(emails, rendered) for rendered, emails in groups)
     
     def send_email(
         self,
         to_emails: List[str],
         subject: str,
         body: str,
-        html_body: Optional[str] = None
+        html_body: Optional[str] = None,
+        undisclosed: bool = False,
+        force: bool = False,
+        wait_delivery: bool = False
     ) -> bool:
         """
         Envoie un email à une ou plusieurs adresses
@@ -44,6 +151,9 @@ class EmailService:
             subject: Sujet de l'email
             body: Corps de l'email en texte brut
             html_body: Corps de l'email en HTML (optionnel)
+            undisclosed: Ne pas lister les destinataires dans l'en-tête To (envoi groupé)
+            force: Tenter l'envoi même si le circuit est ouvert (email de test)
+            wait_delivery: Avec le transport asynchrone, attendre la fin de l'envoi au lieu de la mise en file
         
         Returns:
             True si l'email a été envoyé avec succès, False sinon
@@ -62,44 +172,178 @@ class EmailService:
             print("[EMAIL] Aucun email valide dans la liste")
             return False
         
+        transport = "async" if self.async_transport else "smtplib"
+        if not force and not smtp_breaker.allow():
+            EMAIL_FAILURES.labels(transport, "circuit_open").inc()
+            print(f"[EMAIL] Circuit ouvert (serveur SMTP indisponible) - Email non envoyé à {to_emails}")
+            return False
+        
+        started = time.perf_counter()
         try:
-            # Créer le message
-            msg = MIMEMultipart('alternative')
-            msg['From'] = f"{self.sender_name} <{self.sender_email}>"
-            msg['To'] = ", ".join(to_emails)
-            msg['Subject'] = subject
+            msg = self._build_message(to_emails, subject, body, html_body, undisclosed)
             
-            # Ajouter le corps en texte brut
-            text_part = MIMEText(body, 'plain', 'utf-8')
-            msg.attach(text_part)
+            if self.async_transport:
+                future = email_transport.submit(self._smtp_settings(), msg, to_emails)
+                future.add_done_callback(lambda f: self._log_async_result(f, to_emails, started))
+                if wait_delivery:
+                    return self._wait_async_delivery(future)
+                return True
             
-            # Ajouter le corps HTML si fourni
-            if html_body:
-                html_part = MIMEText(html_body, 'html', 'utf-8')
-                msg.attach(html_part)
+            self._send_smtplib(msg, to_emails)
+            self._record_result(None, transport, started)
+            print(f"[EMAIL] Email envoyé avec succès à {to_emails}")
+            return True
             
-            # Connexion au serveur SMTP
+        except Exception as e:
+            self._record_result(e, transport, started)
+            print(f"[EMAIL] Erreur lors de l'envoi de l'email: {str(e)}")
+            return False
+    
+    def _connect_smtplib(self, deadline: float) -> smtplib.SMTP:
+        """Ouvre une session SMTP authentifiée, chaque étape bornée par le délai restant"""
+        connect_timeout = min(EMAIL_CONNECT_TIMEOUT_SECONDS, EMAIL_SEND_TIMEOUT_SECONDS)
+        if self.use_tls:
+            server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=connect_timeout)
+        else:
+            server = smtplib.SMTP_SSL(self.smtp_server, self.smtp_port, timeout=connect_timeout)
+        try:
             if self.use_tls:
-                server = smtplib.SMTP(self.smtp_server, self.smtp_port)
+                self._bound_command(server, deadline)
                 server.starttls()
-            else:
-                server = smtplib.SMTP_SSL(self.smtp_server, self.smtp_port)
-            
             # Authentification si nécessaire
             if self.smtp_username and self.smtp_password:
+                self._bound_command(server, deadline)
                 server.login(self.smtp_username, self.smtp_password)
-            
-            # Envoyer l'email
-            server.send_message(msg)
-            server.quit()
-            
+        except Exception:
+            server.close()
+            raise
+        return server
+    
+    @staticmethod
+    def _bound_command(server: smtplib.SMTP, deadline: float) -> None:
+        """Délai de la prochaine commande : EMAIL_COMMAND_TIMEOUT_SECONDS, sans dépasser le délai total"""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"Délai d'envoi SMTP dépassé ({EMAIL_SEND_TIMEOUT_SECONDS:.0f} s)")
+        server.sock.settimeout(min(EMAIL_COMMAND_TIMEOUT_SECONDS, remaining))
+    
+    def _send_smtplib(self, msg: MIMEMultipart, to_emails: List[str]) -> None:
+        deadline = time.monotonic() + EMAIL_SEND_TIMEOUT_SECONDS
+        server = self._connect_smtplib(deadline)
+        try:
+            self._bound_command(server, deadline)
+            server.send_message(msg, to_addrs=to_emails)
+            try:
+                server.quit()
+            except smtplib.SMTPException:
+                pass  # Message déjà accepté par le serveur
+        finally:
+            server.close()
+    
+    def probe(self) -> bool:
+        """Teste le serveur SMTP (connexion, authentification, NOOP) sans envoyer d'email"""
+        try:
+            deadline = time.monotonic() + EMAIL_SEND_TIMEOUT_SECONDS
+            server = self._connect_smtplib(deadline)
+            try:
+                self._bound_command(server, deadline)
+                code, message = server.noop()
+                if code != 250:
+                    raise smtplib.SMTPResponseException(code, message)
+            finally:
+                server.close()
+        except Exception as e:
+            self._record_result(e)
+            print(f"[EMAIL] Serveur SMTP toujours indisponible: {str(e)}")
+            return False
+        self._record_result(None)
+        return True
+    
+    @staticmethod
+    def _record_result(
+        error: Optional[BaseException], transport: Optional[str] = None, started: Optional[float] = None
+    ) -> None:
+        """Disjoncteur et métriques ; sans transport (sonde), seul le disjoncteur est mis à jour"""
+        if transport:
+            EMAIL_SEND_LATENCY.labels(transport).observe(time.perf_counter() - started)
+            if error is None:
+                EMAIL_SENT.labels(transport).inc()
+            else:
+                EMAIL_FAILURES.labels(transport, "error").inc()
+        # Un destinataire refusé n'est pas une panne du serveur : il a répondu
+        if error is None or isinstance(error, (smtplib.SMTPRecipientsRefused, aiosmtplib.SMTPRecipientsRefused)):
+            smtp_breaker.record_success()
+        else:
+            smtp_breaker.record_failure(error)
+    
+    async def send_email_async(
+        self,
+        to_emails: List[str],
+        subject: str,
+        body: str,
+        html_body: Optional[str] = None
+    ) -> bool:
+        """
+        Envoie un email depuis du code asynchrone (endpoint async) en attendant la livraison,
+        sans bloquer la boucle ni occuper de thread, quel que soit EMAIL_TRANSPORT
+        """
+        if not self.email_enabled:
+            print(f"[EMAIL] Envoi désactivé - Email non envoyé à {to_emails}")
+            return False
+        to_emails = [email for email in to_emails if email and email.strip()]
+        if not to_emails:
+            print("[EMAIL] Aucun email valide dans la liste")
+            return False
+        if not smtp_breaker.allow():
+            EMAIL_FAILURES.labels("async", "circuit_open").inc()
+            print(f"[EMAIL] Circuit ouvert (serveur SMTP indisponible) - Email non envoyé à {to_emails}")
+            return False
+        started = time.perf_counter()
+        try:
+            msg = self._build_message(to_emails, subject, body, html_body)
+            await email_transport.send(self._smtp_settings(), msg, to_emails)
+            self._record_result(None, "async", started)
             print(f"[EMAIL] Email envoyé avec succès à {to_emails}")
             return True
-            
         except Exception as e:
+            self._record_result(e, "async", started)
             print(f"[EMAIL] Erreur lors de l'envoi de l'email: {str(e)}")
             return False
     
+    def _smtp_settings(self) -> SmtpSettings:
+        # Lu à chaque envoi : les paramètres sont modifiables à chaud (PUT /settings/email)
+        return SmtpSettings(
+            host=self.smtp_server,
+            port=self.smtp_port,
+            username=self.smtp_username,
+            password=self.smtp_password,
+            start_tls=self.use_tls,
+            implicit_tls=not self.use_tls,
+            verify_ssl=self.verify_ssl,
+        )
+    
+    def _wait_async_delivery(self, future) -> bool:
+        """Attend un envoi du transport asynchrone (file d'attente du serveur SMTP comprise)"""
+        try:
+            future.result(timeout=2 * EMAIL_SEND_TIMEOUT_SECONDS)
+            return True
+        except FutureTimeoutError:
+            # Envoi annulé : il ne doit pas partir après avoir été compté comme non envoyé
+            if future.cancel():
+                return False
+            return future.exception() is None
+        except Exception:
+            # Erreur déjà journalisée par _log_async_result
+            return False
+    
+    def _log_async_result(self, future, to_emails: List[str], started: float) -> None:
+        error = TimeoutError("envoi annulé après expiration du délai d'attente") if future.cancelled() else future.exception()
+        self._record_result(error, "async", started)
+        if error:
+            print(f"[EMAIL] Erreur lors de l'envoi de l'email: {str(error)}")
+        else:
+            print(f"[EMAIL] Email envoyé avec succès à {to_emails}")
+    
     def send_ticket_created_notification(
         self,
         ticket_number: int,
@@ -119,49 +363,14 @@ class EmailService:
         Returns:
             True si l'email a été envoyé avec succès
         """
-        subject = f"Nouveau ticket #{ticket_number} créé: {ticket_title}"
-        
-        body = f"""
-Bonjour,
-
-Un nouveau ticket a été créé dans le système de gestion des tickets.
-
-Détails du ticket :
-• Numéro : #{ticket_number}
-• Titre : {ticket_title}
-• Créateur : {creator_name}
-
-Veuillez vous connecter à l'application pour analyser et assigner ce ticket.
-
-Cordialement,
-{self.sender_name}
-"""
-        
-        html_body = f"""
-<html>
-<body>
-    <h2>Nouveau ticket créé</h2>
-    <p>Bonjour,</p>
-    <p>Un nouveau ticket a été créé dans le système de gestion des tickets.</p>
-    <div style="background-color: #f5f5f5; padding: 15px; border-radius: 5px; margin: 15px 0;">
-        <p><strong>Détails du ticket :</strong></p>
-        <ul>
-            <li><strong>Numéro :</strong> #{ticket_number}</li>
-            <li><strong>Titre :</strong> {ticket_title}</li>
-            <li><strong>Créateur :</strong> {creator_name}</li>
-        </ul>
-    </div>
-    <p>Veuillez vous connecter à l'application pour analyser et assigner ce ticket.</p>
-    <div style="margin: 20px 0;">
-        <a href="{self.app_base_url}/login?redirect=/dashboard" style="background:#007bff;color:#fff;text-decoration:none;padding:10px 16px;border-radius:6px;display:inline-block">Ouvrir l'application</a>
-    </div>
-    <p>Cordialement,<br>{self.sender_name}</p>
-</body>
-</html>
-"""
-        
-        return self.send_email(recipient_emails, subject, body, html_body)
-
+        rendered = self.render(
+            "ticket_created",
+            ticket_number=ticket_number,
+            ticket_title=ticket_title,
+            creator_name=creator_name,
+        )
+        return self.send_rendered(recipient_emails, rendered)
+    
     def send_ticket_created_notification_with_actions(
         self,
         ticket_id: str,
@@ -171,73 +380,40 @@ Cordialement,
         recipient_email: str,
         recipient_role: str
     ) -> bool:
-        subject = f"Nouveau ticket #{ticket_number} créé: {ticket_title}"
-        body = f"""
-Bonjour,
-
-Un nouveau ticket a été créé dans le système de gestion des tickets.
-
-Détails du ticket :
-• Numéro : #{ticket_number}
-• Titre : {ticket_title}
-• Créateur : {creator_name}
-
-Veuillez vous connecter à l'application pour analyser et assigner ce ticket.
-
-Cordialement,
-{self.sender_name}
-"""
-        # Les liens pointent vers /login avec redirection pour forcer l'authentification
-        if recipient_role == "DSI":
-            # Pour le DSI : plus de boutons d'action, seulement une phrase avec lien vers l'application
-            login_params = urlencode({
-                "redirect": "/dashboard/dsi"
-            })
-            login_link = f"{self.app_base_url}/login?{login_params}"
-            actions_html = f"""
-            <p>Veuillez vous connecter à l'application en cliquant sur ce lien afin d'analyser et d'assigner ce ticket :
-                <a href="{login_link}" style="color:#007bff;text-decoration:underline;">Accéder à l'application</a>.
-            </p>
-            """
-        else:
-            # Secrétaire DSI, Adjoint DSI et Admin : seulement le bouton "Assigner à un technicien"
-            if recipient_role == "Admin":
-                role_path = "/dashboard/dsi"
-            else:
-                role_path = "/dashboard/secretary"
-            
-            assign_params = urlencode({
-                "redirect": role_path,
-                "ticket": ticket_id,
-                "action": "assign"
-            })
-            assign_link = f"{self.app_base_url}/login?{assign_params}"
-            
-            actions_html = f"""
-            <div style="margin: 20px 0;">
-                <a href="{assign_link}" style="background:#007bff;color:#fff;text-decoration:none;padding:10px 16px;border-radius:6px;display:inline-block">Assigner à un technicien</a>
-            </div>
-            """
-        html_body = f"""
-<html>
-<body>
-    <h2>Nouveau ticket créé</h2>
-    <p>Bonjour,</p>
-    <p>Un nouveau ticket a été créé dans le système de gestion des tickets.</p>
-    <div style="background-color: #f5f5f5; padding: 15px; border-radius: 5px; margin: 15px 0;">
-        <p><strong>Détails du ticket :</strong></p>
-        <ul>
-            <li><strong>Numéro :</strong> #{ticket_number}</li>
-            <li><strong>Titre :</strong> {ticket_title}</li>
-            <li><strong>Créateur :</strong> {creator_name}</li>
-        </ul>
-    </div>
-    {actions_html}
-    <p>Cordialement,<br>{self.sender_name}</p>
-</body>
-</html>
-"""
-        return self.send_email([recipient_email], subject, body, html_body)
+        # Variante par rôle : lien simple pour le DSI, bouton "Assigner à un technicien" pour les autres
+        rendered = self.render(
+            "ticket_created_actions",
+            role=recipient_role,
+            ticket_id=ticket_id,
+            ticket_number=ticket_number,
+            ticket_title=ticket_title,
+            creator_name=creator_name,
+        )
+        return self.send_rendered([recipient_email], rendered)
+    
+    def send_ticket_created_notification_to_recipients(
+        self,
+        ticket_id: str,
+        ticket_number: int,
+        ticket_title: str,
+        creator_name: str,
+        recipients: Iterable[Tuple[str, str]]
+    ) -> int:
+        """
+        Envoie la notification de nouveau ticket à plusieurs destinataires (email, rôle) :
+        un seul message par variante de rôle (lien simple pour le DSI, bouton d'assignation sinon)
+        
+        Returns:
+            Nombre de destinataires servis
+        """
+        return self.broadcast(
+            "ticket_created_actions",
+            recipients,
+            ticket_id=ticket_id,
+            ticket_number=ticket_number,
+            ticket_title=ticket_title,
+            creator_name=creator_name,
+        )
     
     def send_ticket_assigned_notification(
         self,
@@ -263,75 +439,16 @@ Cordialement,
         Returns:
             True si l'email a été envoyé avec succès
         """
-        subject = f"Ticket #{ticket_number} vous a été assigné: {ticket_title}"
-        
-        body = f"""
-Bonjour {technician_name},
-
-Un nouveau ticket vous a été assigné.
-
-Détails du ticket :
-• Numéro : #{ticket_number}
-• Titre : {ticket_title}
-"""
-        
-        if priority:
-            body += f"• Priorité : {priority}\n"
-        
-        if notes:
-            body += f"\nInstructions :\n{notes}\n"
-        
-        body += f"""
-Veuillez vous connecter à l'application pour prendre en charge ce ticket.
-
-Cordialement,
-{self.sender_name}
-"""
-        
-        # Lien vers login avec redirection pour forcer l'authentification
-        redirect_params = urlencode({
-            "redirect": "/dashboard/technician",
-            "ticket": ticket_id
-        })
-        action_link = f"{self.app_base_url}/login?{redirect_params}"
-        
-        # Construire le HTML progressivement
-        html_body = f"""
-<html>
-<body>
-    <h2>Ticket assigné</h2>
-    <p>Bonjour {technician_name},</p>
-    <p>Un nouveau ticket vous a été assigné.</p>
-    <div style="background-color: #f5f5f5; padding: 15px; border-radius: 5px; margin: 15px 0;">
-        <p><strong>Détails du ticket :</strong></p>
-        <ul>
-            <li><strong>Numéro :</strong> #{ticket_number}</li>
-            <li><strong>Titre :</strong> {ticket_title}</li>
-"""
-        
-        if priority:
-            html_body += f"            <li><strong>Priorité :</strong> {priority}</li>\n"
-        
-        html_body += "        </ul>"
-        
-        if notes:
-            html_body += f"""
-        <p><strong>Instructions :</strong></p>
-        <p style="background-color: #fff; padding: 10px; border-left: 3px solid #007bff;">{notes}</p>
-"""
-        
-        html_body += f"""
-    </div>
-    <p>
-        Veuillez vous connecter à l'application en cliquant sur ce lien afin de prendre en charge et de résoudre ce ticket :
-        <a href="{action_link}" style="color:#007bff;text-decoration:underline;">Accéder à l'application</a>.
-    </p>
-    <p>Cordialement,<br>{self.sender_name}</p>
-</body>
-</html>
-"""
-        
-        return self.send_email([technician_email], subject, body, html_body)
+        rendered = self.render(
+            "ticket_assigned",
+            recipient_name=technician_name,
+            ticket_id=ticket_id,
+            ticket_number=ticket_number,
+            ticket_title=ticket_title,
+            priority=priority,
+            notes=notes,
+        )
+        return self.send_rendered([technician_email], rendered)
     
     def send_ticket_assigned_to_creator_notification(
         self,
@@ -356,55 +473,15 @@ Cordialement,
         Returns:
             True si l'email a été envoyé avec succès
         """
-        subject = f"Votre ticket #{ticket_number} a été assigné à un technicien"
-        
-        body = f"""
-Bonjour {creator_name},
-
-Votre ticket a été assigné à un technicien et sera traité prochainement.
-
-Détails du ticket :
-• Numéro : #{ticket_number}
-• Titre : {ticket_title}
-• Technicien assigné : {technician_name}
-
-Vous serez notifié lorsque le ticket sera résolu.
-
-Cordialement,
-{self.sender_name}
-"""
-        
-        # Lien vers login avec redirection pour forcer l'authentification
-        redirect_params = urlencode({
-            "redirect": "/dashboard/user",
-            "ticket": ticket_id
-        })
-        action_link = f"{self.app_base_url}/login?{redirect_params}"
-        html_body = f"""
-<html>
-<body>
-    <h2>Ticket assigné</h2>
-    <p>Bonjour {creator_name},</p>
-    <p>Votre ticket a été assigné à un technicien et sera traité prochainement.</p>
-    <div style="background-color: #f5f5f5; padding: 15px; border-radius: 5px; margin: 15px 0;">
-        <p><strong>Détails du ticket :</strong></p>
-        <ul>
-            <li><strong>Numéro :</strong> #{ticket_number}</li>
-            <li><strong>Titre :</strong> {ticket_title}</li>
-            <li><strong>Technicien assigné :</strong> {technician_name}</li>
-        </ul>
-    </div>
-    <p>Vous serez notifié lorsque le ticket sera résolu.</p>
-    <p>
-        Pour suivre l'avancement de votre demande, veuillez vous connecter à l'application en cliquant sur ce lien :
-        <a href="{action_link}" style="color:#007bff;text-decoration:underline;">Accéder à l'application</a>.
-    </p>
-    <p>Cordialement,<br>{self.sender_name}</p>
-</body>
-</html>
-"""
-        
-        return self.send_email([creator_email], subject, body, html_body)
+        rendered = self.render(
+            "ticket_assigned_to_creator",
+            recipient_name=creator_name,
+            ticket_id=ticket_id,
+            ticket_number=ticket_number,
+            ticket_title=ticket_title,
+            technician_name=technician_name,
+        )
+        return self.send_rendered([creator_email], rendered)
     
     def send_ticket_created_to_creator_notification(
         self,
@@ -427,53 +504,14 @@ Cordialement,
         Returns:
             True si l'email a été envoyé avec succès
         """
-        subject = f"Votre ticket #{ticket_number} a été créé avec succès"
-        
-        body = f"""
-Bonjour {creator_name},
-
-Votre ticket a été créé avec succès et sera traité prochainement.
-
-Détails du ticket :
-• Numéro : #{ticket_number}
-• Titre : {ticket_title}
-
-Vous serez notifié lorsque le ticket sera assigné à un technicien.
-
-Cordialement,
-{self.sender_name}
-"""
-        
-        # Lien vers login avec redirection pour forcer l'authentification
-        redirect_params = urlencode({
-            "redirect": "/dashboard/user",
-            "ticket": ticket_id
-        })
-        action_link = f"{self.app_base_url}/login?{redirect_params}"
-        html_body = f"""
-<html>
-<body>
-    <h2>Ticket créé</h2>
-    <p>Bonjour {creator_name},</p>
-    <p>Votre ticket a été créé avec succès et sera traité prochainement.</p>
-    <div style="background-color: #f5f5f5; padding: 15px; border-radius: 5px; margin: 15px 0;">
-        <p><strong>Détails du ticket :</strong></p>
-        <ul>
-            <li><strong>Numéro :</strong> #{ticket_number}</li>
-            <li><strong>Titre :</strong> {ticket_title}</li>
-        </ul>
-    </div>
-    <p>Vous serez notifié lorsque le ticket sera assigné à un technicien.</p>
-    <p>
-        Pour consulter le détail de votre demande et suivre son traitement, veuillez vous connecter à l'application en cliquant sur ce lien :
-        <a href="{action_link}" style="color:#007bff;text-decoration:underline;">Accéder à l'application</a>.
-    </p>
-    <p>Cordialement,<br>{self.sender_name}</p>
-</body>
-</html>
-"""
-        
-        return self.send_email([creator_email], subject, body, html_body)
+        rendered = self.render(
+            "ticket_created_to_creator",
+            recipient_name=creator_name,
+            ticket_id=ticket_id,
+            ticket_number=ticket_number,
+            ticket_title=ticket_title,
+        )
+        return self.send_rendered([creator_email], rendered)
     
     def send_ticket_rejected_notification(
         self,
@@ -483,47 +521,14 @@ Cordialement,
         technician_name: str,
         rejection_reason: Optional[str] = None
     ) -> bool:
-        subject = f"Ticket #{ticket_number} rejeté par l'utilisateur: {ticket_title}"
-        body = f"""
-Bonjour {technician_name},
-
-L'utilisateur a rejeté la résolution du ticket.
-
-Détails du ticket :
-• Numéro : #{ticket_number}
-• Titre : {ticket_title}
-"""
-        if rejection_reason:
-            body += f"• Motif du rejet : {rejection_reason}\n"
-
-        body += f"""
-Veuillez vous connecter à l'application et reprendre le ticket si nécessaire.
-
-Cordialement,
-{self.sender_name}
-"""
-
-        html_body = f"""
-<html>
-<body>
-    <h2>Ticket rejeté</h2>
-    <p>Bonjour {technician_name},</p>
-    <p>L'utilisateur a rejeté la résolution du ticket.</p>
-    <div style="background-color: #f5f5f5; padding: 15px; border-radius: 5px; margin: 15px 0;">
-        <p><strong>Détails du ticket :</strong></p>
-        <ul>
-            <li><strong>Numéro :</strong> #{ticket_number}</li>
-            <li><strong>Titre :</strong> {ticket_title}</li>
-        </ul>
-    </div>
-    {('<p><strong>Motif du rejet :</strong> ' + rejection_reason + '</p>') if rejection_reason else ''}
-    <p>Veuillez vous connecter à l'application et reprendre le ticket si nécessaire.</p>
-    <p>Cordialement,<br>{self.sender_name}</p>
-    </body>
-</html>
-"""
-
-        return self.send_email([technician_email], subject, body, html_body)
+        rendered = self.render(
+            "ticket_rejected",
+            recipient_name=technician_name,
+            ticket_number=ticket_number,
+            ticket_title=ticket_title,
+            rejection_reason=rejection_reason,
+        )
+        return self.send_rendered([technician_email], rendered)
     
     def send_ticket_delegated_to_adjoint_notification(
         self,
@@ -550,70 +555,16 @@ Cordialement,
         Returns:
             True si l'email a été envoyé avec succès
         """
-        subject = f"Ticket #{ticket_number} délégué par le DSI: {ticket_title}"
-        
-        body = f"""
-Bonjour {adjoint_name},
-
-Le DSI {dsi_name} vous a délégué un ticket à assigner à un technicien.
-
-Détails du ticket :
-• Numéro : #{ticket_number}
-• Titre : {ticket_title}
-"""
-        
-        if notes:
-            body += f"\nNotes du DSI :\n{notes}\n"
-        
-        body += f"""
-Veuillez vous connecter à l'application pour assigner ce ticket à un technicien.
-
-Cordialement,
-{self.sender_name}
-"""
-        
-        # Lien vers le dashboard avec le ticket et l'action assign
-        redirect_params = urlencode({
-            "redirect": "/dashboard/secretary",
-            "ticket": ticket_id,
-            "action": "assign"
-        })
-        action_link = f"{self.app_base_url}/login?{redirect_params}"
-        
-        html_body = f"""
-<html>
-<body>
-    <h2>Ticket délégué par le DSI</h2>
-    <p>Bonjour {adjoint_name},</p>
-    <p>Le DSI <strong>{dsi_name}</strong> vous a délégué un ticket à assigner à un technicien.</p>
-    <div style="background-color: #f5f5f5; padding: 15px; border-radius: 5px; margin: 15px 0;">
-        <p><strong>Détails du ticket :</strong></p>
-        <ul>
-            <li><strong>Numéro :</strong> #{ticket_number}</li>
-            <li><strong>Titre :</strong> {ticket_title}</li>
-        </ul>
-    </div>
-"""
-        
-        if notes:
-            html_body += f"""
-    <div style="background-color: #fff3cd; padding: 15px; border-radius: 5px; margin: 15px 0; border-left: 3px solid #ffc107;">
-        <p><strong>Notes du DSI :</strong></p>
-        <p>{notes}</p>
-    </div>
-"""
-        
-        html_body += f"""
-    <div style="margin: 20px 0;">
-        <a href="{action_link}" style="background:#0ea5e9;color:#fff;text-decoration:none;padding:10px 16px;border-radius:6px;display:inline-block;font-weight:bold">Assigner ce ticket</a>
-    </div>
-    <p>Veuillez vous connecter à l'application pour assigner ce ticket à un technicien.</p>
-    <p>Cordialement,<br>{self.sender_name}</p>
-</body>
-</html>
-"""
-        
-        return self.send_email([adjoint_email], subject, body, html_body)
+        rendered = self.render(
+            "ticket_delegated_to_adjoint",
+            recipient_name=adjoint_name,
+            ticket_id=ticket_id,
+            ticket_number=ticket_number,
+            ticket_title=ticket_title,
+            dsi_name=dsi_name,
+            notes=notes,
+        )
+        return self.send_rendered([adjoint_email], rendered)
     
     def send_ticket_in_progress_notification(
         self,
@@ -625,54 +576,15 @@ Cordialement,
         technician_name: str
     ) -> bool:
         """Envoie une notification à l'utilisateur lorsque le ticket est en cours de traitement"""
-        subject = f"Votre ticket #{ticket_number} est en cours de traitement"
-        
-        body = f"""
-Bonjour {creator_name},
-
-Votre ticket est maintenant en cours de traitement par le technicien.
-
-Détails du ticket :
-• Numéro : #{ticket_number}
-• Titre : {ticket_title}
-• Technicien : {technician_name}
-
-Vous serez notifié lorsque le ticket sera résolu.
-
-Cordialement,
-{self.sender_name}
-"""
-        
-        redirect_params = urlencode({
-            "redirect": "/dashboard/user",
-            "ticket": ticket_id
-        })
-        action_link = f"{self.app_base_url}/login?{redirect_params}"
-        html_body = f"""
-<html>
-<body>
-    <h2>Ticket en cours de traitement</h2>
-    <p>Bonjour {creator_name},</p>
-    <p>Votre ticket est maintenant en cours de traitement par le technicien.</p>
-    <div style="background-color: #f5f5f5; padding: 15px; border-radius: 5px; margin: 15px 0;">
-        <p><strong>Détails du ticket :</strong></p>
-        <ul>
-            <li><strong>Numéro :</strong> #{ticket_number}</li>
-            <li><strong>Titre :</strong> {ticket_title}</li>
-            <li><strong>Technicien :</strong> {technician_name}</li>
-        </ul>
-    </div>
-    <p>Vous serez notifié lorsque le ticket sera résolu.</p>
-    <p>
-        Pour suivre l'avancement de votre demande, veuillez vous connecter à l'application en cliquant sur ce lien :
-        <a href="{action_link}" style="color:#007bff;text-decoration:underline;">Accéder à l'application</a>.
-    </p>
-    <p>Cordialement,<br>{self.sender_name}</p>
-</body>
-</html>
-"""
-        
-        return self.send_email([creator_email], subject, body, html_body)
+        rendered = self.render(
+            "ticket_in_progress",
+            recipient_name=creator_name,
+            ticket_id=ticket_id,
+            ticket_number=ticket_number,
+            ticket_title=ticket_title,
+            technician_name=technician_name,
+        )
+        return self.send_rendered([creator_email], rendered)
     
     def send_ticket_resolved_notification(
         self,
@@ -684,66 +596,15 @@ Cordialement,
         resolution_summary: Optional[str] = None
     ) -> bool:
         """Envoie une notification à l'utilisateur lorsque le ticket est résolu"""
-        subject = f"Votre ticket #{ticket_number} a été résolu - Validation requise"
-        
-        body = f"""
-Bonjour {creator_name},
-
-Votre ticket a été résolu. Veuillez valider la résolution.
-
-Détails du ticket :
-• Numéro : #{ticket_number}
-• Titre : {ticket_title}
-"""
-        if resolution_summary:
-            body += f"• Résumé de la résolution : {resolution_summary}\n"
-        
-        body += f"""
-Merci de valider la résolution dans les 14 jours. Si vous ne validez pas, le ticket sera clôturé automatiquement.
-
-Cordialement,
-{self.sender_name}
-"""
-        
-        redirect_params = urlencode({
-            "redirect": "/dashboard/user",
-            "ticket": ticket_id
-        })
-        action_link = f"{self.app_base_url}/login?{redirect_params}"
-        html_body = f"""
-<html>
-<body>
-    <h2>Ticket résolu - Validation requise</h2>
-    <p>Bonjour {creator_name},</p>
-    <p>Votre ticket a été résolu. Veuillez valider la résolution.</p>
-    <div style="background-color: #f5f5f5; padding: 15px; border-radius: 5px; margin: 15px 0;">
-        <p><strong>Détails du ticket :</strong></p>
-        <ul>
-            <li><strong>Numéro :</strong> #{ticket_number}</li>
-            <li><strong>Titre :</strong> {ticket_title}</li>
-        </ul>
-    </div>
-"""
-        if resolution_summary:
-            html_body += f"""
-    <div style="background-color: #d1ecf1; padding: 15px; border-radius: 5px; margin: 15px 0;">
-        <p><strong>Résumé de la résolution :</strong></p>
-        <p>{resolution_summary}</p>
-    </div>
-"""
-        html_body += f"""
-    <p style="color: #856404; background-color: #fff3cd; padding: 10px; border-radius: 5px;">
-        <strong>⚠️ Important :</strong> Merci de valider la résolution dans les 14 jours. Si vous ne validez pas, le ticket sera clôturé automatiquement.
-    </p>
-    <div style="margin: 20px 0;">
-        <a href="{action_link}" style="background:#28a745;color:#fff;text-decoration:none;padding:10px 16px;border-radius:6px;display:inline-block;font-weight:bold">Valider la résolution</a>
-    </div>
-    <p>Cordialement,<br>{self.sender_name}</p>
-</body>
-</html>
-"""
-        
-        return self.send_email([creator_email], subject, body, html_body)
+        rendered = self.render(
+            "ticket_resolved",
+            recipient_name=creator_name,
+            ticket_id=ticket_id,
+            ticket_number=ticket_number,
+            ticket_title=ticket_title,
+            resolution_summary=resolution_summary,
+        )
+        return self.send_rendered([creator_email], rendered)
     
     def send_validation_reminder(
         self,
@@ -756,67 +617,16 @@ Cordialement,
         days_since_resolution: int
     ) -> bool:
         """Envoie un rappel de validation à l'utilisateur"""
-        subjects = {
-            1: f"Rappel : Veuillez valider votre ticket #{ticket_number}",
-            2: f"Second rappel : Validation requise pour votre ticket #{ticket_number}",
-            3: f"Dernier rappel : Veuillez valider votre ticket #{ticket_number}"
-        }
-        subject = subjects.get(reminder_number, f"Rappel : Validation requise pour votre ticket #{ticket_number}")
-        
-        messages = {
-            1: f"Votre ticket a été résolu il y a {days_since_resolution} jours. Veuillez valider la résolution.",
-            2: f"Votre ticket a été résolu il y a {days_since_resolution} jours. Validation requise.",
-            3: f"⚠️ Dernier rappel : Votre ticket a été résolu il y a {days_since_resolution} jours. Si vous ne validez pas dans les prochains jours, le ticket sera clôturé automatiquement."
-        }
-        message = messages.get(reminder_number, f"Votre ticket a été résolu il y a {days_since_resolution} jours.")
-        
-        body = f"""
-Bonjour {creator_name},
-
-{message}
-
-Détails du ticket :
-• Numéro : #{ticket_number}
-• Titre : {ticket_title}
-
-Merci de valider la résolution dès que possible.
-
-Cordialement,
-{self.sender_name}
-"""
-        
-        redirect_params = urlencode({
-            "redirect": "/dashboard/user",
-            "ticket": ticket_id
-        })
-        action_link = f"{self.app_base_url}/login?{redirect_params}"
-        
-        urgency_style = "background-color: #f8d7da; border-left: 4px solid #dc3545;" if reminder_number == 3 else "background-color: #fff3cd; border-left: 4px solid #ffc107;"
-        
-        html_body = f"""
-<html>
-<body>
-    <h2>Rappel de validation</h2>
-    <p>Bonjour {creator_name},</p>
-    <div style="{urgency_style} padding: 15px; border-radius: 5px; margin: 15px 0;">
-        <p><strong>{message}</strong></p>
-    </div>
-    <div style="background-color: #f5f5f5; padding: 15px; border-radius: 5px; margin: 15px 0;">
-        <p><strong>Détails du ticket :</strong></p>
-        <ul>
-            <li><strong>Numéro :</strong> #{ticket_number}</li>
-            <li><strong>Titre :</strong> {ticket_title}</li>
-        </ul>
-    </div>
-    <div style="margin: 20px 0;">
-        <a href="{action_link}" style="background:#28a745;color:#fff;text-decoration:none;padding:10px 16px;border-radius:6px;display:inline-block;font-weight:bold">Valider la résolution</a>
-    </div>
-    <p>Cordialement,<br>{self.sender_name}</p>
-</body>
-</html>
-"""
-        
-        return self.send_email([creator_email], subject, body, html_body)
+        rendered = self.render(
+            "validation_reminder",
+            recipient_name=creator_name,
+            ticket_id=ticket_id,
+            ticket_number=ticket_number,
+            ticket_title=ticket_title,
+            reminder_number=reminder_number,
+            days_since_resolution=days_since_resolution,
+        )
+        return self.send_rendered([creator_email], rendered)
     
     def send_ticket_auto_closed_notification(
         self,
@@ -827,55 +637,14 @@ Cordialement,
         creator_name: str
     ) -> bool:
         """Envoie une notification à l'utilisateur lorsque le ticket est clôturé automatiquement"""
-        subject = f"Votre ticket #{ticket_number} a été clôturé automatiquement"
-        
-        body = f"""
-Bonjour {creator_name},
-
-Votre ticket a été clôturé automatiquement après 14 jours sans validation.
-
-Détails du ticket :
-• Numéro : #{ticket_number}
-• Titre : {ticket_title}
-
-Vous pouvez réouvrir ce ticket dans les 7 prochains jours si le problème persiste. Après cette période, vous devrez créer un nouveau ticket.
-
-Cordialement,
-{self.sender_name}
-"""
-        
-        redirect_params = urlencode({
-            "redirect": "/dashboard/user",
-            "ticket": ticket_id
-        })
-        action_link = f"{self.app_base_url}/login?{redirect_params}"
-        html_body = f"""
-<html>
-<body>
-    <h2>Ticket clôturé automatiquement</h2>
-    <p>Bonjour {creator_name},</p>
-    <div style="background-color: #f8d7da; padding: 15px; border-radius: 5px; margin: 15px 0; border-left: 4px solid #dc3545;">
-        <p><strong>Votre ticket a été clôturé automatiquement après 14 jours sans validation.</strong></p>
-    </div>
-    <div style="background-color: #f5f5f5; padding: 15px; border-radius: 5px; margin: 15px 0;">
-        <p><strong>Détails du ticket :</strong></p>
-        <ul>
-            <li><strong>Numéro :</strong> #{ticket_number}</li>
-            <li><strong>Titre :</strong> {ticket_title}</li>
-        </ul>
-    </div>
-    <div style="background-color: #d1ecf1; padding: 15px; border-radius: 5px; margin: 15px 0;">
-        <p><strong>⚠️ Important :</strong> Vous pouvez réouvrir ce ticket dans les <strong>7 prochains jours</strong> si le problème persiste. Après cette période, vous devrez créer un nouveau ticket.</p>
-    </div>
-    <div style="margin: 20px 0;">
-        <a href="{action_link}" style="background:#007bff;color:#fff;text-decoration:none;padding:10px 16px;border-radius:6px;display:inline-block">Voir le ticket</a>
-    </div>
-    <p>Cordialement,<br>{self.sender_name}</p>
-</body>
-</html>
-"""
-        
-        return self.send_email([creator_email], subject, body, html_body)
+        rendered = self.render(
+            "ticket_auto_closed",
+            recipient_name=creator_name,
+            ticket_id=ticket_id,
+            ticket_number=ticket_number,
+            ticket_title=ticket_title,
+        )
+        return self.send_rendered([creator_email], rendered)
     
     def send_ticket_rejected_notification_to_user(
         self,
@@ -887,66 +656,15 @@ Cordialement,
         rejection_reason: Optional[str] = None
     ) -> bool:
         """Envoie une notification à l'utilisateur lorsque son ticket est rejeté"""
-        subject = f"Votre ticket #{ticket_number} a été rejeté"
-        
-        body = f"""
-Bonjour {creator_name},
-
-Votre ticket a été rejeté.
-
-Détails du ticket :
-• Numéro : #{ticket_number}
-• Titre : {ticket_title}
-"""
-        if rejection_reason:
-            body += f"• Raison du rejet : {rejection_reason}\n"
-        
-        body += f"""
-Si vous avez des questions, n'hésitez pas à contacter le support.
-
-Cordialement,
-{self.sender_name}
-"""
-        
-        redirect_params = urlencode({
-            "redirect": "/dashboard/user",
-            "ticket": ticket_id
-        })
-        action_link = f"{self.app_base_url}/login?{redirect_params}"
-        html_body = f"""
-<html>
-<body>
-    <h2>Ticket rejeté</h2>
-    <p>Bonjour {creator_name},</p>
-    <div style="background-color: #f8d7da; padding: 15px; border-radius: 5px; margin: 15px 0; border-left: 4px solid #dc3545;">
-        <p><strong>Votre ticket a été rejeté.</strong></p>
-    </div>
-    <div style="background-color: #f5f5f5; padding: 15px; border-radius: 5px; margin: 15px 0;">
-        <p><strong>Détails du ticket :</strong></p>
-        <ul>
-            <li><strong>Numéro :</strong> #{ticket_number}</li>
-            <li><strong>Titre :</strong> {ticket_title}</li>
-        </ul>
-    </div>
-"""
-        if rejection_reason:
-            html_body += f"""
-    <div style="background-color: #fff3cd; padding: 15px; border-radius: 5px; margin: 15px 0;">
-        <p><strong>Raison du rejet :</strong></p>
-        <p>{rejection_reason}</p>
-    </div>
-"""
-        html_body += f"""
-    <p>Si vous avez des questions, n'hésitez pas à contacter le support.</p>
-    <div style="margin: 20px 0;">
-        <a href="{action_link}" style="background:#007bff;color:#fff;text-decoration:none;padding:10px 16px;border-radius:6px;display:inline-block">Voir le ticket</a>
-    </div>
-    <p>Cordialement,<br>{self.sender_name}</p>
-</body>
-</html>
-"""
-        
-        return self.send_email([creator_email], subject, body, html_body)
+        rendered = self.render(
+            "ticket_rejected_to_user",
+            recipient_name=creator_name,
+            ticket_id=ticket_id,
+            ticket_number=ticket_number,
+            ticket_title=ticket_title,
+            rejection_reason=rejection_reason,
+        )
+        return self.send_rendered([creator_email], rendered)
     
     def send_comment_notification_to_user(
         self,
@@ -959,57 +677,16 @@ Cordialement,
         comment_content: str
     ) -> bool:
         """Envoie une notification à l'utilisateur lorsqu'un commentaire est ajouté"""
-        subject = f"Nouveau commentaire sur votre ticket #{ticket_number}"
-        
-        body = f"""
-Bonjour {creator_name},
-
-Un nouveau commentaire a été ajouté sur votre ticket.
-
-Détails du ticket :
-• Numéro : #{ticket_number}
-• Titre : {ticket_title}
-• Commentaire de : {commenter_name}
-
-Commentaire :
-{comment_content}
-
-Cordialement,
-{self.sender_name}
-"""
-        
-        redirect_params = urlencode({
-            "redirect": "/dashboard/user",
-            "ticket": ticket_id
-        })
-        action_link = f"{self.app_base_url}/login?{redirect_params}"
-        html_body = f"""
-<html>
-<body>
-    <h2>Nouveau commentaire</h2>
-    <p>Bonjour {creator_name},</p>
-    <p>Un nouveau commentaire a été ajouté sur votre ticket.</p>
-    <div style="background-color: #f5f5f5; padding: 15px; border-radius: 5px; margin: 15px 0;">
-        <p><strong>Détails du ticket :</strong></p>
-        <ul>
-            <li><strong>Numéro :</strong> #{ticket_number}</li>
-            <li><strong>Titre :</strong> {ticket_title}</li>
-            <li><strong>Commentaire de :</strong> {commenter_name}</li>
-        </ul>
-    </div>
-    <div style="background-color: #e7f3ff; padding: 15px; border-radius: 5px; margin: 15px 0; border-left: 4px solid #007bff;">
-        <p><strong>Commentaire :</strong></p>
-        <p>{comment_content}</p>
-    </div>
-    <div style="margin: 20px 0;">
-        <a href="{action_link}" style="background:#007bff;color:#fff;text-decoration:none;padding:10px 16px;border-radius:6px;display:inline-block">Voir le ticket</a>
-    </div>
-    <p>Cordialement,<br>{self.sender_name}</p>
-</body>
-</html>
-"""
-        
-        return self.send_email([creator_email], subject, body, html_body)
+        rendered = self.render(
+            "comment_added",
+            recipient_name=creator_name,
+            ticket_id=ticket_id,
+            ticket_number=ticket_number,
+            ticket_title=ticket_title,
+            commenter_name=commenter_name,
+            comment_content=comment_content,
+        )
+        return self.send_rendered([creator_email], rendered)
     
     def send_priority_changed_notification(
         self,
@@ -1022,52 +699,16 @@ Cordialement,
         new_priority: str
     ) -> bool:
         """Envoie une notification à l'utilisateur lorsque la priorité change"""
-        subject = f"Priorité modifiée pour votre ticket #{ticket_number}"
-        
-        body = f"""
-Bonjour {creator_name},
-
-La priorité de votre ticket a été modifiée.
-
-Détails du ticket :
-• Numéro : #{ticket_number}
-• Titre : {ticket_title}
-• Ancienne priorité : {old_priority}
-• Nouvelle priorité : {new_priority}
-
-Cordialement,
-{self.sender_name}
-"""
-        
-        redirect_params = urlencode({
-            "redirect": "/dashboard/user",
-            "ticket": ticket_id
-        })
-        action_link = f"{self.app_base_url}/login?{redirect_params}"
-        html_body = f"""
-<html>
-<body>
-    <h2>Priorité modifiée</h2>
-    <p>Bonjour {creator_name},</p>
-    <p>La priorité de votre ticket a été modifiée.</p>
-    <div style="background-color: #f5f5f5; padding: 15px; border-radius: 5px; margin: 15px 0;">
-        <p><strong>Détails du ticket :</strong></p>
-        <ul>
-            <li><strong>Numéro :</strong> #{ticket_number}</li>
-            <li><strong>Titre :</strong> {ticket_title}</li>
-            <li><strong>Ancienne priorité :</strong> {old_priority}</li>
-            <li><strong>Nouvelle priorité :</strong> <strong style="color: #dc3545;">{new_priority}</strong></li>
-        </ul>
-    </div>
-    <div style="margin: 20px 0;">
-        <a href="{action_link}" style="background:#007bff;color:#fff;text-decoration:none;padding:10px 16px;border-radius:6px;display:inline-block">Voir le ticket</a>
-    </div>
-    <p>Cordialement,<br>{self.sender_name}</p>
-</body>
-</html>
-"""
-        
-        return self.send_email([creator_email], subject, body, html_body)
+        rendered = self.render(
+            "priority_changed",
+            recipient_name=creator_name,
+            ticket_id=ticket_id,
+            ticket_number=ticket_number,
+            ticket_title=ticket_title,
+            old_priority=old_priority,
+            new_priority=new_priority,
+        )
+        return self.send_rendered([creator_email], rendered)
     
     def send_technician_changed_notification(
         self,
@@ -1080,57 +721,16 @@ Cordialement,
         new_technician_name: str
     ) -> bool:
         """Envoie une notification à l'utilisateur lorsque le technicien change"""
-        subject = f"Technicien modifié pour votre ticket #{ticket_number}"
-        
-        technician_info = f"• Nouveau technicien : {new_technician_name}"
-        if old_technician_name:
-            technician_info = f"• Ancien technicien : {old_technician_name}\n{technician_info}"
-        
-        body = f"""
-Bonjour {creator_name},
-
-Votre ticket a été réassigné à un autre technicien.
-
-Détails du ticket :
-• Numéro : #{ticket_number}
-• Titre : {ticket_title}
-{technician_info}
-
-Cordialement,
-{self.sender_name}
-"""
-        
-        redirect_params = urlencode({
-            "redirect": "/dashboard/user",
-            "ticket": ticket_id
-        })
-        action_link = f"{self.app_base_url}/login?{redirect_params}"
-        html_body = f"""
-<html>
-<body>
-    <h2>Technicien modifié</h2>
-    <p>Bonjour {creator_name},</p>
-    <p>Votre ticket a été réassigné à un autre technicien.</p>
-    <div style="background-color: #f5f5f5; padding: 15px; border-radius: 5px; margin: 15px 0;">
-        <p><strong>Détails du ticket :</strong></p>
-        <ul>
-            <li><strong>Numéro :</strong> #{ticket_number}</li>
-            <li><strong>Titre :</strong> {ticket_title}</li>
-"""
-        if old_technician_name:
-            html_body += f"            <li><strong>Ancien technicien :</strong> {old_technician_name}</li>\n"
-        html_body += f"""            <li><strong>Nouveau technicien :</strong> {new_technician_name}</li>
-        </ul>
-    </div>
-    <div style="margin: 20px 0;">
-        <a href="{action_link}" style="background:#007bff;color:#fff;text-decoration:none;padding:10px 16px;border-radius:6px;display:inline-block">Voir le ticket</a>
-    </div>
-    <p>Cordialement,<br>{self.sender_name}</p>
-</body>
-</html>
-"""
-        
-        return self.send_email([creator_email], subject, body, html_body)
+        rendered = self.render(
+            "technician_changed",
+            recipient_name=creator_name,
+            ticket_id=ticket_id,
+            ticket_number=ticket_number,
+            ticket_title=ticket_title,
+            old_technician_name=old_technician_name,
+            new_technician_name=new_technician_name,
+        )
+        return self.send_rendered([creator_email], rendered)
     
     def send_ticket_reopened_notification(
         self,
@@ -1141,53 +741,14 @@ Cordialement,
         creator_name: str
     ) -> bool:
         """Envoie une notification à l'utilisateur lorsque le ticket est réouvert"""
-        subject = f"Votre ticket #{ticket_number} a été réouvert"
-        
-        body = f"""
-Bonjour {creator_name},
-
-Votre ticket a été réouvert pour traitement supplémentaire.
-
-Détails du ticket :
-• Numéro : #{ticket_number}
-• Titre : {ticket_title}
-
-Le ticket sera traité à nouveau par un technicien.
-
-Cordialement,
-{self.sender_name}
-"""
-        
-        redirect_params = urlencode({
-            "redirect": "/dashboard/user",
-            "ticket": ticket_id
-        })
-        action_link = f"{self.app_base_url}/login?{redirect_params}"
-        html_body = f"""
-<html>
-<body>
-    <h2>Ticket réouvert</h2>
-    <p>Bonjour {creator_name},</p>
-    <div style="background-color: #d1ecf1; padding: 15px; border-radius: 5px; margin: 15px 0; border-left: 4px solid #0dcaf0;">
-        <p><strong>Votre ticket a été réouvert pour traitement supplémentaire.</strong></p>
-    </div>
-    <div style="background-color: #f5f5f5; padding: 15px; border-radius: 5px; margin: 15px 0;">
-        <p><strong>Détails du ticket :</strong></p>
-        <ul>
-            <li><strong>Numéro :</strong> #{ticket_number}</li>
-            <li><strong>Titre :</strong> {ticket_title}</li>
-        </ul>
-    </div>
-    <p>Le ticket sera traité à nouveau par un technicien.</p>
-    <div style="margin: 20px 0;">
-        <a href="{action_link}" style="background:#007bff;color:#fff;text-decoration:none;padding:10px 16px;border-radius:6px;display:inline-block">Voir le ticket</a>
-    </div>
-    <p>Cordialement,<br>{self.sender_name}</p>
-</body>
-</html>
-"""
-        
-        return self.send_email([creator_email], subject, body, html_body)
+        rendered = self.render(
+            "ticket_reopened",
+            recipient_name=creator_name,
+            ticket_id=ticket_id,
+            ticket_number=ticket_number,
+            ticket_title=ticket_title,
+        )
+        return self.send_rendered([creator_email], rendered)
     
     def send_ticket_closed_notification_to_user(
         self,
@@ -1198,55 +759,50 @@ Cordialement,
         creator_name: str
     ) -> bool:
         """Envoie une notification à l'utilisateur lorsque le ticket est clôturé (après validation)"""
-        subject = f"Votre ticket #{ticket_number} a été clôturé"
-        
-        body = f"""
-Bonjour {creator_name},
-
-Votre ticket a été clôturé avec succès.
-
-Détails du ticket :
-• Numéro : #{ticket_number}
-• Titre : {ticket_title}
-
-Merci d'avoir utilisé notre service de support.
-
-Cordialement,
-{self.sender_name}
-"""
+        rendered = self.render(
+            "ticket_closed",
+            recipient_name=creator_name,
+            ticket_id=ticket_id,
+            ticket_number=ticket_number,
+            ticket_title=ticket_title,
+        )
+        return self.send_rendered([creator_email], rendered)
+    
+    def send_tickets_bulk_assigned_notification(
+        self,
+        technician_email: str,
+        technician_name: str,
+        tickets: List[dict],
+        notes: Optional[str] = None
+    ) -> bool:
+        """
+        Envoie une seule notification récapitulative lorsque plusieurs tickets sont assignés
+        au même technicien (assignation groupée)
         
-        redirect_params = urlencode({
-            "redirect": "/dashboard/user",
-            "ticket": ticket_id
-        })
-        action_link = f"{self.app_base_url}/login?{redirect_params}"
-        html_body = f"""
-<html>
-<body>
-    <h2>Ticket clôturé</h2>
-    <p>Bonjour {creator_name},</p>
-    <div style="background-color: #d4edda; padding: 15px; border-radius: 5px; margin: 15px 0; border-left: 4px solid #28a745;">
-        <p><strong>Votre ticket a été clôturé avec succès.</strong></p>
-    </div>
-    <div style="background-color: #f5f5f5; padding: 15px; border-radius: 5px; margin: 15px 0;">
-        <p><strong>Détails du ticket :</strong></p>
-        <ul>
-            <li><strong>Numéro :</strong> #{ticket_number}</li>
-            <li><strong>Titre :</strong> {ticket_title}</li>
-        </ul>
-    </div>
-    <p>Merci d'avoir utilisé notre service de support.</p>
-    <div style="margin: 20px 0;">
-        <a href="{action_link}" style="background:#007bff;color:#fff;text-decoration:none;padding:10px 16px;border-radius:6px;display:inline-block">Voir le ticket</a>
-    </div>
-    <p>Cordialement,<br>{self.sender_name}</p>
-</body>
-</html>
-"""
+        Args:
+            technician_email: Email du technicien
+            technician_name: Nom du technicien
+            tickets: Tickets assignés (clés number, title, priority)
+            notes: Instructions communes (optionnel)
         
-        return self.send_email([creator_email], subject, body, html_body)
+        Returns:
+            True si l'email a été envoyé avec succès
+        """
+        rendered = self.render(
+            "tickets_bulk_assigned",
+            recipient_name=technician_name,
+            tickets=tickets,
+            notes=notes,
+        )
+        return self.send_rendered([technician_email], rendered)
 
 
 # Instance globale du service email
 email_service = EmailService()
 
+
+
+def probe_smtp_if_due() -> None:
+    """Job périodique : teste le serveur SMTP quand le circuit est ouvert, sans attendre un envoi réel"""
+    if email_service.email_enabled and smtp_breaker.probe_due() and smtp_breaker.allow():
+        email_service.probe()
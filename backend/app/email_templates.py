@@ -0,0 +1,127 @@
+"""
+Gabarits des emails de notification (Jinja2)
+
+Chaque événement a un gabarit texte (<nom>.txt, qui porte aussi l'objet dans son bloc subject) et un
+gabarit HTML (<nom>.html). Les deux étendent la mise en page commune (base.txt / base.html : salutation,
+signature) et utilisent les macros partagées (détails du ticket, boutons, encadrés).
+
+Les gabarits sont rangés par langue (templates/email/<locale>/) et peuvent être déclinés par rôle du
+destinataire (<nom>.<rôle>.html, ex : ticket_created_actions.dsi.html), avec repli sur la version
+générique puis sur la langue par défaut.
+
+Tous les gabarits sont compilés une fois au démarrage (compile_all) et la résolution
+(gabarit, langue, rôle) -> gabarits compilés est mise en cache : un envoi n'exécute plus que le code
+compilé, à partir d'un dictionnaire de contexte. render_for_recipients produit un seul rendu par
+variante pour tous les destinataires d'un même événement.
+"""
+import os
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlencode
+
+from jinja2 import Environment, FileSystemLoader, StrictUndefined, TemplateNotFound, pass_context, select_autoescape
+
+EMAIL_TEMPLATES_DIR = os.getenv(
+    "EMAIL_TEMPLATES_DIR", os.path.join(os.path.dirname(__file__), "templates", "email")
+)
+EMAIL_DEFAULT_LOCALE = os.getenv("EMAIL_DEFAULT_LOCALE", "fr")
+
+
+class RenderedEmail(NamedTuple):
+    subject: str
+    body: str
+    html_body: str
+
+
+def role_slug(role: Optional[str]) -> Optional[str]:
+    """Nom de fichier de la variante d'un rôle : "Secrétaire DSI" -> "secretaire_dsi" """
+    if not role:
+        return None
+    ascii_role = unicodedata.normalize("NFKD", role).encode("ascii", "ignore").decode()
+    return "_".join(ascii_role.lower().split())
+
+
+@pass_context
+def login_url(context, redirect: str, **params) -> str:
+    """Lien vers /login avec redirection (force l'authentification avant d'ouvrir la page)"""
+    return f"{context['app_base_url']}/login?{urlencode({'redirect': redirect, **params})}"
+
+
+class EmailTemplateEngine:
+    """Gabarits compilés une fois, résolus par (gabarit, langue, rôle)"""
+
+    def __init__(self, directory: str = EMAIL_TEMPLATES_DIR, default_locale: str = EMAIL_DEFAULT_LOCALE):
+        self.default_locale = default_locale
+        self.env = Environment(
+            loader=FileSystemLoader(directory),
+            autoescape=select_autoescape(enabled_extensions=("html",), default_for_string=False),
+            undefined=StrictUndefined,
+            trim_blocks=True,
+            lstrip_blocks=True,
+            keep_trailing_newline=True,
+            # Gabarits figés au déploiement : ni vérification du fichier à chaque rendu, ni éviction
+            auto_reload=False,
+            cache_size=-1,
+        )
+        self.env.globals["login_url"] = login_url
+        self._resolve = lru_cache(maxsize=1024)(self._resolve_uncached)
+
+    def compile_all(self) -> int:
+        """Compile tous les gabarits (appelé au démarrage) ; renvoie leur nombre"""
+        names = self.env.list_templates(extensions=["html", "txt"])
+        for name in names:
+            self.env.get_template(name)
+        self._resolve.cache_clear()
+        print(f"[EMAIL] {len(names)} gabarit(s) d'email compilé(s)")
+        return len(names)
+
+    def _find(self, name: str, locale: str, role: Optional[str], extension: str):
+        slug = role_slug(role)
+        locales = [locale] if locale == self.default_locale else [locale, self.default_locale]
+        for candidate_locale in locales:
+            candidates = [f"{candidate_locale}/{name}.{extension}"]
+            if slug:
+                candidates.insert(0, f"{candidate_locale}/{name}.{slug}.{extension}")
+            for candidate in candidates:
+                try:
+                    return self.env.get_template(candidate)
+                except TemplateNotFound:
+                    continue
+        raise TemplateNotFound(f"{locale}/{name}.{extension}")
+
+    def _resolve_uncached(self, name: str, locale: str, role: Optional[str]):
+        return self._find(name, locale, role, "txt"), self._find(name, locale, role, "html")
+
+    def render(
+        self, name: str, context: Dict, locale: Optional[str] = None, role: Optional[str] = None
+    ) -> RenderedEmail:
+        """Rend l'objet, le texte brut et le HTML d'un événement"""
+        text_template, html_template = self._resolve(name, locale or self.default_locale, role)
+        context = {**context, "recipient_role": role}
+        subject = "".join(text_template.blocks["subject"](text_template.new_context(context))).strip()
+        return RenderedEmail(subject, text_template.render(context), html_template.render(context))
+
+    def render_for_recipients(
+        self,
+        name: str,
+        context: Dict,
+        recipients: Iterable[Tuple[str, Optional[str]]],
+        locale: Optional[str] = None,
+    ) -> List[Tuple[RenderedEmail, List[str]]]:
+        """
+        Pré-rend un événement pour plusieurs destinataires (email, rôle) : un seul rendu par rôle,
+        puis regroupement des destinataires qui reçoivent exactement le même contenu
+        (ex : Secrétaire DSI et Adjoint DSI)
+        """
+        by_role: Dict[Optional[str], List[str]] = {}
+        for email, role in recipients:
+            by_role.setdefault(role, []).append(email)
+        groups: Dict[RenderedEmail, List[str]] = {}
+        for role, emails in by_role.items():
+            groups.setdefault(self.render(name, context, locale=locale, role=role), []).extend(emails)
+        return list(groups.items())
+
+
+# Instance globale des gabarits d'email
+email_templates = EmailTemplateEngine()
@@ -0,0 +1,237 @@
+"""
+Transport SMTP asynchrone (aiosmtplib) pour EmailService
+
+Activé par EMAIL_TRANSPORT=async. Les envois sont exécutés sur une boucle asyncio dédiée, dans un seul
+thread : un email en cours d'envoi (handshake TLS, DATA) n'occupe plus un worker du threadpool, et
+EmailService.send_email rend la main dès que le message est mis en file. Les appels viennent aussi bien
+des tâches d'arrière-plan des endpoints que des jobs APScheduler (app/scheduler.py, app/digests.py),
+d'où une boucle propre au transport plutôt que celle du serveur.
+
+Le nombre de sessions SMTP simultanées est borné par serveur (EMAIL_MAX_CONCURRENCY_PER_HOST) pour ne
+pas dépasser les limites de connexions du relais.
+
+Quel que soit le transport, une session SMTP est bornée dans le temps (connexion, chaque commande, envoi
+complet) et les envois passent par un disjoncteur (smtp_breaker) : après EMAIL_BREAKER_FAILURE_THRESHOLD
+échecs consécutifs, plus aucune connexion n'est tentée pendant EMAIL_BREAKER_OPEN_SECONDS secondes, puis un
+seul envoi (ou la sonde périodique) teste le relais avant de rouvrir le flux.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from email.message import Message
+from typing import Dict, List, NamedTuple, Optional
+
+import aiosmtplib
+
+EMAIL_MAX_CONCURRENCY_PER_HOST = int(os.getenv("EMAIL_MAX_CONCURRENCY_PER_HOST", "10"))
+EMAIL_DRAIN_TIMEOUT_SECONDS = float(os.getenv("EMAIL_DRAIN_TIMEOUT_SECONDS", "30"))
+EMAIL_CONNECT_TIMEOUT_SECONDS = float(os.getenv("EMAIL_CONNECT_TIMEOUT_SECONDS", "10"))
+EMAIL_COMMAND_TIMEOUT_SECONDS = float(os.getenv("EMAIL_COMMAND_TIMEOUT_SECONDS", "30"))
+EMAIL_SEND_TIMEOUT_SECONDS = float(os.getenv("EMAIL_SEND_TIMEOUT_SECONDS", "60"))  # Session SMTP complète
+EMAIL_BREAKER_FAILURE_THRESHOLD = int(os.getenv("EMAIL_BREAKER_FAILURE_THRESHOLD", "5"))
+EMAIL_BREAKER_OPEN_SECONDS = float(os.getenv("EMAIL_BREAKER_OPEN_SECONDS", "60"))
+EMAIL_BREAKER_PROBE_SECONDS = int(os.getenv("EMAIL_BREAKER_PROBE_SECONDS", "30"))
+
+
+class SmtpSettings(NamedTuple):
+    host: str
+    port: int
+    username: str
+    password: str
+    start_tls: bool  # STARTTLS après connexion (port 587)
+    implicit_tls: bool  # TLS dès la connexion (port 465, comme smtplib.SMTP_SSL)
+    verify_ssl: bool
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur des envois SMTP
+
+    - closed    : envois normaux, les échecs consécutifs sont comptés
+    - open      : aucun envoi tenté jusqu'à next_probe_at (échec immédiat, sans connexion)
+    - half_open : un seul envoi de test autorisé ; succès -> closed, échec -> open
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = EMAIL_BREAKER_FAILURE_THRESHOLD,
+        open_seconds: float = EMAIL_BREAKER_OPEN_SECONDS,
+    ):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.rejected_count = 0  # Envois refusés depuis la dernière ouverture
+        self.opened_at: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self.last_failure_at: Optional[datetime] = None
+        self._next_probe_at = 0.0  # time.monotonic()
+        self._probe_started_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Autorise-t-on une tentative d'envoi ? (en half_open, une seule à la fois)"""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            now = time.monotonic()
+            if self.state == "open" and now >= self._next_probe_at:
+                self.state = "half_open"
+                self._probe_started_at = now
+                return True
+            if self.state == "half_open" and now - self._probe_started_at > EMAIL_SEND_TIMEOUT_SECONDS * 2:
+                # Résultat du test jamais remonté (transport arrêté) : on en autorise un autre
+                self._probe_started_at = now
+                return True
+            self.rejected_count += 1
+            return False
+
+    def probe_due(self) -> bool:
+        with self._lock:
+            return self.state == "open" and time.monotonic() >= self._next_probe_at
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != "closed":
+                print(f"[EMAIL] Serveur SMTP de nouveau joignable, circuit refermé ({self.rejected_count} email(s) non envoyé(s))")
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self.rejected_count = 0
+            self.opened_at = None
+
+    def record_failure(self, error: BaseException) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            self.last_error = str(error) or type(error).__name__
+            self.last_failure_at = datetime.utcnow()
+            if self.state == "half_open" or (
+                self.state == "closed" and self.consecutive_failures >= self.failure_threshold
+            ):
+                if self.state == "closed":
+                    self.opened_at = self.last_failure_at
+                    self.rejected_count = 0
+                    print(
+                        f"[EMAIL] Circuit ouvert après {self.consecutive_failures} échec(s) consécutif(s), "
+                        f"prochain test dans {self.open_seconds:.0f} s : {self.last_error}"
+                    )
+                self.state = "open"
+                self._next_probe_at = time.monotonic() + self.open_seconds
+
+    def reset(self) -> None:
+        """Referme le circuit (paramètres SMTP modifiés)"""
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self.rejected_count = 0
+            self.opened_at = None
+            self._next_probe_at = 0.0
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            next_probe_at = None
+            if self.state == "open":
+                remaining = max(0.0, self._next_probe_at - time.monotonic())
+                next_probe_at = datetime.utcnow() + timedelta(seconds=remaining)
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "rejected_count": self.rejected_count,
+                "opened_at": self.opened_at,
+                "next_probe_at": next_probe_at,
+                "last_error": self.last_error,
+                "last_failure_at": self.last_failure_at,
+            }
+
+
+class AsyncSmtpTransport:
+    """Boucle asyncio dédiée aux envois, concurrence bornée par serveur SMTP"""
+
+    def __init__(self, max_concurrency_per_host: int = EMAIL_MAX_CONCURRENCY_PER_HOST):
+        self.max_concurrency_per_host = max_concurrency_per_host
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._semaphores: Dict[tuple, asyncio.Semaphore] = {}
+        self._pending: set = set()
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="email-transport", daemon=True)
+                thread.start()
+                self._loop, self._thread = loop, thread
+            return self._loop
+
+    async def _send(self, settings: SmtpSettings, message: Message, recipients: List[str]) -> None:
+        key = (settings.host, settings.port)
+        semaphore = self._semaphores.get(key)
+        if semaphore is None:
+            semaphore = self._semaphores[key] = asyncio.Semaphore(self.max_concurrency_per_host)
+        async with semaphore:
+            # Le délai total ne court qu'une fois la session ouverte (pas pendant l'attente du sémaphore)
+            await asyncio.wait_for(self._deliver(settings, message, recipients), EMAIL_SEND_TIMEOUT_SECONDS)
+
+    async def _deliver(self, settings: SmtpSettings, message: Message, recipients: List[str]) -> None:
+        client = aiosmtplib.SMTP(
+            hostname=settings.host,
+            port=settings.port,
+            username=settings.username or None,
+            password=settings.password or None,
+            start_tls=settings.start_tls,
+            use_tls=settings.implicit_tls,
+            validate_certs=settings.verify_ssl,
+            timeout=EMAIL_COMMAND_TIMEOUT_SECONDS,
+        )
+        await client.connect(timeout=EMAIL_CONNECT_TIMEOUT_SECONDS)
+        try:
+            await client.send_message(message, recipients=recipients)
+            try:
+                await client.quit()
+            except aiosmtplib.SMTPException:
+                pass  # Message déjà accepté par le relais
+        finally:
+            client.close()
+
+    def submit(self, settings: SmtpSettings, message: Message, recipients: List[str]) -> Future:
+        """Met un message en file depuis n'importe quel thread ; renvoie un Future de l'envoi"""
+        future = asyncio.run_coroutine_threadsafe(
+            self._send(settings, message, recipients), self._ensure_loop()
+        )
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    async def send(self, settings: SmtpSettings, message: Message, recipients: List[str]) -> None:
+        """Envoie un message depuis du code asynchrone (quelle que soit sa boucle) et attend le résultat"""
+        await asyncio.wrap_future(self.submit(settings, message, recipients))
+
+    def _done(self, future: Future) -> None:
+        with self._lock:
+            self._pending.discard(future)
+
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def drain(self, timeout: float = EMAIL_DRAIN_TIMEOUT_SECONDS) -> None:
+        """Attend la fin des envois en cours (arrêt de l'application)"""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            pending = list(self._pending)
+        for future in pending:
+            try:
+                future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except Exception:
+                pass  # Erreur déjà journalisée par le callback d'EmailService
+
+
+# Instance globale du transport asynchrone
+email_transport = AsyncSmtpTransport()
+
+# Disjoncteur partagé par les deux transports
+smtp_breaker = CircuitBreaker()
@@ -0,0 +1,203 @@
+"""
+Export des tickets en flux (CSV, XLSX, NDJSON)
+
+Les lignes sont lues avec un curseur côté serveur (yield_per / stream_results) et écrites
+lot par lot : la mémoire utilisée reste constante quel que soit le nombre de tickets exportés.
+"""
+import csv
+import io
+import json
+import os
+import tempfile
+from datetime import date, datetime
+from enum import Enum
+from typing import Iterator, List
+
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import aliased
+
+from . import models
+from .database import SessionLocal
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "2000"))
+
+# Limite de lignes d'une feuille Excel (en-tête compris) : au-delà, une nouvelle feuille est créée
+XLSX_MAX_ROWS_PER_SHEET = 1_048_576
+
+# Débuts de texte interprétés comme une formule par Excel / LibreOffice (injection de formules via un titre,
+# une description, un commentaire... : =HYPERLINK(...), =1+1)
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+EXPORT_COLUMNS = [
+    "id",
+    "number",
+    "title",
+    "description",
+    "type",
+    "priority",
+    "status",
+    "category",
+    "user_agency",
+    "creator_name",
+    "creator_email",
+    "technician_name",
+    "technician_email",
+    "created_at",
+    "assigned_at",
+    "first_in_progress_at",
+    "resolved_at",
+    "closed_at",
+    "auto_closed_at",
+    "feedback_score",
+    "feedback_comment",
+]
+
+
+def build_export_query(criteria: List):
+    """Requête d'export : tickets + créateur/technicien + première prise en charge (historique) + feedback"""
+    creator = aliased(models.User)
+    technician = aliased(models.User)
+    first_in_progress = (
+        select(
+            models.TicketHistory.ticket_id,
+            func.min(models.TicketHistory.changed_at).label("first_in_progress_at"),
+        )
+        .where(models.TicketHistory.new_status == models.TicketStatus.EN_COURS)
+        .group_by(models.TicketHistory.ticket_id)
+        .subquery()
+    )
+    return (
+        select(
+            models.Ticket.id,
+            models.Ticket.number,
+            models.Ticket.title,
+            models.Ticket.description,
+            models.Ticket.type,
+            models.Ticket.priority,
+            models.Ticket.status,
+            models.Ticket.category,
+            models.Ticket.user_agency,
+            creator.full_name.label("creator_name"),
+            creator.email.label("creator_email"),
+            technician.full_name.label("technician_name"),
+            technician.email.label("technician_email"),
+            models.Ticket.created_at,
+            models.Ticket.assigned_at,
+            first_in_progress.c.first_in_progress_at,
+            models.Ticket.resolved_at,
+            models.Ticket.closed_at,
+            models.Ticket.auto_closed_at,
+            models.Ticket.feedback_score,
+            models.Ticket.feedback_comment,
+        )
+        .outerjoin(creator, creator.id == models.Ticket.creator_id)
+        .outerjoin(technician, technician.id == models.Ticket.technician_id)
+        .outerjoin(first_in_progress, first_in_progress.c.ticket_id == models.Ticket.id)
+        .where(*criteria)
+        .order_by(models.Ticket.id)
+    )
+
+
+def _cell(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _is_formula_like(value) -> bool:
+    return isinstance(value, str) and value.startswith(FORMULA_PREFIXES)
+
+
+def _csv_cell(value):
+    # Apostrophe en tête : le tableur affiche le texte tel quel au lieu d'évaluer la formule
+    if _is_formula_like(value):
+        return "'" + value
+    return value
+
+
+def _stream_batches(criteria: List) -> Iterator[List[tuple]]:
+    """Lots de lignes lus via un curseur serveur, dans une session propre au flux"""
+    db = SessionLocal()
+    try:
+        # Un export complet dépasse le statement_timeout appliqué aux requêtes de l'API
+        db.execute(text("SET LOCAL statement_timeout = 0"))
+        result = db.execute(build_export_query(criteria).execution_options(yield_per=EXPORT_BATCH_SIZE))
+        for partition in result.partitions():
+            yield [tuple(_cell(value) for value in row) for row in partition]
+    finally:
+        db.close()
+
+
+def iter_csv(criteria: List) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM UTF-8 pour une ouverture correcte des accents dans Excel
+    buffer.write("\ufeff")
+    writer.writerow(EXPORT_COLUMNS)
+    for batch in _stream_batches(criteria):
+        writer.writerows([_csv_cell(value) for value in row] for row in batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def iter_ndjson(criteria: List) -> Iterator[bytes]:
+    for batch in _stream_batches(criteria):
+        yield "".join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + "\n" for row in batch
+        ).encode("utf-8")
+
+
+def iter_xlsx(criteria: List) -> Iterator[bytes]:
+    """
+    Le format XLSX (archive zip) ne peut pas être émis avant d'être complet : le classeur est écrit
+    en mode write_only (lignes vidées sur disque au fil de l'eau) dans un fichier temporaire, puis envoyé par blocs.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+    def xlsx_cell(sheet, value):
+        if not isinstance(value, str):
+            return value
+        # Caractères de contrôle interdits en XML (\x0b, \x1f...) : IllegalCharacterError sinon
+        value = ILLEGAL_CHARACTERS_RE.sub("", value)
+        if not _is_formula_like(value):
+            return value
+        # openpyxl écrit toute chaîne commençant par "=" comme une formule : type texte imposé
+        cell = WriteOnlyCell(sheet, value)
+        cell.data_type = "s"
+        return cell
+
+    with tempfile.TemporaryFile() as tmp:
+        workbook = Workbook(write_only=True)
+        sheet = None
+        sheet_rows = XLSX_MAX_ROWS_PER_SHEET
+        for batch in _stream_batches(criteria):
+            for row in batch:
+                if sheet_rows >= XLSX_MAX_ROWS_PER_SHEET:
+                    sheet = workbook.create_sheet(f"Tickets {len(workbook.worksheets) + 1}")
+                    sheet.append(EXPORT_COLUMNS)
+                    sheet_rows = 1
+                sheet.append([xlsx_cell(sheet, value) for value in row])
+                sheet_rows += 1
+        if sheet is None:
+            workbook.create_sheet("Tickets 1").append(EXPORT_COLUMNS)
+        workbook.save(tmp)
+        tmp.seek(0)
+        while True:
+            chunk = tmp.read(64 * 1024)
+            if not chunk:
+                break
+            yield chunk
+
+
+EXPORT_FORMATS = {
+    "csv": (iter_csv, "text/csv; charset=utf-8"),
+    "ndjson": (iter_ndjson, "application/x-ndjson"),
+    "xlsx": (iter_xlsx, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
@@ -1,15 +1,41 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 
-from .routers import auth, tickets, users, notifications, settings, ticket_config
-from .scheduler import run_scheduled_tasks
+from .routers import auth, tickets, users, notifications, settings, ticket_config, stats, reports, metrics, profiles
+from .scheduler import (
+    SCHEDULED_ACTIONS_POLL_SECONDS,
+    process_scheduled_actions,
+    register_scheduled_actions_listener,
+)
+from .config_cache import config_cache
+from .email_templates import email_templates
+from .email_transport import EMAIL_BREAKER_PROBE_SECONDS, email_transport
+from .email_service import probe_smtp_if_due
+from .metrics import METRICS_ENABLED, instrument_job, register_metrics
+from .attachments import AttachmentUploadLimitMiddleware
+from .query_stats import QueryStatsMiddleware, register_query_stats_listeners
+from .profiling import PROFILING_ENABLED, register_profiling
+from .digests import DIGEST_POLL_SECONDS, process_email_digests, register_digest_filter
+from .stats_rollup import register_rollup_listener
+from .reports import REPORT_STALE_MINUTES, resume_pending_reports
+from .sla import SLA_CHECK_SECONDS, process_due_sla, register_sla_listener
+from .dispatch import (
+    AUTO_DISPATCH_ENABLED,
+    DISPATCH_RESYNC_MINUTES,
+    register_dispatch_listeners,
+    resync_load_board,
+)
 
 
 def create_app() -> FastAPI:
     app = FastAPI(title="Système de gestion des tickets")
 
+    # Pièces jointes trop volumineuses refusées sur leur Content-Length, avant la lecture du corps
+    # (ajouté avant CORS : la réponse 413 reçoit les en-têtes CORS et reste lisible par le frontend)
+    app.add_middleware(AttachmentUploadLimitMiddleware)
+
     # Configuration CORS pour permettre les requêtes depuis le frontend
     app.add_middleware(
         CORSMiddleware,
@@ -25,6 +51,15 @@ def create_app() -> FastAPI:
         expose_headers=["*"],
     )
 
+    # Requêtes SQL et temps en base par requête (en-têtes X-DB-* si QUERY_STATS_DEBUG=true)
+    register_query_stats_listeners()
+    app.add_middleware(QueryStatsMiddleware)
+
+    # Métriques Prometheus (latence par route, requêtes SQL par requête) exposées sur /metrics
+    if METRICS_ENABLED:
+        register_metrics(app)
+        app.include_router(metrics.router)
+
     # Routers principaux
     app.include_router(auth.router, prefix="/auth", tags=["auth"])
     app.include_router(tickets.router, prefix="/tickets", tags=["tickets"])
@@ -32,17 +67,105 @@ def create_app() -> FastAPI:
     app.include_router(notifications.router, prefix="/notifications", tags=["notifications"])
     app.include_router(settings.router, tags=["settings"])
     app.include_router(ticket_config.router)
+    app.include_router(stats.router)
+    app.include_router(reports.router)
+
+    # Profilage par échantillonnage : à la demande (X-Profile, administrateurs) et d'une requête sur N.
+    # Après l'inclusion des routers (endpoints enveloppés) ; middleware le plus externe.
+    if PROFILING_ENABLED:
+        app.include_router(profiles.router)
+        register_profiling(app)
+
+    # Mettre à jour les agrégats journaliers à chaque écriture de tickets/historique
+    register_rollup_listener()
+
+    # Échéances SLA calculées à la création et recalculées à chaque changement de statut/priorité
+    register_sla_listener()
+
+    # Rappels de validation et clôture automatique planifiés à la résolution, annulés à la sortie du statut RESOLU
+    register_scheduled_actions_listener()
+
+    # Utilisateurs en mode digest : pas d'email par événement, un récapitulatif périodique
+    register_digest_filter()
+
+    # Précharger le cache de configuration (types, catégories, rôles) et écouter ses invalidations
+    app.add_event_handler("startup", config_cache.start)
+    app.add_event_handler("shutdown", config_cache.stop)
+
+    # Compiler les gabarits d'email une fois pour toutes
+    app.add_event_handler("startup", email_templates.compile_all)
+
+    # Laisser le transport asynchrone terminer les emails en file avant l'arrêt
+    app.add_event_handler("shutdown", email_transport.drain)
+
+    # Relancer les rapports demandés avant un redémarrage
+    app.add_event_handler("startup", resume_pending_reports)
+
+    # Assignation automatique : charge des techniciens tenue en mémoire (après le cache des rôles)
+    if AUTO_DISPATCH_ENABLED:
+        register_dispatch_listeners()
+        app.add_event_handler("startup", resync_load_board)
 
     # Configurer le scheduler pour exécuter les tâches planifiées
     scheduler = BackgroundScheduler()
-    # Exécuter toutes les heures
+    # Actions planifiées échues (rappels, clôtures) : seules les lignes dues sont lues
+    scheduler.add_job(
+        instrument_job(process_scheduled_actions),
+        trigger=IntervalTrigger(seconds=SCHEDULED_ACTIONS_POLL_SECONDS),
+        id='process_scheduled_actions',
+        name='Exécuter les actions planifiées échues (rappels et clôtures)',
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True
+    )
+    # Alertes et escalades SLA : seules les échéances passées sont lues (index partiel)
+    scheduler.add_job(
+        instrument_job(process_due_sla),
+        trigger=IntervalTrigger(seconds=SLA_CHECK_SECONDS),
+        id='process_due_sla',
+        name='Émettre les alertes SLA échues',
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True
+    )
+    # Digests de notifications : seuls les utilisateurs dont le digest est échu sont lus
+    scheduler.add_job(
+        instrument_job(process_email_digests),
+        trigger=IntervalTrigger(seconds=DIGEST_POLL_SECONDS),
+        id='process_email_digests',
+        name='Envoyer les digests de notifications échus',
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True
+    )
+    # Rapports abandonnés par un processus arrêté pendant leur génération
+    scheduler.add_job(
+        instrument_job(resume_pending_reports),
+        trigger=IntervalTrigger(minutes=REPORT_STALE_MINUTES),
+        id='resume_pending_reports',
+        name='Relancer les rapports abandonnés',
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True
+    )
+    # Circuit SMTP ouvert : tester périodiquement le serveur pour reprendre les envois dès son retour
     scheduler.add_job(
-        run_scheduled_tasks,
-        trigger=CronTrigger(minute=0),  # Toutes les heures à la minute 0
-        id='run_scheduled_tasks',
-        name='Exécuter les tâches planifiées (rappels et clôtures)',
+        instrument_job(probe_smtp_if_due),
+        trigger=IntervalTrigger(seconds=EMAIL_BREAKER_PROBE_SECONDS),
+        id='probe_smtp_if_due',
+        name='Tester le serveur SMTP quand le circuit est ouvert',
+        max_instances=1,
+        coalesce=True,
         replace_existing=True
     )
+    if AUTO_DISPATCH_ENABLED:
+        scheduler.add_job(
+            instrument_job(resync_load_board),
+            trigger=IntervalTrigger(minutes=DISPATCH_RESYNC_MINUTES),
+            id='resync_load_board',
+            name='Resynchroniser la charge des techniciens (assignation automatique)',
+            replace_existing=True
+        )
     scheduler.start()
 
     return app
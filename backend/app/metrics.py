@@ -0,0 +1,174 @@
+"""
+Métriques Prometheus de l'API, de la base de données, des emails et des jobs planifiés
+
+Exposées au format texte Prometheus sur GET /metrics (app/routers/metrics.py) :
+- requêtes HTTP : latence par route (histogramme), nombre par route et code de statut, requêtes en cours
+- base de données : état du pool SQLAlchemy, nombre de requêtes SQL et temps passé en base par requête
+  HTTP (compteurs de app/query_stats.py)
+- emails : durée et échecs des envois SMTP, état du disjoncteur
+- jobs APScheduler : durée, lignes traitées, échecs
+
+Le coût doit rester négligeable en production : le middleware est un middleware ASGI pur (pas de
+BaseHTTPMiddleware), les routes sont étiquetées par leur gabarit (/tickets/{ticket_id}) et non par l'URL,
+et les valeurs lues à la collecte (pool, disjoncteur) ne sont calculées que lors d'un scrape.
+Voir benchmark_metrics.py pour la mesure du surcoût.
+
+Les compteurs sont propres à chaque processus : avec plusieurs workers, chaque worker est scrapé
+séparément (ou PROMETHEUS_MULTIPROC_DIR, voir la documentation de prometheus_client).
+"""
+import os
+import time
+from functools import wraps
+from typing import Callable, Dict, Optional, Tuple
+
+from prometheus_client import REGISTRY, Counter, Gauge, Histogram
+from prometheus_client.core import GaugeMetricFamily
+
+from .database import engine
+from .email_transport import smtp_breaker
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")  # Exigé en "Authorization: Bearer <token>"
+# Sans METRICS_TOKEN, /metrics est refusé sauf exposition explicitement publique (réseau interne, tests)
+METRICS_PUBLIC = os.getenv("METRICS_PUBLIC", "false").lower() == "true"
+
+# Bornes adaptées à une API interne : de 5 ms à 10 s
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 500)
+DB_TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "Requêtes HTTP traitées", ["method", "route", "status"]
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "Durée des requêtes HTTP", ["method", "route"], buckets=LATENCY_BUCKETS
+)
+HTTP_IN_PROGRESS = Gauge("http_requests_in_progress", "Requêtes HTTP en cours de traitement")
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request", "Requêtes SQL exécutées par requête HTTP", ["route"], buckets=QUERY_COUNT_BUCKETS
+)
+DB_TIME_PER_REQUEST = Histogram(
+    "db_time_per_request_seconds", "Temps passé en base par requête HTTP", ["route"], buckets=DB_TIME_BUCKETS
+)
+
+EMAIL_SEND_LATENCY = Histogram(
+    "email_send_duration_seconds", "Durée d'une session SMTP d'envoi", ["transport"], buckets=LATENCY_BUCKETS
+)
+EMAIL_SENT = Counter("email_sent_total", "Emails acceptés par le serveur SMTP", ["transport"])
+EMAIL_FAILURES = Counter(
+    "email_send_failures_total", "Emails non envoyés", ["transport", "reason"]  # reason : error, circuit_open
+)
+
+JOB_DURATION = Histogram(
+    "scheduler_job_duration_seconds", "Durée d'exécution des jobs planifiés", ["job"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+JOB_ROWS = Counter("scheduler_job_rows_total", "Lignes traitées par les jobs planifiés", ["job"])
+JOB_FAILURES = Counter("scheduler_job_failures_total", "Exécutions de jobs planifiés en erreur", ["job"])
+
+class _RuntimeCollector:
+    """Valeurs lues au moment du scrape : pool de connexions et disjoncteur SMTP"""
+
+    BREAKER_STATES = ("closed", "half_open", "open")
+
+    def collect(self):
+        pool = engine.pool
+        pool_metrics = GaugeMetricFamily("db_pool_connections", "Connexions du pool SQLAlchemy", labels=["state"])
+        pool_metrics.add_metric(["checked_out"], pool.checkedout())
+        pool_metrics.add_metric(["checked_in"], pool.checkedin())
+        pool_metrics.add_metric(["overflow"], max(0, pool.overflow()))
+        yield pool_metrics
+        yield GaugeMetricFamily("db_pool_size", "Taille configurée du pool SQLAlchemy", value=pool.size())
+
+        snapshot = smtp_breaker.snapshot()
+        breaker = GaugeMetricFamily("email_circuit_state", "État du disjoncteur SMTP (1 = état courant)", labels=["state"])
+        for state in self.BREAKER_STATES:
+            breaker.add_metric([state], 1 if snapshot["state"] == state else 0)
+        yield breaker
+        yield GaugeMetricFamily(
+            "email_circuit_consecutive_failures", "Échecs SMTP consécutifs", value=snapshot["consecutive_failures"]
+        )
+
+
+class MetricsMiddleware:
+    """Middleware ASGI : latence, statut, requêtes en cours et requêtes SQL par route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_code[0] = message["status"]
+            await send(message)
+
+        HTTP_IN_PROGRESS.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_IN_PROGRESS.dec()
+            # Gabarit de la route (renseigné par le routeur FastAPI), jamais l'URL brute
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            requests, latency, query_count, db_time = _route_metrics(scope["method"], route_path, status_code[0])
+            requests.inc()
+            latency.observe(elapsed)
+            # Compteurs ouverts par QueryStatsMiddleware (placé à l'intérieur de ce middleware)
+            stats = scope.get("query_stats")
+            if stats is not None:
+                query_count.observe(stats.count)
+                db_time.observe(stats.duration)
+
+
+# Séries étiquetées résolues une fois par (méthode, route, statut) : évite labels() à chaque requête
+_route_children: Dict[Tuple[str, str, int], tuple] = {}
+
+
+def _route_metrics(method: str, route_path: str, status_code: int) -> tuple:
+    key = (method, route_path, status_code)
+    children = _route_children.get(key)
+    if children is None:
+        children = _route_children[key] = (
+            HTTP_REQUESTS.labels(method, route_path, str(status_code)),
+            HTTP_LATENCY.labels(method, route_path),
+            DB_QUERIES_PER_REQUEST.labels(route_path),
+            DB_TIME_PER_REQUEST.labels(route_path),
+        )
+    return children
+
+
+REGISTRY.register(_RuntimeCollector())
+
+
+def instrument_job(job: Callable, name: Optional[str] = None) -> Callable:
+    """Enveloppe un job APScheduler : durée, échecs et lignes traitées (valeur de retour entière)"""
+    job_name = name or job.__name__
+
+    @wraps(job)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = job(*args, **kwargs)
+        except Exception:
+            JOB_FAILURES.labels(job_name).inc()
+            raise
+        finally:
+            JOB_DURATION.labels(job_name).observe(time.perf_counter() - start)
+        if isinstance(result, int) and not isinstance(result, bool):
+            JOB_ROWS.labels(job_name).inc(result)
+        return result
+
+    return wrapper
+
+
+def register_metrics(app) -> None:
+    """Installe le middleware (appelé par create_app, après QueryStatsMiddleware)"""
+    app.add_middleware(MetricsMiddleware)
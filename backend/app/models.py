@@ -1,17 +1,22 @@
 from datetime import datetime
 
 from sqlalchemy import (
+    BigInteger,
     Boolean,
     Column,
+    Date,
     DateTime,
     Enum,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
+    UniqueConstraint,
 )
-from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy.orm import relationship
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
+from sqlalchemy.orm import deferred, relationship
+from sqlalchemy.sql import text
 
 from .database import Base
 
@@ -44,6 +49,13 @@ class User(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     last_login_at = Column(DateTime, nullable=True)
 
+    # Envoi des notifications par email : immediate, interval (toutes les N minutes) ou daily
+    email_digest_mode = Column(String(20), nullable=False, default="immediate")
+    email_digest_interval_minutes = Column(Integer, nullable=True)
+    email_digest_next_at = Column(DateTime, nullable=True)  # Prochain digest à envoyer
+    email_digest_last_notification_id = Column(Integer, nullable=False, default=0)  # Dernière notification incluse
+    email_digest_switched_at = Column(DateTime, nullable=True)  # Retour à l'envoi immédiat (dernier digest)
+
     username = Column(String(100), unique=True, nullable=False)
     password_hash = Column(String(255), nullable=False)
 
@@ -57,6 +69,14 @@ class User(Base):
         "Ticket", back_populates="technician", foreign_keys="Ticket.technician_id"
     )
 
+    __table_args__ = (
+        Index(
+            "ix_users_email_digest_next_at",
+            "email_digest_next_at",
+            postgresql_where=text("email_digest_next_at IS NOT NULL"),
+        ),
+    )
+
 
 from enum import Enum as PyEnum
 
@@ -110,12 +130,32 @@ class Ticket(Base):
     feedback_score = Column(Integer, nullable=True)
     feedback_comment = Column(Text, nullable=True)
 
+    # Vecteur de recherche plein texte (titre, description, commentaires), maintenu par triggers
+    # (voir add_ticket_search_vector.py). Différé : jamais lu par les requêtes ORM classiques.
+    search_vector = deferred(Column(TSVECTOR, nullable=True))
+
+    # SLA (voir app/sla.py) : échéances de prise en charge et de résolution, prochaine échéance
+    # à traiter par le moteur SLA (NULL = plus rien à surveiller) et alertes déjà émises (bits SLA_*)
+    sla_response_due_at = Column(DateTime, nullable=True)
+    sla_resolution_due_at = Column(DateTime, nullable=True)
+    sla_next_check_at = Column(DateTime, nullable=True)
+    sla_notified = Column(Integer, nullable=False, default=0)
+
     creator = relationship("User", foreign_keys=[creator_id], back_populates="created_tickets")
     technician = relationship("User", foreign_keys=[technician_id], back_populates="assigned_tickets")
 
     comments = relationship("Comment", back_populates="ticket", cascade="all, delete-orphan")
     history = relationship("TicketHistory", back_populates="ticket", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_tickets_search_vector", "search_vector", postgresql_using="gin"),
+        Index(
+            "ix_tickets_sla_next_check_at",
+            "sla_next_check_at",
+            postgresql_where=text("sla_next_check_at IS NOT NULL"),
+        ),
+    )
+
 
 class CommentType(str, PyEnum):
     TECHNIQUE = "technique"
@@ -138,6 +178,10 @@ class Comment(Base):
     ticket = relationship("Ticket", back_populates="comments")
     user = relationship("User")
 
+    __table_args__ = (
+        Index("ix_comments_ticket_created", "ticket_id", "created_at", "id"),
+    )
+
 
 class TicketHistory(Base):
     __tablename__ = "ticket_history"
@@ -146,7 +190,7 @@ class TicketHistory(Base):
     ticket_id = Column(Integer, ForeignKey("tickets.id"), nullable=False)
     old_status = Column(Enum(TicketStatus), nullable=True)
     new_status = Column(Enum(TicketStatus), nullable=False)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # NULL : action automatique (assignation...)
     reason = Column(Text, nullable=True)
     changed_at = Column(DateTime, default=datetime.utcnow)
 
@@ -240,6 +284,10 @@ class Notification(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     read_at = Column(DateTime, nullable=True)
 
+    __table_args__ = (
+        Index("ix_notifications_user_id_id", "user_id", "id"),
+    )
+
 
 class Report(Base):
     __tablename__ = "reports"
@@ -252,5 +300,104 @@ class Report(Base):
     generated_at = Column(DateTime, default=datetime.utcnow)
     period_start = Column(DateTime, nullable=True)
     period_end = Column(DateTime, nullable=True)
+    status = Column(String(20), nullable=False, default="pending")  # pending, running, done, failed
+    started_at = Column(DateTime, nullable=True)  # Réservation par un worker (passage en "running")
+
+    __table_args__ = (
+        # Au plus une génération en attente ou en cours par (type, période)
+        Index(
+            "uq_reports_active_period",
+            "report_type",
+            "period_start",
+            "period_end",
+            unique=True,
+            postgresql_where=text("status IN ('pending', 'running')"),
+        ),
+    )
+
+
+class TicketDailyStat(Base):
+    """
+    Agrégats journaliers des tickets, maintenus de façon incrémentale à chaque transition de statut
+    (voir app/stats_rollup.py) et reconstructibles avec rebuild_ticket_daily_stats.py.
+    Les dimensions absentes sont stockées avec une valeur neutre ('' ou 0) pour que la clé reste unique.
+    """
+    __tablename__ = "ticket_daily_stats"
 
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    day = Column(Date, nullable=False)
+    agency = Column(String(100), nullable=False, default="")
+    type = Column(Enum(TicketType), nullable=False)
+    priority = Column(Enum(TicketPriority), nullable=False)
+    category = Column(String(100), nullable=False, default="")
+    technician_id = Column(Integer, nullable=False, default=0)  # 0 = aucun technicien
+
+    created_count = Column(Integer, nullable=False, default=0)
+    assigned_count = Column(Integer, nullable=False, default=0)
+    resolved_count = Column(Integer, nullable=False, default=0)
+    closed_count = Column(Integer, nullable=False, default=0)
+    rejected_count = Column(Integer, nullable=False, default=0)
+    reopened_count = Column(Integer, nullable=False, default=0)
+    resolution_seconds_sum = Column(BigInteger, nullable=False, default=0)  # Somme (résolution - création)
+    feedback_count = Column(Integer, nullable=False, default=0)
+    feedback_score_sum = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint(
+            "day", "agency", "type", "priority", "category", "technician_id",
+            name="uq_ticket_daily_stats_key",
+        ),
+    )
 
+
+class SlaPolicy(Base):
+    """
+    Objectifs SLA par priorité, éventuellement précisés par type de ticket.
+    Une politique avec type NULL s'applique à tous les types de la priorité ; une politique
+    avec un type renseigné la remplace pour ce type.
+    """
+    __tablename__ = "sla_policies"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    priority = Column(Enum(TicketPriority), nullable=False)
+    type = Column(Enum(TicketType), nullable=True)
+    response_minutes = Column(Integer, nullable=False)  # Délai de prise en charge (assignation)
+    resolution_minutes = Column(Integer, nullable=False)  # Délai de résolution
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("priority", "type", name="uq_sla_policies_priority_type"),
+    )
+
+
+class ScheduledActionType(str, PyEnum):
+    RAPPEL_VALIDATION_1 = "rappel_validation_1"
+    RAPPEL_VALIDATION_2 = "rappel_validation_2"
+    RAPPEL_VALIDATION_3 = "rappel_validation_3"
+    CLOTURE_AUTOMATIQUE = "cloture_automatique"
+
+
+class ScheduledAction(Base):
+    """
+    Action différée sur un ticket (rappels de validation, clôture automatique), planifiée au moment
+    de la transition qui la déclenche et exécutée à son échéance par le worker de app/scheduler.py
+    """
+    __tablename__ = "scheduled_actions"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    action_type = Column(Enum(ScheduledActionType), nullable=False)
+    ticket_id = Column(Integer, ForeignKey("tickets.id", ondelete="CASCADE"), nullable=False)
+    due_at = Column(DateTime, nullable=False)
+    state = Column(String(20), nullable=False, default="pending")  # pending, done, cancelled, failed
+    created_at = Column(DateTime, default=datetime.utcnow)
+    executed_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+
+    __table_args__ = (
+        Index(
+            "ix_scheduled_actions_pending_due_at",
+            "due_at",
+            postgresql_where=text("state = 'pending'"),
+        ),
+        Index("ix_scheduled_actions_ticket_id", "ticket_id"),
+    )
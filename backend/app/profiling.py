@@ -0,0 +1,404 @@
+"""
+Profilage par échantillonnage d'une requête HTTP, à la demande ou sur 1 requête sur N
+
+À la demande : un administrateur ajoute l'en-tête X-Profile: 1 (ou le paramètre ?profile=1) à
+n'importe quelle requête. Le droit est vérifié comme sur les routes (get_current_user puis
+require_role("Admin")) ; un autre utilisateur reçoit une 401/403. La réponse est celle de l'endpoint,
+avec l'en-tête X-Profile-Id : le profil est enregistré sur disque et téléchargeable sur
+GET /profiles/{profile_id} au format speedscope (https://www.speedscope.app) ou en piles repliées
+(flamegraph.pl, speedscope).
+
+Échantillonnage continu : avec PROFILING_SAMPLE_EVERY=N, une requête sur N est profilée dans un tampon
+tournant (PROFILING_BUFFER_SIZE profils au plus par mode, les plus anciens sont supprimés).
+
+Un thread d'échantillonnage relève toutes les PROFILING_INTERVAL_MS la pile du thread qui exécute
+l'endpoint (thread du threadpool pour les endpoints synchrones, boucle asyncio pour les autres). Les
+dépendances (authentification, session) et la sérialisation de la réponse ne sont pas échantillonnées :
+l'écart entre duration_ms et sampled_ms du profil leur correspond. Sans profil actif, le coût par requête
+se limite à la lecture de l'en-tête et d'un compteur.
+"""
+import json
+import os
+import re
+import sys
+import sysconfig
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from functools import wraps
+from inspect import iscoroutinefunction
+from itertools import count
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+
+from .database import SessionLocal
+from .security import require_role, user_from_token
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "true").lower() == "true"
+PROFILING_DIR = os.path.abspath(os.getenv("PROFILING_DIR", "storage/profiles"))
+PROFILING_INTERVAL_MS = float(os.getenv("PROFILING_INTERVAL_MS", "5"))
+PROFILING_SAMPLE_EVERY = int(os.getenv("PROFILING_SAMPLE_EVERY", "0"))  # 0 : échantillonnage continu désactivé
+PROFILING_BUFFER_SIZE = int(os.getenv("PROFILING_BUFFER_SIZE", "200"))
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_TRIGGERS = ("on_demand", "sampled")
+PROFILE_ID_PATTERN = re.compile(r"^\d{8}T\d{12}-(on_demand|sampled)-[0-9a-f]{8}$")
+
+_active: ContextVar[Optional["RequestProfile"]] = ContextVar("request_profile", default=None)
+
+
+class RequestProfile:
+    """Piles échantillonnées pendant l'exécution de l'endpoint d'une requête"""
+
+    def __init__(self, trigger: str, method: str, path: str):
+        self.id = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{trigger}-{uuid.uuid4().hex[:8]}"
+        self.trigger = trigger
+        self.method = method
+        self.path = path
+        self.route: Optional[str] = None
+        self.status_code: Optional[int] = None
+        self.created_at = datetime.utcnow()
+        self.duration = 0.0
+        self.interval = PROFILING_INTERVAL_MS / 1000
+        # Threads qui exécutent l'endpoint, renseignés par _profiled_endpoint
+        self.threads: set = set()
+        # Pile (objets code, de la racine à la feuille) -> nombre d'échantillons
+        self.stacks: Counter = Counter()
+
+    def add_sample(self, frame) -> None:
+        stack = []
+        while frame is not None:
+            stack.append(frame.f_code)
+            frame = frame.f_back
+        stack.reverse()
+        self.stacks[tuple(stack)] += 1
+
+    def to_dict(self) -> dict:
+        """Forme enregistrée sur disque : métadonnées et piles repliées"""
+        samples = sum(self.stacks.values())
+        return {
+            "id": self.id,
+            "trigger": self.trigger,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status_code": self.status_code,
+            "created_at": self.created_at.isoformat(),
+            "duration_ms": round(self.duration * 1000, 3),
+            "interval_ms": PROFILING_INTERVAL_MS,
+            "samples": samples,
+            "sampled_ms": round(samples * PROFILING_INTERVAL_MS, 3),
+            "stacks": {
+                ";".join(_frame_label(code) for code in stack): samples
+                for stack, samples in self.stacks.most_common()
+            },
+        }
+
+
+_labels: Dict[object, str] = {}
+_path_prefixes: Optional[List[str]] = None
+
+
+def _frame_label(code) -> str:
+    """Nom d'une frame : fonction (fichier:ligne), chemin relatif au projet ou aux paquets installés"""
+    global _path_prefixes
+    label = _labels.get(code)
+    if label is None:
+        if _path_prefixes is None:
+            backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            paths = sysconfig.get_paths()
+            _path_prefixes = sorted(
+                {os.path.join(p, "") for p in (backend_dir, paths["purelib"], paths["platlib"], paths["stdlib"])},
+                key=len,
+                reverse=True,
+            )
+        filename = code.co_filename
+        for prefix in _path_prefixes:
+            if filename.startswith(prefix):
+                filename = filename[len(prefix):]
+                break
+        label = _labels[code] = f"{code.co_qualname} ({filename}:{code.co_firstlineno})"
+    return label
+
+
+def to_collapsed(profile: dict) -> str:
+    """Piles repliées : « frame;frame;frame nb_échantillons », une pile par ligne"""
+    return "".join(f"{stack} {samples}\n" for stack, samples in profile["stacks"].items())
+
+
+def to_speedscope(profile: dict) -> dict:
+    """Profil au format de fichier speedscope (profil échantillonné, poids en millisecondes)"""
+    frames: List[dict] = []
+    frame_index: Dict[str, int] = {}
+    samples, weights = [], []
+    for stack, sample_count in profile["stacks"].items():
+        indexes = []
+        for label in stack.split(";"):
+            index = frame_index.get(label)
+            if index is None:
+                index = frame_index[label] = len(frames)
+                name, _, location = label.rpartition(" (")
+                file, _, line = location.rstrip(")").rpartition(":")
+                frames.append({"name": name, "file": file, "line": int(line)})
+            indexes.append(index)
+        samples.append(indexes)
+        weights.append(sample_count * profile["interval_ms"])
+    name = f"{profile['method']} {profile['route'] or profile['path']} ({profile['created_at']})"
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "tickets-backend",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights,
+        }],
+    }
+
+
+class _Sampler:
+    """Thread d'échantillonnage unique, endormi tant qu'aucun profil n'est actif"""
+
+    def __init__(self):
+        self._profiles: List[RequestProfile] = []
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, profile: RequestProfile) -> None:
+        with self._condition:
+            self._profiles.append(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def stop(self, profile: RequestProfile) -> None:
+        # Relevé effectué sous le verrou : aucun échantillon n'est ajouté au profil après stop()
+        with self._condition:
+            self._profiles.remove(profile)
+
+    def _run(self) -> None:
+        interval = PROFILING_INTERVAL_MS / 1000
+        while True:
+            with self._condition:
+                while not self._profiles:
+                    self._condition.wait()
+                frames = sys._current_frames()
+                for profile in self._profiles:
+                    for thread_id in list(profile.threads):
+                        frame = frames.get(thread_id)
+                        if frame is not None:
+                            profile.add_sample(frame)
+                del frames
+            time.sleep(interval)
+
+
+sampler = _Sampler()
+
+
+class ProfileStore:
+    """Profils enregistrés en JSON dans PROFILING_DIR, au plus buffer_size par mode (tampon tournant)"""
+
+    def __init__(self, directory: str = PROFILING_DIR, buffer_size: int = PROFILING_BUFFER_SIZE):
+        self.directory = directory
+        self.buffer_size = buffer_size
+        self._lock = threading.Lock()
+
+    def _path(self, profile_id: str) -> str:
+        return os.path.join(self.directory, f"{profile_id}.json")
+
+    def _ids(self, trigger: Optional[str] = None) -> List[str]:
+        """Identifiants du plus ancien au plus récent (l'identifiant commence par l'horodatage)"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        ids = [name[:-5] for name in names if name.endswith(".json")]
+        return sorted(i for i in ids if PROFILE_ID_PATTERN.match(i) and (trigger is None or f"-{trigger}-" in i))
+
+    def save(self, profile: RequestProfile) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self._path(profile.id) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(profile.to_dict(), f)
+        os.replace(tmp_path, self._path(profile.id))
+        with self._lock:
+            ids = self._ids(profile.trigger)
+            for old_id in ids[:max(0, len(ids) - self.buffer_size)]:
+                try:
+                    os.remove(self._path(old_id))
+                except FileNotFoundError:
+                    pass
+
+    def load(self, profile_id: str) -> Optional[dict]:
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        try:
+            with open(self._path(profile_id), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def list(self, trigger: Optional[str] = None, limit: int = 50) -> List[dict]:
+        """Métadonnées des profils les plus récents (sans les piles)"""
+        summaries = []
+        for profile_id in reversed(self._ids(trigger)):
+            profile = self.load(profile_id)
+            if profile is not None:
+                profile.pop("stacks")
+                summaries.append(profile)
+                if len(summaries) >= limit:
+                    break
+        return summaries
+
+
+profile_store = ProfileStore()
+
+
+def _profiled_endpoint(call):
+    """Enveloppe un endpoint : le thread qui l'exécute est échantillonné si la requête est profilée"""
+    if getattr(call, "__profiled__", False):
+        return call
+
+    if iscoroutinefunction(call):
+        @wraps(call)
+        async def wrapper(*args, **kwargs):
+            profile = _active.get()
+            if profile is None:
+                return await call(*args, **kwargs)
+            thread_id = threading.get_ident()
+            profile.threads.add(thread_id)
+            try:
+                return await call(*args, **kwargs)
+            finally:
+                profile.threads.discard(thread_id)
+    else:
+        @wraps(call)
+        def wrapper(*args, **kwargs):
+            profile = _active.get()
+            if profile is None:
+                return call(*args, **kwargs)
+            thread_id = threading.get_ident()
+            profile.threads.add(thread_id)
+            try:
+                return call(*args, **kwargs)
+            finally:
+                profile.threads.discard(thread_id)
+
+    wrapper.__profiled__ = True
+    return wrapper
+
+
+def _check_admin(token: Optional[str]) -> None:
+    """Même contrôle que Depends(require_role("Admin")) ; HTTPException si le profilage est refusé"""
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    db = SessionLocal()
+    try:
+        require_role("Admin")(current_user=user_from_token(db, token))
+    finally:
+        db.close()
+
+
+async def _authorize_admin(scope) -> Optional[JSONResponse]:
+    """Réponse d'erreur si le profilage est refusé ; lecture de l'utilisateur dans le threadpool"""
+    token = None
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer":
+                token = None
+            break
+    try:
+        # Requête SQL synchrone : hors de la boucle d'événements
+        await run_in_threadpool(_check_admin, token)
+    except HTTPException as e:
+        return JSONResponse({"detail": e.detail}, status_code=e.status_code, headers=e.headers)
+    return None
+
+
+class ProfilingMiddleware:
+    """Middleware ASGI : profilage à la demande (administrateurs) et d'une requête sur N"""
+
+    def __init__(self, app, sample_every: int = PROFILING_SAMPLE_EVERY, store: ProfileStore = profile_store):
+        self.app = app
+        self.sample_every = sample_every
+        self.store = store
+        self._counter = count(1)
+
+    @staticmethod
+    def _requested(scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                return value.strip().lower() not in (b"", b"0", b"false")
+        query_string = scope.get("query_string", b"")
+        if b"profile=" in query_string:
+            values = parse_qs(query_string.decode("latin-1")).get("profile", [])
+            return any(v.lower() not in ("", "0", "false") for v in values)
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        if self._requested(scope):
+            trigger = "on_demand"
+            refusal = await _authorize_admin(scope)
+            if refusal is not None:
+                await refusal(scope, receive, send)
+                return
+        elif self.sample_every and next(self._counter) % self.sample_every == 0:
+            trigger = "sampled"
+        else:
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(trigger, scope["method"], scope["path"])
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                profile.status_code = message["status"]
+                if trigger == "on_demand":
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"x-profile-id", profile.id.encode()),
+                    ]
+            await send(message)
+
+        token = _active.set(profile)
+        sampler.start(profile)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile.duration = time.perf_counter() - start
+            sampler.stop(profile)
+            _active.reset(token)
+            profile.route = getattr(scope.get("route"), "path", None)
+            # Réponse déjà envoyée : l'écriture ne retarde pas le client
+            try:
+                await run_in_threadpool(self.store.save, profile)
+            except OSError as e:
+                print(f"[PROFILING] Impossible d'enregistrer le profil {profile.id}: {e}")
+
+
+def register_profiling(app) -> None:
+    """Enveloppe les endpoints déjà inclus et installe le middleware (après l'inclusion des routers)"""
+    for route in app.routes:
+        if isinstance(route, APIRoute):
+            # run_endpoint_function relit dependant.call à chaque requête
+            route.dependant.call = _profiled_endpoint(route.dependant.call)
+    app.add_middleware(ProfilingMiddleware)
@@ -0,0 +1,215 @@
+"""
+Requêtes SQL par requête HTTP : nombre, temps passé en base, détection des N+1
+
+Les événements SQLAlchemy before/after_cursor_execute du moteur alimentent les compteurs de la requête
+HTTP en cours (ContextVar, partagée avec le thread du threadpool qui exécute les endpoints synchrones).
+Le middleware QueryStatsMiddleware ouvre ces compteurs ; les métriques (app/metrics.py) les lisent.
+
+En mode diagnostic (QUERY_STATS_DEBUG=true) :
+- en-têtes de réponse X-DB-Query-Count, X-DB-Time-Ms et X-DB-Max-Repeated (plus grand nombre d'exécutions
+  d'une même instruction SQL) ;
+- journalisation des N+1 probables : une même instruction exécutée au moins N_PLUS_ONE_THRESHOLD fois.
+
+Budgets de requêtes par route : QUERY_BUDGETS ci-dessous, vérifiés par tests/test_query_budgets.py et
+check_query_budgets.py (chaque route appelée sur un jeu de données fixe). track_queries / assert_max_queries
+servent aux scripts et aux tests qui appellent directement du code applicatif (fixture assert_max_queries).
+"""
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional, Tuple
+
+from sqlalchemy import event
+
+from .database import engine
+
+QUERY_STATS_DEBUG = os.getenv("QUERY_STATS_DEBUG", "false").lower() == "true"
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+
+# Nombre maximal de requêtes SQL par route, SELECT 1 de get_db compris (hors tâches d'arrière-plan,
+# exécutées après l'envoi des en-têtes). Toute route de app/routers doit y figurer : un N+1 introduit
+# dans une route fait dépasser son budget. Un budget ne dépend pas du contenu des tables : les tests
+# (tests/test_query_budgets.py) le vérifient sur un jeu de données fixe puis sur ce jeu agrandi.
+QUERY_BUDGETS: Dict[Tuple[str, str], int] = {
+    ("POST", "/auth/register"): 5,
+    ("POST", "/auth/token"): 3,
+    ("GET", "/auth/me"): 3,
+    ("GET", "/auth/roles"): 2,
+    ("POST", "/tickets/"): 20,
+    ("GET", "/tickets/me"): 5,
+    ("GET", "/tickets/"): 5,
+    ("GET", "/tickets/assigned"): 5,
+    ("GET", "/tickets/export"): 2,
+    ("GET", "/tickets/search"): 3,
+    ("POST", "/tickets/assign-bulk"): 16,
+    ("GET", "/tickets/{ticket_id}"): 5,
+    ("GET", "/tickets/{ticket_id}/full"): 5,
+    ("PUT", "/tickets/{ticket_id}"): 8,
+    ("DELETE", "/tickets/{ticket_id}"): 7,
+    ("PUT", "/tickets/{ticket_id}/assign"): 14,
+    ("PUT", "/tickets/{ticket_id}/reassign"): 15,
+    ("PUT", "/tickets/{ticket_id}/escalate"): 10,
+    ("PUT", "/tickets/{ticket_id}/status"): 14,
+    ("POST", "/tickets/{ticket_id}/comments"): 14,
+    ("GET", "/tickets/{ticket_id}/comments"): 4,
+    ("POST", "/tickets/{ticket_id}/attachments"): 5,
+    ("GET", "/tickets/{ticket_id}/attachments/{attachment_id}"): 3,
+    ("GET", "/tickets/{ticket_id}/attachments/{attachment_id}/{variant}"): 3,
+    ("POST", "/tickets/{ticket_id}/comments/{comment_id}/attachments"): 6,
+    ("GET", "/tickets/{ticket_id}/comments/{comment_id}/attachments/{attachment_id}"): 4,
+    ("GET", "/tickets/{ticket_id}/comments/{comment_id}/attachments/{attachment_id}/{variant}"): 4,
+    ("PUT", "/tickets/{ticket_id}/validate"): 13,
+    ("PUT", "/tickets/{ticket_id}/delegate-adjoint"): 13,
+    ("PUT", "/tickets/{ticket_id}/accept-assignment"): 8,
+    ("PUT", "/tickets/{ticket_id}/reject-assignment"): 9,
+    ("PUT", "/tickets/{ticket_id}/feedback"): 9,
+    ("PUT", "/tickets/{ticket_id}/reopen-by-user"): 12,
+    ("PUT", "/tickets/{ticket_id}/reopen"): 14,
+    ("GET", "/tickets/{ticket_id}/history"): 6,
+    ("GET", "/users/technicians"): 4,
+    ("GET", "/users/technicians/{technician_id}/stats"): 10,
+    ("POST", "/users/"): 7,
+    ("GET", "/users/"): 3,
+    ("GET", "/users/{user_id}"): 4,
+    ("PUT", "/users/{user_id}"): 6,
+    ("DELETE", "/users/{user_id}"): 8,
+    ("POST", "/users/{user_id}/reset-password"): 4,
+    ("GET", "/notifications/"): 3,
+    ("GET", "/notifications/unread/count"): 3,
+    ("GET", "/notifications/preferences"): 2,
+    ("PUT", "/notifications/preferences"): 3,
+    ("PUT", "/notifications/{notification_id}/read"): 5,
+    ("PUT", "/notifications/read-all"): 3,
+    ("GET", "/settings/email"): 2,
+    ("PUT", "/settings/email"): 2,
+    ("POST", "/settings/email/test"): 2,
+    ("GET", "/ticket-config/types"): 2,
+    ("GET", "/ticket-config/categories"): 2,
+    ("GET", "/ticket-config/sla-policies"): 3,
+    ("PUT", "/ticket-config/sla-policies"): 5,
+    ("GET", "/stats/daily"): 3,
+    ("POST", "/reports/"): 5,
+    ("GET", "/reports/"): 3,
+    ("GET", "/reports/{report_id}"): 3,
+    ("GET", "/profiles/"): 2,
+    ("GET", "/profiles/{profile_id}"): 2,
+    ("GET", "/metrics"): 0,
+}
+
+
+class QueryStats:
+    """Compteurs SQL d'une requête HTTP (ou d'un bloc track_queries)"""
+
+    __slots__ = ("count", "duration", "statements")
+
+    def __init__(self, keep_statements: bool = False):
+        self.count = 0
+        self.duration = 0.0
+        # Exécutions par instruction (détection des N+1), uniquement en mode diagnostic
+        self.statements: Optional[Dict[str, int]] = {} if keep_statements else None
+
+    def max_repeated(self) -> Tuple[int, Optional[str]]:
+        """Instruction la plus répétée et son nombre d'exécutions"""
+        if not self.statements:
+            return 0, None
+        statement = max(self.statements, key=self.statements.get)
+        return self.statements[statement], statement
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def current_query_stats() -> Optional[QueryStats]:
+    return _current.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    stats = _current.get()
+    if stats is not None:
+        stats.count += 1
+        if stats.statements is not None:
+            stats.statements[statement] = stats.statements.get(statement, 0) + 1
+        # Porté par le contexte d'exécution : rien ne reste en suspens si l'instruction échoue
+        context._query_started_at = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    stats = _current.get()
+    started = getattr(context, "_query_started_at", None)
+    if stats is not None and started is not None:
+        stats.duration += time.perf_counter() - started
+
+
+def register_query_stats_listeners() -> None:
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+@contextmanager
+def track_queries(keep_statements: bool = True) -> Iterator[QueryStats]:
+    """Compte les requêtes SQL exécutées dans le bloc (scripts, tests)"""
+    stats = QueryStats(keep_statements)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def assert_max_queries(budget: int, label: str = "bloc") -> Iterator[QueryStats]:
+    """
+    Échoue (AssertionError) si le bloc exécute plus de budget requêtes SQL
+
+        with assert_max_queries(4, "list_technicians"):
+            list_technicians(db=db, current_user=admin)
+    """
+    with track_queries() as stats:
+        yield stats
+    if stats.count > budget:
+        repeated, statement = stats.max_repeated()
+        raise AssertionError(
+            f"{label} : {stats.count} requêtes SQL pour un budget de {budget}"
+            + (f" (instruction exécutée {repeated} fois : {statement[:200]})" if repeated > 1 else "")
+        )
+
+
+class QueryStatsMiddleware:
+    """Middleware ASGI : ouvre les compteurs SQL de la requête, en-têtes X-DB-* en mode diagnostic"""
+
+    def __init__(self, app, debug: bool = QUERY_STATS_DEBUG):
+        self.app = app
+        self.debug = debug
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats(keep_statements=self.debug)
+        # Lu par MetricsMiddleware une fois la requête terminée
+        scope["query_stats"] = stats
+        token = _current.set(stats)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                repeated, statement = stats.max_repeated()
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-db-query-count", str(stats.count).encode()),
+                    (b"x-db-time-ms", f"{stats.duration * 1000:.1f}".encode()),
+                    (b"x-db-max-repeated", str(repeated).encode()),
+                ]
+                if repeated >= N_PLUS_ONE_THRESHOLD:
+                    route = getattr(scope.get("route"), "path", scope["path"])
+                    print(
+                        f"[SQL] N+1 probable sur {scope['method']} {route} : instruction exécutée "
+                        f"{repeated} fois ({stats.count} requêtes) : {' '.join(statement.split())[:200]}"
+                    )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers if self.debug else send)
+        finally:
+            _current.reset(token)
@@ -0,0 +1,168 @@
+"""
+Moteur de génération de rapports en arrière-plan (table reports)
+
+Une demande crée une ligne Report en statut "pending" puis la génération s'exécute dans un pool
+de threads dédié. Le résultat est stocké dans Report.data (JSONB) et le créateur reçoit une
+notification RAPPORT_PERFORMANCE. Les rapports sont calculés depuis les agrégats journaliers
+(ticket_daily_stats), jamais depuis les tables brutes.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from enum import Enum
+from typing import Callable, Dict
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+from .stats_rollup import aggregate_daily_stats
+
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+# Un rapport "running" réservé depuis plus longtemps est considéré comme abandonné (processus arrêté)
+REPORT_STALE_MINUTES = int(os.getenv("REPORT_STALE_MINUTES", "30"))
+
+_executor = ThreadPoolExecutor(max_workers=REPORT_WORKERS, thread_name_prefix="report-worker")
+
+
+def _json_rows(rows):
+    """Rend les lignes d'agrégats sérialisables en JSONB (dates, enums, SUM() numériques de PostgreSQL)"""
+    result = []
+    for row in rows:
+        item = {}
+        for key, value in row.items():
+            if isinstance(value, date):
+                value = value.isoformat()
+            elif isinstance(value, Enum):
+                value = value.value
+            elif isinstance(value, Decimal):
+                value = int(value) if value == value.to_integral_value() else float(value)
+            item[key] = value
+        result.append(item)
+    return result
+
+
+def build_performance_report(db: Session, start: date, end: date) -> dict:
+    """Volumes, délais de résolution et satisfaction, globalement et par dimension"""
+    totals = aggregate_daily_stats(db, start, end, [])
+    return {
+        "totals": _json_rows(totals)[0] if totals else {},
+        "by_day": _json_rows(aggregate_daily_stats(db, start, end, ["day"])),
+        "by_priority": _json_rows(aggregate_daily_stats(db, start, end, ["priority"])),
+        "by_type": _json_rows(aggregate_daily_stats(db, start, end, ["type"])),
+        "by_category": _json_rows(aggregate_daily_stats(db, start, end, ["category"])),
+        "by_agency": _json_rows(aggregate_daily_stats(db, start, end, ["agency"])),
+    }
+
+
+def build_technicians_report(db: Session, start: date, end: date) -> dict:
+    """Activité par technicien (assignations, résolutions, délais, satisfaction)"""
+    rows = _json_rows(aggregate_daily_stats(db, start, end, ["technician"]))
+    rows = [row for row in rows if row["technician_id"]]
+    names = dict(
+        db.query(models.User.id, models.User.full_name)
+        .filter(models.User.id.in_([row["technician_id"] for row in rows]))
+        .all()
+    )
+    for row in rows:
+        row["full_name"] = names.get(row["technician_id"])
+    return {"technicians": rows}
+
+
+REPORT_BUILDERS: Dict[str, Callable[[Session, date, date], dict]] = {
+    "performance": build_performance_report,
+    "technicians": build_technicians_report,
+}
+
+REPORT_TITLES = {
+    "performance": "Rapport de performance",
+    "technicians": "Rapport d'activité des techniciens",
+}
+
+
+def period_bounds(start: date, end: date):
+    """Bornes DateTime stockées dans Report.period_start / period_end pour une période inclusive"""
+    return datetime.combine(start, time.min), datetime.combine(end, time.min)
+
+
+def run_report(report_id: int) -> None:
+    """Génère un rapport (exécuté dans le pool de workers)"""
+    db: Session = SessionLocal()
+    try:
+        # Réserver le rapport (un seul worker le génère, même avec plusieurs processus)
+        claimed = (
+            db.query(models.Report)
+            .filter(models.Report.id == report_id, models.Report.status == "pending")
+            .update({"status": "running", "started_at": datetime.utcnow()}, synchronize_session=False)
+        )
+        db.commit()
+        if not claimed:
+            return
+        report = db.get(models.Report, report_id)
+
+        builder = REPORT_BUILDERS[report.report_type]
+        data = builder(db, report.period_start.date(), report.period_end.date())
+
+        report.data = data
+        report.status = "done"
+        report.generated_at = datetime.utcnow()
+        db.add(models.Notification(
+            user_id=report.creator_id,
+            type=models.NotificationType.RAPPORT_PERFORMANCE,
+            message=f"Votre rapport \"{report.title}\" est disponible",
+            read=False
+        ))
+        db.commit()
+        print(f"[REPORT] Rapport {report_id} généré")
+    except Exception as e:
+        print(f"[REPORT] Erreur lors de la génération du rapport {report_id}: {e}")
+        db.rollback()
+        report = db.get(models.Report, report_id)
+        if report is not None:
+            report.status = "failed"
+            report.data = {"error": str(e)}
+            db.commit()
+    finally:
+        db.close()
+
+
+def submit_report(report_id: int) -> None:
+    _executor.submit(run_report, report_id)
+
+
+def resume_pending_reports() -> None:
+    """
+    Relance les rapports en attente, et ceux restés "running" au-delà de REPORT_STALE_MINUTES (processus
+    arrêté pendant leur génération). Un rapport en cours de génération par un autre processus n'est pas
+    repris ; un rapport en attente déjà soumis ailleurs n'est généré qu'une fois (réservation de run_report).
+    Exécuté au démarrage puis périodiquement.
+    """
+    db: Session = SessionLocal()
+    try:
+        stale_before = datetime.utcnow() - timedelta(minutes=REPORT_STALE_MINUTES)
+        recovered = (
+            db.query(models.Report)
+            .filter(
+                models.Report.status == "running",
+                or_(models.Report.started_at.is_(None), models.Report.started_at < stale_before),
+            )
+            .update({"status": "pending", "started_at": None}, synchronize_session=False)
+        )
+        db.commit()
+        if recovered:
+            print(f"[REPORT] {recovered} rapport(s) abandonné(s) relancé(s)")
+        pending_ids = [
+            report_id
+            for (report_id,) in db.query(models.Report.id)
+            .filter(models.Report.status == "pending")
+            .all()
+        ]
+    except Exception as e:
+        print(f"[REPORT] Impossible de relancer les rapports en attente: {e}")
+        return
+    finally:
+        db.close()
+    for report_id in pending_ids:
+        submit_report(report_id)
@@ -1,11 +1,12 @@
 from datetime import timedelta
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 
 from .. import models, schemas
+from ..config_cache import config_cache
 from ..database import get_db
 from ..security import (
     ACCESS_TOKEN_EXPIRE_MINUTES,
@@ -99,11 +100,12 @@ def get_current_user_info(
 
 @router.get("/roles", response_model=List[schemas.RoleRead])
 def list_roles(
-    db: Session = Depends(get_db),
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     current_user: models.User = Depends(get_current_user),
 ):
-    """Liste tous les rôles disponibles"""
-    roles = db.query(models.Role).all()
-    return roles
-
-
+    """Liste tous les rôles disponibles (servis depuis le cache de configuration)"""
+    if config_cache.is_not_modified(if_none_match):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=config_cache.cache_headers())
+    response.headers.update(config_cache.cache_headers())
+    return config_cache.get_roles()
@@ -0,0 +1,29 @@
+"""
+Router des métriques Prometheus (voir app/metrics.py)
+"""
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Response, status
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from ..metrics import METRICS_PUBLIC, METRICS_TOKEN
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+def get_metrics(authorization: Optional[str] = Header(None)):
+    """
+    Métriques au format texte Prometheus, protégées par le jeton METRICS_TOKEN.
+    Sans jeton configuré, l'accès est refusé sauf si METRICS_PUBLIC=true.
+    """
+    if METRICS_TOKEN:
+        if not secrets.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}"):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Jeton de métriques invalide")
+    elif not METRICS_PUBLIC:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Métriques désactivées : définir METRICS_TOKEN (ou METRICS_PUBLIC=true)"
+        )
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
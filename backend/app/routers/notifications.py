@@ -7,6 +7,7 @@ from sqlalchemy import desc
 
 from .. import models, schemas
 from ..database import get_db
+from ..digests import set_digest_mode
 from ..security import get_current_user
 
 router = APIRouter()
@@ -55,6 +56,32 @@ def get_unread_count(
     return {"unread_count": count}
 
 
+@router.get("/preferences", response_model=schemas.NotificationPreferencesRead)
+def get_notification_preferences(
+    current_user: models.User = Depends(get_current_user),
+):
+    """Mode d'envoi des notifications par email de l'utilisateur connecté"""
+    return current_user
+
+
+@router.put("/preferences", response_model=schemas.NotificationPreferencesRead)
+def update_notification_preferences(
+    preferences: schemas.NotificationPreferencesUpdate,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Choisir entre un email par notification et un digest (toutes les N minutes ou quotidien)"""
+    set_digest_mode(
+        db,
+        current_user,
+        preferences.email_digest_mode,
+        preferences.email_digest_interval_minutes,
+    )
+    db.commit()
+    db.refresh(current_user)
+    return current_user
+
+
 @router.put("/{notification_id}/read", response_model=schemas.NotificationRead)
 def mark_notification_as_read(
     notification_id: int,
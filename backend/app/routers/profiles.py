@@ -0,0 +1,48 @@
+"""
+Router des profils de requêtes (voir app/profiling.py) : liste et téléchargement, administrateurs uniquement
+"""
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from .. import models, schemas
+from ..profiling import profile_store, to_collapsed, to_speedscope
+from ..security import require_role
+
+router = APIRouter(prefix="/profiles", tags=["profiles"])
+
+
+@router.get("/", response_model=List[schemas.ProfileSummary])
+def list_profiles(
+    trigger: Optional[Literal["on_demand", "sampled"]] = None,
+    limit: int = Query(50, ge=1, le=500),
+    current_user: models.User = Depends(require_role("Admin")),
+):
+    """Profils enregistrés, du plus récent au plus ancien"""
+    return profile_store.list(trigger=trigger, limit=limit)
+
+
+@router.get("/{profile_id}")
+def download_profile(
+    profile_id: str,
+    format: Literal["speedscope", "collapsed"] = "speedscope",
+    current_user: models.User = Depends(require_role("Admin")),
+):
+    """
+    Télécharger un profil :
+    - speedscope : fichier JSON à ouvrir sur https://www.speedscope.app
+    - collapsed : piles repliées (flamegraph.pl, speedscope)
+    """
+    profile = profile_store.load(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    if format == "collapsed":
+        return PlainTextResponse(
+            to_collapsed(profile),
+            headers={"Content-Disposition": f'attachment; filename="{profile_id}.collapsed.txt"'},
+        )
+    return JSONResponse(
+        to_speedscope(profile),
+        headers={"Content-Disposition": f'attachment; filename="{profile_id}.speedscope.json"'},
+    )
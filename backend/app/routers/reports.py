@@ -0,0 +1,133 @@
+"""
+Router des rapports : demande de génération asynchrone et consultation
+"""
+from datetime import datetime, time
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, load_only
+
+from .. import models, schemas
+from ..database import get_db
+from ..reports import REPORT_BUILDERS, REPORT_TITLES, period_bounds, submit_report
+from ..security import require_role
+
+router = APIRouter(prefix="/reports", tags=["reports"])
+
+
+def _find_reusable_report(db: Session, report_type: str, period_start: datetime, period_end: datetime):
+    """
+    Rapport identique (même type, même période) en attente, en cours, ou déjà généré.
+    Un rapport généré n'est réutilisé que si sa période est révolue : jusqu'à aujourd'hui inclus,
+    les agrégats évoluent encore.
+    """
+    today = datetime.combine(datetime.utcnow().date(), time.min)
+    return (
+        db.query(models.Report)
+        .options(load_only(
+            models.Report.id, models.Report.title, models.Report.report_type, models.Report.creator_id,
+            models.Report.status, models.Report.generated_at, models.Report.period_start, models.Report.period_end,
+        ))
+        .filter(
+            models.Report.report_type == report_type,
+            models.Report.period_start == period_start,
+            models.Report.period_end == period_end,
+            or_(
+                models.Report.status.in_(["pending", "running"]),
+                and_(models.Report.status == "done", models.Report.period_end < today),
+            ),
+        )
+        .order_by(models.Report.id.desc())
+        .first()
+    )
+
+
+@router.post("/", response_model=schemas.ReportSummary, status_code=status.HTTP_202_ACCEPTED)
+def request_report(
+    report_in: schemas.ReportCreate,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(require_role("Adjoint DSI", "DSI", "Admin")),
+):
+    """
+    Demander la génération d'un rapport pour une période.
+    Un rapport identique (même type, même période) en cours, ou déjà généré pour une période révolue,
+    est renvoyé tel quel.
+    """
+    if report_in.report_type not in REPORT_BUILDERS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown report type. Available: {', '.join(REPORT_BUILDERS)}"
+        )
+    if report_in.period_end < report_in.period_start:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="period_end must be after period_start"
+        )
+
+    period_start, period_end = period_bounds(report_in.period_start, report_in.period_end)
+    existing = _find_reusable_report(db, report_in.report_type, period_start, period_end)
+    if existing:
+        return existing
+
+    report = models.Report(
+        title=(
+            f"{REPORT_TITLES[report_in.report_type]} du {report_in.period_start:%d/%m/%Y}"
+            f" au {report_in.period_end:%d/%m/%Y}"
+        ),
+        report_type=report_in.report_type,
+        creator_id=current_user.id,
+        data={},
+        generated_at=None,
+        period_start=period_start,
+        period_end=period_end,
+        status="pending",
+    )
+    db.add(report)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Demande concurrente : l'index uq_reports_active_period garantit une seule génération active
+        db.rollback()
+        existing = _find_reusable_report(db, report_in.report_type, period_start, period_end)
+        if existing:
+            return existing
+        raise
+    db.refresh(report)
+
+    submit_report(report.id)
+    return report
+
+
+@router.get("/", response_model=List[schemas.ReportSummary])
+def list_reports(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(require_role("Adjoint DSI", "DSI", "Admin")),
+):
+    """Liste des rapports (sans leurs données)"""
+    reports = (
+        db.query(models.Report)
+        .options(load_only(
+            models.Report.id, models.Report.title, models.Report.report_type, models.Report.creator_id,
+            models.Report.status, models.Report.generated_at, models.Report.period_start, models.Report.period_end,
+        ))
+        .order_by(models.Report.id.desc())
+        .all()
+    )
+    return reports
+
+
+@router.get("/{report_id}", response_model=schemas.ReportRead)
+def get_report(
+    report_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(require_role("Adjoint DSI", "DSI", "Admin")),
+):
+    """Récupérer un rapport et ses données"""
+    report = db.query(models.Report).filter(models.Report.id == report_id).first()
+    if not report:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Report not found"
+        )
+    return report
@@ -1,6 +1,7 @@
 """
 Router pour la gestion des paramètres système, notamment la configuration email
 """
+from datetime import datetime
 from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
@@ -10,6 +11,7 @@ from .. import models
 from ..database import get_db
 from ..security import get_current_user, require_role
 from ..email_service import email_service
+from ..email_transport import smtp_breaker
 
 router = APIRouter(prefix="/settings", tags=["settings"])
 
@@ -27,6 +29,18 @@ class EmailSettingsUpdate(BaseModel):
     email_enabled: Optional[bool] = None
 
 
+class EmailDeliveryStatus(BaseModel):
+    """État du disjoncteur SMTP (closed, open, half_open)"""
+    state: str
+    consecutive_failures: int
+    failure_threshold: int
+    rejected_count: int
+    opened_at: Optional[datetime] = None
+    next_probe_at: Optional[datetime] = None
+    last_error: Optional[str] = None
+    last_failure_at: Optional[datetime] = None
+
+
 class EmailSettingsRead(BaseModel):
     """Schéma pour lire les paramètres email"""
     smtp_server: str
@@ -37,18 +51,13 @@ class EmailSettingsRead(BaseModel):
     use_tls: bool
     verify_ssl: bool
     email_enabled: bool
+    delivery_status: EmailDeliveryStatus
 
     class Config:
         from_attributes = True
 
 
-@router.get("/email", response_model=EmailSettingsRead)
-def get_email_settings(
-    current_user: models.User = Depends(
-        require_role("DSI", "Admin")
-    ),
-):
-    """Récupérer les paramètres email actuels"""
+def _email_settings_read() -> EmailSettingsRead:
     return EmailSettingsRead(
         smtp_server=email_service.smtp_server,
         smtp_port=email_service.smtp_port,
@@ -57,10 +66,21 @@ def get_email_settings(
         sender_name=email_service.sender_name,
         use_tls=email_service.use_tls,
         verify_ssl=email_service.verify_ssl,
-        email_enabled=email_service.email_enabled
+        email_enabled=email_service.email_enabled,
+        delivery_status=EmailDeliveryStatus(**smtp_breaker.snapshot())
     )
 
 
+@router.get("/email", response_model=EmailSettingsRead)
+def get_email_settings(
+    current_user: models.User = Depends(
+        require_role("DSI", "Admin")
+    ),
+):
+    """Récupérer les paramètres email actuels et l'état du disjoncteur SMTP"""
+    return _email_settings_read()
+
+
 @router.put("/email", response_model=EmailSettingsRead)
 def update_email_settings(
     settings: EmailSettingsUpdate,
@@ -93,16 +113,10 @@ def update_email_settings(
     # ces paramètres dans la base de données ou un fichier de configuration
     # sécurisé plutôt que dans la mémoire
     
-    return EmailSettingsRead(
-        smtp_server=email_service.smtp_server,
-        smtp_port=email_service.smtp_port,
-        smtp_username=email_service.smtp_username or "",
-        sender_email=email_service.sender_email,
-        sender_name=email_service.sender_name,
-        use_tls=email_service.use_tls,
-        verify_ssl=email_service.verify_ssl,
-        email_enabled=email_service.email_enabled
-    )
+    # Nouveau serveur ou nouveaux identifiants : les échecs précédents ne sont plus représentatifs
+    smtp_breaker.reset()
+    
+    return _email_settings_read()
 
 
 @router.post("/email/test")
@@ -125,10 +139,12 @@ Cordialement,
 {email_service.sender_name}
 """
     
+    # Envoi tenté même circuit ouvert : c'est le moyen de vérifier un serveur rétabli
     success = email_service.send_email(
         to_emails=[test_email],
         subject=subject,
-        body=body
+        body=body,
+        force=True
     )
     
     if success:
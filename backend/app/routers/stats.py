@@ -0,0 +1,52 @@
+"""
+Router des statistiques : lecture des agrégats journaliers (table ticket_daily_stats)
+"""
+from datetime import date, timedelta
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+
+from .. import models, schemas
+from ..database import get_db
+from ..security import require_role
+from ..stats_rollup import GROUP_BY_COLUMNS, aggregate_daily_stats
+
+router = APIRouter(prefix="/stats", tags=["stats"])
+
+
+@router.get("/daily", response_model=List[schemas.DailyStatsRow])
+def get_daily_stats(
+    start: Optional[date] = Query(None, description="Premier jour inclus (défaut : il y a 12 mois)"),
+    end: Optional[date] = Query(None, description="Dernier jour inclus (défaut : aujourd'hui)"),
+    group_by: List[str] = Query(["day"], description="Dimensions : day, agency, type, priority, category, technician"),
+    agency: Optional[str] = Query(None),
+    type: Optional[models.TicketType] = Query(None),
+    priority: Optional[models.TicketPriority] = Query(None),
+    category: Optional[str] = Query(None),
+    technician_id: Optional[int] = Query(None),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(
+        require_role("Secrétaire DSI", "Adjoint DSI", "DSI", "Admin")
+    ),
+):
+    """Statistiques de tickets sur une période, calculées depuis les agrégats journaliers"""
+    unknown = [key for key in group_by if key not in GROUP_BY_COLUMNS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown group_by dimension(s): {', '.join(unknown)}",
+        )
+    end = end or date.today()
+    start = start or end - timedelta(days=365)
+    return aggregate_daily_stats(
+        db,
+        start,
+        end,
+        group_by,
+        agency=agency,
+        type=type,
+        priority=priority,
+        category=category,
+        technician_id=technician_id,
+    )
@@ -1,11 +1,13 @@
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter, Depends, Header, Query, Response, status
+from sqlalchemy.orm import Session
 
 from .. import models, schemas
+from ..config_cache import config_cache
 from ..database import get_db
-from ..security import get_current_user
+from ..security import get_current_user, require_role
+from ..sla import sla_policies
 
 
 router = APIRouter(prefix="/ticket-config", tags=["ticket-config"])
@@ -13,56 +15,78 @@ router = APIRouter(prefix="/ticket-config", tags=["ticket-config"])
 
 @router.get("/types", response_model=List[schemas.TicketTypeConfig])
 def get_ticket_types(
-    db: Session = Depends(get_db),
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     current_user: models.User = Depends(get_current_user),
 ):
     """
     Récupère la liste des types de tickets configurés dans la base.
-    Seuls les types actifs sont renvoyés.
+    Seuls les types actifs sont renvoyés (servis depuis le cache de configuration).
     """
-    types = (
-        db.query(models.TicketTypeModel)
-        .filter(models.TicketTypeModel.is_active.is_(True))
-        .order_by(models.TicketTypeModel.label.asc())
-        .all()
-    )
-    return types
+    if config_cache.is_not_modified(if_none_match):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=config_cache.cache_headers())
+    response.headers.update(config_cache.cache_headers())
+    return config_cache.get_ticket_types()
 
 
 @router.get("/categories", response_model=List[schemas.TicketCategoryConfig])
 def get_ticket_categories(
+    response: Response,
     type_code: Optional[str] = Query(None, description="Filtrer par code de type (materiel, applicatif, etc.)"),
-    db: Session = Depends(get_db),
+    if_none_match: Optional[str] = Header(None),
     current_user: models.User = Depends(get_current_user),
 ):
     """
     Récupère la liste des catégories de tickets configurées dans la base.
     Si un type_code est fourni, filtre les catégories pour ce type.
     """
-    query = (
-        db.query(models.TicketCategory)
-        .options(joinedload(models.TicketCategory.ticket_type))
-        .filter(models.TicketCategory.is_active.is_(True))
-    )
-
-    if type_code:
-        # Filtrer par le code du type via la jointure
-        query = query.join(models.TicketTypeModel).filter(models.TicketTypeModel.code == type_code)
-
-    categories = query.order_by(models.TicketCategory.name.asc()).all()
-    
-    # Convertir en schéma avec type_code depuis la relation
-    result = []
-    for cat in categories:
-        result.append(schemas.TicketCategoryConfig(
-            id=cat.id,
-            name=cat.name,
-            description=cat.description,
-            type_code=cat.ticket_type.code if cat.ticket_type else "",
-            is_active=cat.is_active
-        ))
-    return result
+    if config_cache.is_not_modified(if_none_match):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=config_cache.cache_headers())
+    response.headers.update(config_cache.cache_headers())
+    return config_cache.get_ticket_categories(type_code)
 
 
+@router.get("/sla-policies", response_model=List[schemas.SlaPolicyRead])
+def get_sla_policies(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(
+        require_role("Secrétaire DSI", "Adjoint DSI", "DSI", "Admin")
+    ),
+):
+    """Objectifs SLA configurés (délais de prise en charge et de résolution, en minutes)"""
+    return (
+        db.query(models.SlaPolicy)
+        .order_by(models.SlaPolicy.priority, models.SlaPolicy.type.nullsfirst())
+        .all()
+    )
 
 
+@router.put("/sla-policies", response_model=List[schemas.SlaPolicyRead])
+def update_sla_policies(
+    policies: List[schemas.SlaPolicyBase],
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(require_role("DSI", "Admin")),
+):
+    """
+    Crée ou met à jour des objectifs SLA (clé : priorité + type).
+    Les nouveaux objectifs s'appliquent aux tickets créés ensuite.
+    """
+    existing = {
+        (policy.priority, policy.type): policy
+        for policy in db.query(models.SlaPolicy).all()
+    }
+    for policy_in in policies:
+        policy = existing.get((policy_in.priority, policy_in.type))
+        if policy is None:
+            policy = models.SlaPolicy(priority=policy_in.priority, type=policy_in.type)
+            db.add(policy)
+            existing[(policy_in.priority, policy_in.type)] = policy
+        policy.response_minutes = policy_in.response_minutes
+        policy.resolution_minutes = policy_in.resolution_minutes
+    db.commit()
+    sla_policies.invalidate()
+    return (
+        db.query(models.SlaPolicy)
+        .order_by(models.SlaPolicy.priority, models.SlaPolicy.type.nullsfirst())
+        .all()
+    )
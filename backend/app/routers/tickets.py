@@ -1,19 +1,134 @@
-from typing import List, Optional
-from datetime import datetime
+from typing import List, Literal, Optional, Union
+from datetime import datetime, timedelta
+import os
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func
+from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks, File, UploadFile
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy.orm import Session, joinedload, aliased
+from sqlalchemy import Float, and_, func, or_, select
+from sqlalchemy.exc import DBAPIError
 
 from .. import models, schemas
 from ..database import get_db
-from ..security import get_current_user, require_role
+from ..config_cache import config_cache
+from ..security import get_current_user, require_role, user_has_role
 from ..email_service import email_service
+from ..exports import EXPORT_FORMATS
+from ..dispatch import AUTO_DISPATCH_ENABLED, auto_dispatch_ticket
+from ..attachments import (
+    AttachmentTooLarge,
+    MAX_ATTACHMENT_SIZE,
+    append_attachment,
+    build_attachment_entry,
+    find_attachment,
+    storage,
+)
+from ..attachment_previews import PREVIEW_MEDIA_TYPE, derived_path, schedule_previews
 
 router = APIRouter()
 
+# Paramètre commun aux endpoints de liste : "summary" ne lit que les colonnes affichées dans les listes
+TicketListView = Literal["full", "summary"]
 
-@router.post("/", response_model=schemas.TicketRead)
+
+def _get_accessible_ticket(db: Session, ticket_id: int, current_user: models.User, *options) -> models.Ticket:
+    """Charger un ticket et vérifier que l'utilisateur peut le consulter (mêmes règles que get_ticket)"""
+    ticket = db.query(models.Ticket).options(*options).filter(models.Ticket.id == ticket_id).first()
+    if not ticket:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found"
+        )
+    is_creator = ticket.creator_id == current_user.id
+    is_assigned_tech = ticket.technician_id == current_user.id
+    is_agent = user_has_role(current_user, "Secrétaire DSI", "Adjoint DSI", "DSI", "Admin")
+    if not (is_creator or is_assigned_tech or is_agent):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Access denied"
+        )
+    return ticket
+
+
+def _list_ticket_summaries(db: Session, *criteria) -> List[schemas.TicketSummary]:
+    """
+    Liste des tickets en projection "summary" : la requête SQL ne sélectionne que les colonnes
+    de TicketSummary (les colonnes texte volumineuses ne sont jamais lues) et les noms
+    du créateur/technicien via des jointures externes.
+    """
+    creator = aliased(models.User)
+    technician = aliased(models.User)
+    rows = (
+        db.query(
+            models.Ticket.id,
+            models.Ticket.number,
+            models.Ticket.title,
+            models.Ticket.type,
+            models.Ticket.priority,
+            models.Ticket.status,
+            models.Ticket.category,
+            models.Ticket.created_at,
+            models.Ticket.creator_id,
+            creator.full_name.label("creator_name"),
+            models.Ticket.technician_id,
+            technician.full_name.label("technician_name"),
+        )
+        .outerjoin(creator, creator.id == models.Ticket.creator_id)
+        .outerjoin(technician, technician.id == models.Ticket.technician_id)
+        .filter(*criteria)
+        .order_by(models.Ticket.created_at.desc())
+        .all()
+    )
+    return [schemas.TicketSummary.model_validate(row) for row in rows]
+
+
+# Détection des doublons / problèmes récurrents à la création (index pg_trgm sur tickets.title)
+DUPLICATE_WINDOW_HOURS = int(os.getenv("DUPLICATE_WINDOW_HOURS", "72"))
+DUPLICATE_SIMILARITY_THRESHOLD = float(os.getenv("DUPLICATE_SIMILARITY_THRESHOLD", "0.5"))
+RECURRENT_PROBLEM_THRESHOLD = int(os.getenv("RECURRENT_PROBLEM_THRESHOLD", "3"))
+OPEN_TICKET_STATUSES = [
+    models.TicketStatus.EN_ATTENTE_ANALYSE,
+    models.TicketStatus.ASSIGNE_TECHNICIEN,
+    models.TicketStatus.EN_COURS,
+]
+
+
+def _find_possible_duplicates(
+    db: Session, title: str, category: Optional[str], agency: Optional[str], limit: int = 5
+) -> List[schemas.TicketDuplicateHint]:
+    """
+    Tickets ouverts récents dont le titre est similaire (similarité trigramme) dans la même catégorie/agence.
+    L'opérateur % utilise l'index GIN pg_trgm ; son seuil est fixé pour la transaction courante.
+    Sans l'extension pg_trgm (similarity() ou % absents), aucun doublon n'est signalé : la recherche
+    s'exécute dans un savepoint pour ne pas interrompre la création du ticket.
+    """
+    similarity = func.similarity(models.Ticket.title, title)
+    query = db.query(
+        models.Ticket.id,
+        models.Ticket.number,
+        models.Ticket.title,
+        models.Ticket.status,
+        models.Ticket.created_at,
+        similarity.label("similarity"),
+    ).filter(
+        models.Ticket.title.op("%")(title),
+        models.Ticket.status.in_(OPEN_TICKET_STATUSES),
+        models.Ticket.created_at >= datetime.utcnow() - timedelta(hours=DUPLICATE_WINDOW_HOURS),
+        # Catégorie / agence absentes : comparer aux tickets qui n'en ont pas non plus
+        models.Ticket.category.is_(None) if category is None else models.Ticket.category == category,
+        models.Ticket.user_agency.is_(None) if agency is None else models.Ticket.user_agency == agency,
+    )
+    try:
+        with db.begin_nested():
+            db.execute(
+                select(func.set_config("pg_trgm.similarity_threshold", str(DUPLICATE_SIMILARITY_THRESHOLD), True))
+            )
+            rows = query.order_by(similarity.desc()).limit(limit).all()
+    except DBAPIError as e:
+        print(f"[DOUBLONS] Recherche des doublons indisponible (extension pg_trgm ?) : {e.orig}")
+        return []
+    return [schemas.TicketDuplicateHint.model_validate(row) for row in rows]
+
+
+@router.post("/", response_model=schemas.TicketCreated)
 def create_ticket(
     ticket_in: schemas.TicketCreate,
     background_tasks: BackgroundTasks,
@@ -28,6 +143,13 @@ def create_ticket(
     if last_ticket and last_ticket.number:
         next_number = last_ticket.number + 1
     
+    # Rechercher les doublons possibles avant l'insertion (le nouveau ticket n'est donc pas dans les résultats)
+    # Au moins RECURRENT_PROBLEM_THRESHOLD - 1 résultats pour savoir si le seuil de récurrence est atteint
+    possible_duplicates = _find_possible_duplicates(
+        db, ticket_in.title, ticket_in.category, current_user.agency,
+        limit=max(5, RECURRENT_PROBLEM_THRESHOLD),
+    )
+    
     ticket = models.Ticket(
         number=next_number,  # Assigner le numéro généré
         title=ticket_in.title,
@@ -46,50 +168,46 @@ def create_ticket(
     # Créer une notification pour les Secrétaires/Adjoints DSI, DSI et Admin
     # Récupérer tous les utilisateurs concernés (Secrétaire DSI, Adjoint DSI, DSI, Admin)
     # Ces rôles sont ceux qui peuvent assigner des tickets à des techniciens
-    target_roles = db.query(models.Role).filter(
-        models.Role.name.in_(["Secrétaire DSI", "Adjoint DSI", "DSI", "Admin"])
-    ).all()
+    target_role_ids = config_cache.role_ids("Secrétaire DSI", "Adjoint DSI", "DSI", "Admin")
     
     # Préparer l'envoi d'emails en arrière-plan (asynchrone)
-    notified_users = []
-    if target_roles:
-        for role in target_roles:
-            users = (
-                db.query(models.User)
-                .options(joinedload(models.User.role))
-                .filter(
-                    models.User.role_id == role.id,
-                    models.User.actif == True
-                )
-                .all()
+    # Destinataires (email, rôle) relevés avant le commit, qui expire les utilisateurs chargés
+    recipients = []
+    if target_role_ids:
+        users = (
+            db.query(models.User)
+            .filter(
+                models.User.role_id.in_(target_role_ids),
+                models.User.actif == True
             )
-            for user in users:
-                # Créer une notification dans la base de données
-                notification = models.Notification(
-                    user_id=user.id,
-                    type=models.NotificationType.NOUVEAU_TICKET,
-                    ticket_id=ticket.id,
-                    message=f"Nouveau ticket #{ticket.number} créé: {ticket.title}",
-                    read=False
-                )
-                db.add(notification)
-                
-                # Ajouter l'utilisateur à la liste pour l'envoi d'emails (éviter doublons par email)
-                if user.email and user.email.strip() and user.email not in [u.email for u in notified_users if u.email]:
-                    notified_users.append(user)
+            .all()
+        )
+        for user in users:
+            # Créer une notification dans la base de données
+            notification = models.Notification(
+                user_id=user.id,
+                type=models.NotificationType.NOUVEAU_TICKET,
+                ticket_id=ticket.id,
+                message=f"Nouveau ticket #{ticket.number} créé: {ticket.title}",
+                read=False
+            )
+            db.add(notification)
+            
+            # Ajouter l'utilisateur à la liste pour l'envoi d'emails (éviter doublons par email)
+            if user.email and user.email.strip() and user.email not in [email for email, _ in recipients]:
+                recipients.append((user.email, config_cache.role_name(user.role_id)))
         
         db.commit()
         
-        # Ajouter les tâches d'envoi d'emails en arrière-plan
-        for user in notified_users:
+        # Envoi des emails en arrière-plan : contenu rendu une seule fois par rôle destinataire
+        if recipients:
             background_tasks.add_task(
-                email_service.send_ticket_created_notification_with_actions,
+                email_service.send_ticket_created_notification_to_recipients,
                 ticket_id=str(ticket.id),
                 ticket_number=ticket.number,
                 ticket_title=ticket.title,
                 creator_name=current_user.full_name,
-                recipient_email=user.email,
-                recipient_role=user.role.name if user.role else ""
+                recipients=recipients
             )
     
     # Créer une notification pour le créateur du ticket
@@ -101,8 +219,41 @@ def create_ticket(
         read=False
     )
     db.add(creator_notification)
+    
+    # Problème récurrent : notifier la DSI quand le groupe de tickets similaires atteint le seuil
+    # (une seule fois, au moment où le seuil est franchi)
+    if len(possible_duplicates) + 1 == RECURRENT_PROBLEM_THRESHOLD:
+        dsi_users = db.query(models.User).filter(
+            models.User.role_id.in_(config_cache.role_ids("DSI")),
+            models.User.actif == True
+        ).all()
+        related_numbers = ", ".join(f"#{d.number}" for d in possible_duplicates)
+        for dsi_user in dsi_users:
+            db.add(models.Notification(
+                user_id=dsi_user.id,
+                type=models.NotificationType.PROBLEME_RECURRENT,
+                ticket_id=ticket.id,
+                message=f"Problème récurrent possible : ticket #{ticket.number} similaire à {related_numbers}: {ticket.title}",
+                read=False
+            ))
     db.commit()
     
+    # Assignation automatique au technicien disponible le moins chargé (si activée)
+    if AUTO_DISPATCH_ENABLED:
+        technician = auto_dispatch_ticket(db, ticket)
+        if technician:
+            db.commit()
+            if technician.email and technician.email.strip():
+                background_tasks.add_task(
+                    email_service.send_ticket_assigned_notification,
+                    ticket_id=str(ticket.id),
+                    ticket_number=ticket.number,
+                    ticket_title=ticket.title,
+                    technician_email=technician.email,
+                    technician_name=technician.full_name,
+                    priority=ticket.priority
+                )
+    
     # Envoyer un email de confirmation au créateur en arrière-plan (asynchrone)
     if current_user.email and current_user.email.strip():
         background_tasks.add_task(
@@ -124,16 +275,24 @@ def create_ticket(
         .filter(models.Ticket.id == ticket.id)
         .first()
     )
+    ticket.possible_duplicates = possible_duplicates
     
     return ticket
 
 
-@router.get("/me", response_model=List[schemas.TicketRead])
+@router.get(
+    "/me",
+    response_model=Union[List[schemas.TicketRead], List[schemas.TicketSummary]],
+)
 def list_my_tickets(
+    view: TicketListView = Query("full", description="full : ticket complet ; summary : colonnes de liste uniquement"),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
     """Liste des tickets créés par l'utilisateur connecté"""
+    if view == "summary":
+        return _list_ticket_summaries(db, models.Ticket.creator_id == current_user.id)
+    
     tickets = (
         db.query(models.Ticket)
         .options(
@@ -147,14 +306,21 @@ def list_my_tickets(
     return tickets
 
 
-@router.get("/", response_model=List[schemas.TicketRead])
+@router.get(
+    "/",
+    response_model=Union[List[schemas.TicketRead], List[schemas.TicketSummary]],
+)
 def list_all_tickets(
+    view: TicketListView = Query("full", description="full : ticket complet ; summary : colonnes de liste uniquement"),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(
         require_role("Secrétaire DSI", "Adjoint DSI", "DSI", "Admin")
     ),
 ):
     """Liste de tous les tickets (pour secrétaire/adjoint/DSI/admin)"""
+    if view == "summary":
+        return _list_ticket_summaries(db)
+    
     tickets = (
         db.query(models.Ticket)
         .options(
@@ -167,12 +333,19 @@ def list_all_tickets(
     return tickets
 
 
-@router.get("/assigned", response_model=List[schemas.TicketRead])
+@router.get(
+    "/assigned",
+    response_model=Union[List[schemas.TicketRead], List[schemas.TicketSummary]],
+)
 def list_assigned_tickets(
+    view: TicketListView = Query("full", description="full : ticket complet ; summary : colonnes de liste uniquement"),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
     """Liste des tickets assignés au technicien connecté"""
+    if view == "summary":
+        return _list_ticket_summaries(db, models.Ticket.technician_id == current_user.id)
+    
     tickets = (
         db.query(models.Ticket)
         .options(
@@ -186,6 +359,258 @@ def list_assigned_tickets(
     return tickets
 
 
+@router.get("/export")
+def export_tickets(
+    format: Literal["csv", "xlsx", "ndjson"] = Query("csv"),
+    status_filter: Optional[models.TicketStatus] = Query(None, alias="status"),
+    priority: Optional[models.TicketPriority] = Query(None),
+    type: Optional[models.TicketType] = Query(None),
+    category: Optional[str] = Query(None),
+    agency: Optional[str] = Query(None),
+    technician_id: Optional[int] = Query(None),
+    created_from: Optional[datetime] = Query(None),
+    created_to: Optional[datetime] = Query(None),
+    current_user: models.User = Depends(
+        require_role("Secrétaire DSI", "Adjoint DSI", "DSI", "Admin")
+    ),
+):
+    """
+    Export complet des tickets (créateur, technicien, dates clés de l'historique, feedback).
+    La réponse est envoyée en flux, lue par lots via un curseur côté serveur.
+    """
+    criteria = []
+    if status_filter is not None:
+        criteria.append(models.Ticket.status == status_filter)
+    if priority is not None:
+        criteria.append(models.Ticket.priority == priority)
+    if type is not None:
+        criteria.append(models.Ticket.type == type)
+    if category:
+        criteria.append(models.Ticket.category == category)
+    if agency:
+        criteria.append(models.Ticket.user_agency == agency)
+    if technician_id is not None:
+        criteria.append(models.Ticket.technician_id == technician_id)
+    if created_from is not None:
+        criteria.append(models.Ticket.created_at >= created_from)
+    if created_to is not None:
+        criteria.append(models.Ticket.created_at <= created_to)
+
+    iter_rows, media_type = EXPORT_FORMATS[format]
+    filename = f"tickets_{datetime.utcnow():%Y%m%d_%H%M%S}.{format}"
+    return StreamingResponse(
+        iter_rows(criteria),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/search", response_model=schemas.TicketSearchPage)
+def search_tickets(
+    q: str = Query(..., min_length=1, description="Texte recherché (syntaxe web : \"phrase exacte\", -exclu, or)"),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="next_cursor renvoyé par la page précédente"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    Recherche plein texte (configuration 'french') dans le titre, la description et les commentaires.
+    Résultats classés par pertinence, avec pagination par curseur (rang, id) et mêmes règles de visibilité que GET /tickets/{id}.
+    """
+    ts_query = func.websearch_to_tsquery("french", q)
+    rank = func.ts_rank_cd(models.Ticket.search_vector, ts_query).cast(Float)
+
+    # Étape 1 : identifiants et rangs de la page, via l'index GIN sur search_vector
+    page = (
+        db.query(models.Ticket.id.label("id"), rank.label("rank"))
+        .filter(models.Ticket.search_vector.op("@@")(ts_query))
+    )
+    if not user_has_role(current_user, "Secrétaire DSI", "Adjoint DSI", "DSI", "Admin"):
+        page = page.filter(
+            or_(
+                models.Ticket.creator_id == current_user.id,
+                models.Ticket.technician_id == current_user.id,
+            )
+        )
+    if cursor:
+        try:
+            cursor_rank, cursor_id = cursor.rsplit(":", 1)
+            cursor_rank, cursor_id = float(cursor_rank), int(cursor_id)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+            )
+        page = page.filter(
+            or_(rank < cursor_rank, and_(rank == cursor_rank, models.Ticket.id < cursor_id))
+        )
+    page = page.order_by(rank.desc(), models.Ticket.id.desc()).limit(limit + 1).subquery()
+
+    # Étape 2 : colonnes affichées et extraits surlignés, calculés uniquement pour les lignes de la page
+    rows = (
+        db.query(
+            models.Ticket.id,
+            models.Ticket.number,
+            models.Ticket.title,
+            models.Ticket.type,
+            models.Ticket.priority,
+            models.Ticket.status,
+            models.Ticket.category,
+            models.Ticket.created_at,
+            page.c.rank,
+            func.ts_headline("french", models.Ticket.title, ts_query, "HighlightAll=true").label("title_highlight"),
+            func.ts_headline(
+                "french", models.Ticket.description, ts_query, "MaxFragments=2, MaxWords=20, MinWords=5"
+            ).label("description_highlight"),
+        )
+        .join(page, page.c.id == models.Ticket.id)
+        .order_by(page.c.rank.desc(), models.Ticket.id.desc())
+        .all()
+    )
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = f"{rows[-1].rank!r}:{rows[-1].id}"
+
+    return schemas.TicketSearchPage(
+        items=[schemas.TicketSearchResult.model_validate(row) for row in rows],
+        next_cursor=next_cursor,
+    )
+
+
+@router.post("/assign-bulk", response_model=List[schemas.TicketRead])
+def assign_tickets_bulk(
+    bulk: schemas.TicketBulkAssign,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(
+        require_role("Secrétaire DSI", "Adjoint DSI", "DSI", "Admin")
+    ),
+):
+    """
+    Assigner plusieurs tickets en une seule transaction (ex : incident majeur).
+    Historique et notifications sont insérés par lots ; chaque technicien reçoit un seul email récapitulatif.
+    """
+    if not bulk.assignments:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="No assignment provided"
+        )
+    technician_by_ticket = {item.ticket_id: item.technician_id for item in bulk.assignments}
+    if len(technician_by_ticket) != len(bulk.assignments):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="A ticket appears more than once"
+        )
+
+    # Verrouiller les tickets pour la durée de la transaction (assignations concurrentes)
+    tickets = (
+        db.query(models.Ticket)
+        .filter(models.Ticket.id.in_(technician_by_ticket))
+        .order_by(models.Ticket.id)
+        .with_for_update()
+        .all()
+    )
+    missing_tickets = set(technician_by_ticket) - {ticket.id for ticket in tickets}
+    if missing_tickets:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Ticket(s) not found: {', '.join(str(ticket_id) for ticket_id in sorted(missing_tickets))}"
+        )
+
+    users = {
+        user.id: user
+        for user in db.query(models.User).filter(
+            models.User.id.in_(set(technician_by_ticket.values()) | {ticket.creator_id for ticket in tickets})
+        )
+    }
+    missing_technicians = set(technician_by_ticket.values()) - set(users)
+    if missing_technicians:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Technician(s) not found: {', '.join(str(user_id) for user_id in sorted(missing_technicians))}"
+        )
+
+    history_reason = bulk.reason or ""
+    if bulk.notes:
+        history_reason += f" | Instructions: {bulk.notes}"
+
+    now = datetime.utcnow()
+    history_rows = []
+    notifications = []
+    for ticket in tickets:
+        old_status = ticket.status
+        ticket.technician_id = technician_by_ticket[ticket.id]
+        ticket.secretary_id = current_user.id
+        ticket.status = models.TicketStatus.ASSIGNE_TECHNICIEN
+        ticket.assigned_at = now
+
+        history_rows.append(models.TicketHistory(
+            ticket_id=ticket.id,
+            old_status=old_status,
+            new_status=ticket.status,
+            user_id=current_user.id,
+            reason=history_reason,
+        ))
+        notifications.append(models.Notification(
+            user_id=ticket.technician_id,
+            type=models.NotificationType.ASSIGNATION,
+            ticket_id=ticket.id,
+            message=f"Un nouveau ticket #{ticket.number} vous a été assigné: {ticket.title}",
+            read=False
+        ))
+        notifications.append(models.Notification(
+            user_id=ticket.creator_id,
+            type=models.NotificationType.TICKET_ASSIGNE,
+            ticket_id=ticket.id,
+            message=f"Votre ticket #{ticket.number} a été assigné à un technicien: {ticket.title}",
+            read=False
+        ))
+    # Insertions groupées (INSERT ... VALUES multiples) au flush
+    db.add_all(history_rows)
+    db.add_all(notifications)
+    db.commit()
+
+    # Un email récapitulatif par technicien, un email par ticket pour les créateurs
+    tickets_by_technician = {}
+    for ticket in tickets:
+        tickets_by_technician.setdefault(ticket.technician_id, []).append({
+            "number": ticket.number,
+            "title": ticket.title,
+            "priority": ticket.priority.value,
+        })
+        creator = users.get(ticket.creator_id)
+        if creator and creator.email and creator.email.strip():
+            background_tasks.add_task(
+                email_service.send_ticket_assigned_to_creator_notification,
+                ticket_id=str(ticket.id),
+                ticket_number=ticket.number,
+                ticket_title=ticket.title,
+                creator_email=creator.email,
+                creator_name=creator.full_name,
+                technician_name=users[ticket.technician_id].full_name
+            )
+    for technician_id, assigned in tickets_by_technician.items():
+        technician = users[technician_id]
+        if technician.email and technician.email.strip():
+            background_tasks.add_task(
+                email_service.send_tickets_bulk_assigned_notification,
+                technician_email=technician.email,
+                technician_name=technician.full_name,
+                tickets=assigned,
+                notes=bulk.notes
+            )
+
+    return (
+        db.query(models.Ticket)
+        .options(
+            joinedload(models.Ticket.creator),
+            joinedload(models.Ticket.technician)
+        )
+        .filter(models.Ticket.id.in_(technician_by_ticket))
+        .order_by(models.Ticket.id)
+        .all()
+    )
+
+
 @router.get("/{ticket_id}", response_model=schemas.TicketRead)
 def get_ticket(
     ticket_id: int,
@@ -210,7 +635,7 @@ def get_ticket(
     # Vérifier les permissions : créateur, technicien assigné, ou agent/DSI
     is_creator = ticket.creator_id == current_user.id
     is_assigned_tech = ticket.technician_id == current_user.id
-    is_agent = current_user.role and current_user.role.name in ["Secrétaire DSI", "Adjoint DSI", "DSI", "Admin"]
+    is_agent = user_has_role(current_user, "Secrétaire DSI", "Adjoint DSI", "DSI", "Admin")
     
     if not (is_creator or is_assigned_tech or is_agent):
         raise HTTPException(
@@ -220,6 +645,41 @@ def get_ticket(
     return ticket
 
 
+@router.get("/{ticket_id}/full", response_model=schemas.TicketFull)
+def get_ticket_full(
+    ticket_id: int,
+    comments_order: Literal["oldest", "newest"] = Query("oldest"),
+    comments_limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    Détail complet d'un ticket (ticket, première page de commentaires, historique) en un seul appel :
+    une vérification des permissions et trois requêtes, auteurs et rôles chargés par jointure.
+    """
+    ticket = _get_accessible_ticket(
+        db,
+        ticket_id,
+        current_user,
+        joinedload(models.Ticket.creator).joinedload(models.User.role),
+        joinedload(models.Ticket.technician).joinedload(models.User.role),
+    )
+    comments = _comment_page(db, ticket_id, comments_order, comments_limit)
+    history = (
+        db.query(models.TicketHistory)
+        .options(joinedload(models.TicketHistory.user).joinedload(models.User.role))
+        .filter(models.TicketHistory.ticket_id == ticket_id)
+        .order_by(models.TicketHistory.changed_at.desc())
+        .all()
+    )
+    ticket_read = schemas.TicketRead.model_validate(ticket)
+    return schemas.TicketFull(
+        **ticket_read.model_dump(),
+        comments=comments,
+        history=[schemas.TicketHistoryRead.model_validate(entry) for entry in history],
+    )
+
+
 @router.put("/{ticket_id}", response_model=schemas.TicketRead)
 def edit_ticket(
     ticket_id: int,
@@ -612,26 +1072,21 @@ def escalate_ticket(
     db.add(history)
     
     # Créer des notifications pour DSI et Adjoints DSI
-    dsi_roles = db.query(models.Role).filter(
-        models.Role.name.in_(["DSI", "Adjoint DSI"])
+    dsi_users = db.query(models.User).filter(
+        models.User.role_id.in_(config_cache.role_ids("DSI", "Adjoint DSI")),
+        models.User.actif == True
     ).all()
-    
-    for role in dsi_roles:
-        dsi_users = db.query(models.User).filter(
-            models.User.role_id == role.id,
-            models.User.actif == True
-        ).all()
-        for dsi_user in dsi_users:
-            # Ne pas notifier l'utilisateur qui a escaladé
-            if dsi_user.id != current_user.id:
-                escalation_notification = models.Notification(
-                    user_id=dsi_user.id,
-                    type=models.NotificationType.ESCALADE,
-                    ticket_id=ticket.id,
-                    message=f"Ticket #{ticket.number} escaladé à la priorité {ticket.priority}: {ticket.title}",
-                    read=False
-                )
-                db.add(escalation_notification)
+    for dsi_user in dsi_users:
+        # Ne pas notifier l'utilisateur qui a escaladé
+        if dsi_user.id != current_user.id:
+            escalation_notification = models.Notification(
+                user_id=dsi_user.id,
+                type=models.NotificationType.ESCALADE,
+                ticket_id=ticket.id,
+                message=f"Ticket #{ticket.number} escaladé à la priorité {ticket.priority}: {ticket.title}",
+                read=False
+            )
+            db.add(escalation_notification)
     
     # Notifier aussi le technicien assigné s'il existe
     if ticket.technician_id:
@@ -723,7 +1178,7 @@ def update_ticket_status(
             )
     elif status_update.status == models.TicketStatus.CLOTURE:
         # Seuls secrétaire/adjoint/DSI/Admin peuvent clôturer
-        if not current_user.role or current_user.role.name not in ["Secrétaire DSI", "Adjoint DSI", "DSI", "Admin"]:
+        if not user_has_role(current_user, "Secrétaire DSI", "Adjoint DSI", "DSI", "Admin"):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Only agents can close tickets"
@@ -902,26 +1357,255 @@ def add_comment(
     return comment
 
 
-@router.get("/{ticket_id}/comments", response_model=List[schemas.CommentRead])
+def _comment_page(
+    db: Session, ticket_id: int, order: str = "oldest", limit: int = 50, cursor: Optional[str] = None
+) -> schemas.CommentPage:
+    """Page de commentaires (curseur (created_at, id)) : auteurs et total lus dans la même requête"""
+    total = (
+        select(func.count(models.Comment.id))
+        .where(models.Comment.ticket_id == ticket_id)
+        .correlate(None)
+        .scalar_subquery()
+    )
+    query = (
+        db.query(models.Comment, total.label("total"))
+        .options(joinedload(models.Comment.user).joinedload(models.User.role))
+        .filter(models.Comment.ticket_id == ticket_id)
+    )
+    if cursor:
+        try:
+            cursor_created_at, cursor_id = cursor.rsplit(":", 1)
+            cursor_created_at, cursor_id = datetime.fromisoformat(cursor_created_at), int(cursor_id)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+            )
+        if order == "newest":
+            query = query.filter(
+                or_(
+                    models.Comment.created_at < cursor_created_at,
+                    and_(models.Comment.created_at == cursor_created_at, models.Comment.id < cursor_id),
+                )
+            )
+        else:
+            query = query.filter(
+                or_(
+                    models.Comment.created_at > cursor_created_at,
+                    and_(models.Comment.created_at == cursor_created_at, models.Comment.id > cursor_id),
+                )
+            )
+    if order == "newest":
+        query = query.order_by(models.Comment.created_at.desc(), models.Comment.id.desc())
+    else:
+        query = query.order_by(models.Comment.created_at.asc(), models.Comment.id.asc())
+    rows = query.limit(limit + 1).all()
+
+    if rows:
+        total_count = rows[0].total
+    elif not cursor:
+        # Première page vide : le ticket n'a aucun commentaire
+        total_count = 0
+    else:
+        # Page vide (au-delà du dernier commentaire) : le total n'est pas porté par une ligne
+        total_count = db.query(func.count(models.Comment.id)).filter(models.Comment.ticket_id == ticket_id).scalar()
+
+    comments = [row.Comment for row in rows]
+    next_cursor = None
+    if len(comments) > limit:
+        comments = comments[:limit]
+        next_cursor = f"{comments[-1].created_at.isoformat()}:{comments[-1].id}"
+
+    return schemas.CommentPage(
+        items=[schemas.CommentRead.model_validate(comment) for comment in comments],
+        total=total_count,
+        next_cursor=next_cursor,
+    )
+
+
+@router.get("/{ticket_id}/comments", response_model=schemas.CommentPage)
 def get_ticket_comments(
     ticket_id: int,
+    order: Literal["oldest", "newest"] = Query("oldest", description="Ordre chronologique des commentaires"),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="next_cursor renvoyé par la page précédente"),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    """Récupérer tous les commentaires d'un ticket"""
-    ticket = db.query(models.Ticket).filter(models.Ticket.id == ticket_id).first()
-    if not ticket:
+    """
+    Récupérer les commentaires d'un ticket, page par page (curseur (created_at, id)).
+    Mêmes règles de visibilité que GET /tickets/{id}.
+    """
+    _get_accessible_ticket(db, ticket_id, current_user)
+    return _comment_page(db, ticket_id, order, limit, cursor)
+
+
+def _store_upload(file: UploadFile, current_user: models.User) -> dict:
+    """Copier le fichier envoyé dans le stockage (par blocs) et construire ses métadonnées"""
+    try:
+        sha256, size = storage.save(file.file)
+    except AttachmentTooLarge:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found"
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Attachment exceeds the maximum size of {MAX_ATTACHMENT_SIZE} bytes"
         )
-    
-    comments = (
+    finally:
+        file.file.close()
+    return build_attachment_entry(sha256, size, file.filename, file.content_type, current_user.id)
+
+
+def _attachment_response(entry: Optional[dict]) -> FileResponse:
+    """
+    Réponse de téléchargement : FileResponse gère les requêtes Range (206) et ETag, et délègue
+    l'envoi au serveur (sendfile / pathsend) quand celui-ci le permet.
+    """
+    path = storage.path_for(entry["sha256"]) if entry else None
+    if not path or not os.path.isfile(path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Attachment not found"
+        )
+    return FileResponse(
+        path,
+        media_type=entry["content_type"],
+        filename=entry["filename"],
+        content_disposition_type="attachment",
+        headers={
+            "X-Content-Type-Options": "nosniff",
+            # Le contenu d'une adresse SHA-256 ne change jamais
+            "Cache-Control": "private, max-age=31536000, immutable",
+        },
+    )
+
+
+def _attachment_preview_response(entry: Optional[dict], variant: str) -> FileResponse:
+    """Miniature / aperçu d'une image (généré en arrière-plan après l'envoi)"""
+    if not entry or variant not in (entry.get("previews") or []):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Preview not available"
+        )
+    path = derived_path(entry["sha256"], variant)
+    if not os.path.isfile(path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Preview not available"
+        )
+    return FileResponse(
+        path,
+        media_type=PREVIEW_MEDIA_TYPE,
+        headers={"Cache-Control": "private, max-age=31536000, immutable"},
+    )
+
+
+@router.post(
+    "/{ticket_id}/attachments",
+    response_model=schemas.AttachmentRead,
+    status_code=status.HTTP_201_CREATED,
+)
+def upload_ticket_attachment(
+    ticket_id: int,
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Joindre un fichier à un ticket"""
+    ticket = _get_accessible_ticket(db, ticket_id, current_user)
+    entry = _store_upload(file, current_user)
+    append_attachment(db, models.Ticket, ticket.id, entry)
+    db.commit()
+    schedule_previews(models.Ticket, ticket.id, entry)
+    return entry
+
+
+@router.get("/{ticket_id}/attachments/{attachment_id}")
+def download_ticket_attachment(
+    ticket_id: int,
+    attachment_id: str,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Télécharger une pièce jointe d'un ticket"""
+    ticket = _get_accessible_ticket(db, ticket_id, current_user)
+    return _attachment_response(find_attachment(ticket.attachments, attachment_id))
+
+
+@router.get("/{ticket_id}/attachments/{attachment_id}/{variant}")
+def get_ticket_attachment_preview(
+    ticket_id: int,
+    attachment_id: str,
+    variant: Literal["thumbnail", "preview"],
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Miniature ou aperçu d'une image jointe à un ticket"""
+    ticket = _get_accessible_ticket(db, ticket_id, current_user)
+    return _attachment_preview_response(find_attachment(ticket.attachments, attachment_id), variant)
+
+
+def _get_ticket_comment(db: Session, ticket_id: int, comment_id: int) -> models.Comment:
+    comment = (
         db.query(models.Comment)
-        .filter(models.Comment.ticket_id == ticket_id)
-        .order_by(models.Comment.created_at.asc())
-        .all()
+        .filter(models.Comment.id == comment_id, models.Comment.ticket_id == ticket_id)
+        .first()
     )
-    return comments
+    if not comment:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Comment not found"
+        )
+    return comment
+
+
+@router.post(
+    "/{ticket_id}/comments/{comment_id}/attachments",
+    response_model=schemas.AttachmentRead,
+    status_code=status.HTTP_201_CREATED,
+)
+def upload_comment_attachment(
+    ticket_id: int,
+    comment_id: int,
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Joindre un fichier à un commentaire (réservé à l'auteur du commentaire)"""
+    _get_accessible_ticket(db, ticket_id, current_user)
+    comment = _get_ticket_comment(db, ticket_id, comment_id)
+    if comment.user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only the author of the comment can attach files to it"
+        )
+    entry = _store_upload(file, current_user)
+    append_attachment(db, models.Comment, comment.id, entry)
+    db.commit()
+    schedule_previews(models.Comment, comment.id, entry)
+    return entry
+
+
+@router.get("/{ticket_id}/comments/{comment_id}/attachments/{attachment_id}")
+def download_comment_attachment(
+    ticket_id: int,
+    comment_id: int,
+    attachment_id: str,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Télécharger une pièce jointe d'un commentaire"""
+    _get_accessible_ticket(db, ticket_id, current_user)
+    comment = _get_ticket_comment(db, ticket_id, comment_id)
+    return _attachment_response(find_attachment(comment.attachments, attachment_id))
+
+
+@router.get("/{ticket_id}/comments/{comment_id}/attachments/{attachment_id}/{variant}")
+def get_comment_attachment_preview(
+    ticket_id: int,
+    comment_id: int,
+    attachment_id: str,
+    variant: Literal["thumbnail", "preview"],
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Miniature ou aperçu d'une image jointe à un commentaire"""
+    _get_accessible_ticket(db, ticket_id, current_user)
+    comment = _get_ticket_comment(db, ticket_id, comment_id)
+    return _attachment_preview_response(find_attachment(comment.attachments, attachment_id), variant)
 
 
 @router.put("/{ticket_id}/validate", response_model=schemas.TicketRead)
@@ -1032,24 +1716,19 @@ def validate_ticket_resolution(
                 )
         
         # Notifier DSI, Adjoints DSI et Secrétaires DSI
-        admin_roles = db.query(models.Role).filter(
-            models.Role.name.in_(["DSI", "Adjoint DSI", "Secrétaire DSI"])
+        admin_users = db.query(models.User).filter(
+            models.User.role_id.in_(config_cache.role_ids("DSI", "Adjoint DSI", "Secrétaire DSI")),
+            models.User.actif == True
         ).all()
-        
-        for role in admin_roles:
-            admin_users = db.query(models.User).filter(
-                models.User.role_id == role.id,
-                models.User.actif == True
-            ).all()
-            for admin_user in admin_users:
-                admin_notification = models.Notification(
-                    user_id=admin_user.id,
-                    type=models.NotificationType.REJET_RESOLUTION,
-                    ticket_id=ticket.id,
-                    message=f"L'utilisateur a rejeté la résolution du ticket #{ticket.number}: {ticket.title}. Motif: {validation.rejection_reason}",
-                    read=False
-                )
-                db.add(admin_notification)
+        for admin_user in admin_users:
+            admin_notification = models.Notification(
+                user_id=admin_user.id,
+                type=models.NotificationType.REJET_RESOLUTION,
+                ticket_id=ticket.id,
+                message=f"L'utilisateur a rejeté la résolution du ticket #{ticket.number}: {ticket.title}. Motif: {validation.rejection_reason}",
+                read=False
+            )
+            db.add(admin_notification)
         
         # Construire la raison pour l'historique avec le motif
         history_reason = f"Validation utilisateur: Rejeté. Motif: {validation.rejection_reason}"
@@ -1092,7 +1771,7 @@ def delegate_to_adjoint(
             status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found"
         )
     adjoint = db.query(models.User).filter(models.User.id == delegate_data.adjoint_id).first()
-    if not adjoint or not adjoint.role or adjoint.role.name != "Adjoint DSI":
+    if not adjoint or not user_has_role(adjoint, "Adjoint DSI"):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Adjoint DSI not found"
         )
@@ -1396,29 +2075,23 @@ def reopen_ticket_by_user(
     db.add(creator_notification)
     
     # Notifier les secrétaires/adjoints/DSI
-    target_roles = db.query(models.Role).filter(
-        models.Role.name.in_(["Secrétaire DSI", "Adjoint DSI", "DSI", "Admin"])
-    ).all()
-    
-    for role in target_roles:
-        users = (
-            db.query(models.User)
-            .options(joinedload(models.User.role))
-            .filter(
-                models.User.role_id == role.id,
-                models.User.actif == True
-            )
-            .all()
+    users = (
+        db.query(models.User)
+        .filter(
+            models.User.role_id.in_(config_cache.role_ids("Secrétaire DSI", "Adjoint DSI", "DSI", "Admin")),
+            models.User.actif == True
         )
-        for user in users:
-            notification = models.Notification(
-                user_id=user.id,
-                type=models.NotificationType.NOUVEAU_TICKET,
-                ticket_id=ticket.id,
-                message=f"Ticket #{ticket.number} réouvert par l'utilisateur: {ticket.title}",
-                read=False
-            )
-            db.add(notification)
+        .all()
+    )
+    for user in users:
+        notification = models.Notification(
+            user_id=user.id,
+            type=models.NotificationType.NOUVEAU_TICKET,
+            ticket_id=ticket.id,
+            message=f"Ticket #{ticket.number} réouvert par l'utilisateur: {ticket.title}",
+            read=False
+        )
+        db.add(notification)
     
     db.commit()
     db.refresh(ticket)
@@ -1553,7 +2226,7 @@ def get_ticket_history(
     # Vérifier les permissions : créateur, technicien assigné, ou agent/DSI
     is_creator = ticket.creator_id == current_user.id
     is_assigned_tech = ticket.technician_id == current_user.id
-    is_agent = current_user.role and current_user.role.name in ["Secrétaire DSI", "Adjoint DSI", "DSI", "Admin"]
+    is_agent = user_has_role(current_user, "Secrétaire DSI", "Adjoint DSI", "DSI", "Admin")
     
     if not (is_creator or is_assigned_tech or is_agent):
         raise HTTPException(
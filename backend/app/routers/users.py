@@ -5,10 +5,11 @@ from datetime import datetime
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy import func
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 
 from .. import models, schemas
 from ..database import get_db
+from ..config_cache import config_cache
 from ..security import get_current_user, require_role, get_password_hash
 
 router = APIRouter()
@@ -31,7 +32,7 @@ def list_technicians(
     ),
 ):
     """Liste tous les techniciens avec leur charge de travail pour l'assignation de tickets"""
-    technician_role = db.query(models.Role).filter(models.Role.name == "Technicien").first()
+    technician_role = config_cache.get_role(config_cache.role_id("Technicien"))
     if not technician_role:
         return []
     
@@ -44,28 +45,29 @@ def list_technicians(
         .all()
     )
     
-    # Ajouter la charge de travail pour chaque technicien
-    result = []
-    for tech in technicians:
-        assigned_count = (
-            db.query(models.Ticket)
+    # Charge de travail de tous les techniciens en une seule requête
+    workloads = {
+        technician_id: (assigned_count, in_progress_count)
+        for technician_id, assigned_count, in_progress_count in (
+            db.query(
+                models.Ticket.technician_id,
+                func.count(models.Ticket.id),
+                func.count(models.Ticket.id).filter(models.Ticket.status == models.TicketStatus.EN_COURS),
+            )
             .filter(
-                models.Ticket.technician_id == tech.id,
+                models.Ticket.technician_id.in_([tech.id for tech in technicians]),
                 models.Ticket.status.in_([
                     models.TicketStatus.ASSIGNE_TECHNICIEN,
                     models.TicketStatus.EN_COURS
                 ])
             )
-            .count()
-        )
-        in_progress_count = (
-            db.query(models.Ticket)
-            .filter(
-                models.Ticket.technician_id == tech.id,
-                models.Ticket.status == models.TicketStatus.EN_COURS
-            )
-            .count()
+            .group_by(models.Ticket.technician_id)
         )
+    }
+    
+    result = []
+    for tech in technicians:
+        assigned_count, in_progress_count = workloads.get(tech.id, (0, 0))
         
         tech_dict = {
             "id": tech.id,
@@ -73,11 +75,7 @@ def list_technicians(
             "email": tech.email,
             "agency": tech.agency,
             "phone": tech.phone,
-            "role": {
-                "id": tech.role.id,
-                "name": tech.role.name,
-                "description": tech.role.description,
-            },
+            "role": technician_role,
             "actif": tech.actif,
             "specialization": tech.specialization,
             "assigned_tickets_count": assigned_count,
@@ -99,7 +97,7 @@ def get_technician_stats(
     """Récupère les statistiques détaillées d'un technicien"""
     technician = db.query(models.User).filter(
         models.User.id == technician_id,
-        models.User.role.has(models.Role.name == "Technicien")
+        models.User.role_id == config_cache.role_id("Technicien")
     ).first()
     
     if not technician:
@@ -186,22 +184,26 @@ def get_technician_stats(
     total_response_time = 0
     response_count = 0
     
+    # Première prise en charge ("en_cours") de chaque ticket résolu/clôturé, en une seule requête
+    first_en_cours_at = dict(
+        db.query(models.TicketHistory.ticket_id, func.min(models.TicketHistory.changed_at))
+        .join(models.Ticket, models.Ticket.id == models.TicketHistory.ticket_id)
+        .filter(
+            models.Ticket.technician_id == technician_id,
+            models.Ticket.status.in_([models.TicketStatus.RESOLU, models.TicketStatus.CLOTURE]),
+            models.TicketHistory.new_status == models.TicketStatus.EN_COURS
+        )
+        .group_by(models.TicketHistory.ticket_id)
+        .all()
+    )
+    
     for ticket in resolved_tickets + closed_tickets:
         if ticket.assigned_at:
-            # Chercher dans l'historique le moment où le ticket est passé à "en_cours"
-            first_en_cours_history = (
-                db.query(models.TicketHistory)
-                .filter(
-                    models.TicketHistory.ticket_id == ticket.id,
-                    models.TicketHistory.new_status == models.TicketStatus.EN_COURS
-                )
-                .order_by(models.TicketHistory.changed_at.asc())
-                .first()
-            )
+            first_en_cours = first_en_cours_at.get(ticket.id)
             
-            if first_en_cours_history:
+            if first_en_cours:
                 # Temps de réponse = temps entre assignation et première prise en charge
-                time_diff = (first_en_cours_history.changed_at - ticket.assigned_at).total_seconds() / 60  # Convertir en minutes
+                time_diff = (first_en_cours - ticket.assigned_at).total_seconds() / 60  # Convertir en minutes
                 if time_diff >= 0:  # S'assurer que le temps est positif
                     total_response_time += time_diff
                     response_count += 1
@@ -317,7 +319,7 @@ def list_all_users(
     current_user: models.User = Depends(require_role("DSI", "Admin")),
 ):
     """Liste tous les utilisateurs (Admin uniquement)"""
-    users = db.query(models.User).all()
+    users = db.query(models.User).options(joinedload(models.User.role)).all()
     
     result = []
     for user in users:
@@ -1,239 +1,247 @@
 """
 Système de tâches planifiées pour les notifications et clôtures automatiques
+
+Les rappels de validation (J+3, J+7, J+10) et la clôture automatique (J+14) d'un ticket résolu sont
+des lignes de la table scheduled_actions, créées au moment où le ticket passe au statut RESOLU et
+annulées dès qu'il le quitte (validation, rejet, réouverture). Un listener before_flush s'en charge :
+les endpoints n'ont rien à appeler.
+
+process_scheduled_actions() s'exécute toutes les SCHEDULED_ACTIONS_POLL_SECONDS secondes et réserve
+les actions échues avec FOR UPDATE SKIP LOCKED : chaque passage ne lit que les actions dues (index
+partiel sur due_at) et plusieurs processus peuvent l'exécuter sans double envoi.
 """
+import os
 from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+from sqlalchemy import event, inspect, update
 from sqlalchemy.orm import Session
-from typing import List
 
 from .database import SessionLocal
 from . import models
 from .email_service import email_service
 
+SCHEDULED_ACTIONS_POLL_SECONDS = int(os.getenv("SCHEDULED_ACTIONS_POLL_SECONDS", "15"))
+SCHEDULED_ACTIONS_BATCH_SIZE = int(os.getenv("SCHEDULED_ACTIONS_BATCH_SIZE", "100"))
+
+ActionType = models.ScheduledActionType
+
+# Actions planifiées à la résolution d'un ticket : (type, délai en jours après resolved_at)
+RESOLUTION_ACTIONS = [
+    (ActionType.RAPPEL_VALIDATION_1, 3),
+    (ActionType.RAPPEL_VALIDATION_2, 7),
+    (ActionType.RAPPEL_VALIDATION_3, 10),
+    (ActionType.CLOTURE_AUTOMATIQUE, 14),
+]
+
+REMINDERS = {
+    ActionType.RAPPEL_VALIDATION_1: (
+        1, models.NotificationType.RAPPEL_VALIDATION_1,
+        "Rappel : Veuillez valider la résolution de votre ticket #{number}",
+    ),
+    ActionType.RAPPEL_VALIDATION_2: (
+        2, models.NotificationType.RAPPEL_VALIDATION_2,
+        "Second rappel : Validation requise pour votre ticket #{number}",
+    ),
+    ActionType.RAPPEL_VALIDATION_3: (
+        3, models.NotificationType.RAPPEL_VALIDATION_3,
+        "Dernier rappel : Veuillez valider votre ticket #{number}",
+    ),
+}
+
+
+# --- Planification ----------------------------------------------------------------------------------
+
+def schedule_resolution_actions(db: Session, ticket: models.Ticket, resolved_at: datetime) -> None:
+    """Planifie rappels et clôture automatique d'un ticket résolu"""
+    for action_type, days in RESOLUTION_ACTIONS:
+        db.add(models.ScheduledAction(
+            action_type=action_type,
+            ticket_id=ticket.id,
+            due_at=resolved_at + timedelta(days=days),
+            state="pending",
+        ))
+
+
+def cancel_ticket_actions(db: Session, ticket_id: int) -> None:
+    """Annule les actions en attente d'un ticket"""
+    db.execute(
+        update(models.ScheduledAction)
+        .where(
+            models.ScheduledAction.ticket_id == ticket_id,
+            models.ScheduledAction.state == "pending",
+        )
+        .values(state="cancelled")
+    )
+
+
+def _actions_before_flush(session: Session, flush_context, instances) -> None:
+    for obj in list(session.dirty):
+        if not isinstance(obj, models.Ticket):
+            continue
+        status_history = inspect(obj).attrs.status.history
+        if not status_history.has_changes():
+            continue
+        old_status = status_history.deleted[0] if status_history.deleted else None
+        if old_status == obj.status:
+            continue
+        if old_status == models.TicketStatus.RESOLU:
+            cancel_ticket_actions(session, obj.id)
+        if obj.status == models.TicketStatus.RESOLU:
+            schedule_resolution_actions(session, obj, obj.resolved_at or datetime.utcnow())
+
+
+def register_scheduled_actions_listener() -> None:
+    event.listen(SessionLocal, "before_flush", _actions_before_flush)
+
+
+# --- Exécution ---------------------------------------------------------------------------------------
+
+def _send_validation_reminder(
+    db: Session, action: models.ScheduledAction, ticket: models.Ticket, creator, now: datetime,
+    emails: List[Callable[[], bool]]
+) -> None:
+    reminder_number, notification_type, message = REMINDERS[action.action_type]
+    db.add(models.Notification(
+        user_id=ticket.creator_id,
+        type=notification_type,
+        ticket_id=ticket.id,
+        message=message.format(number=ticket.number),
+        read=False
+    ))
+    if creator and creator.email and creator.email.strip():
+        days_since_resolution = (now - ticket.resolved_at).days if ticket.resolved_at else 0
+        emails.append(lambda: email_service.send_validation_reminder(
+            ticket_id=str(ticket.id),
+            ticket_number=ticket.number,
+            ticket_title=ticket.title,
+            creator_email=creator.email,
+            creator_name=creator.full_name,
+            reminder_number=reminder_number,
+            days_since_resolution=days_since_resolution
+        ))
+
+
+def _auto_close_ticket(
+    db: Session, ticket: models.Ticket, creator, now: datetime, emails: List[Callable[[], bool]]
+) -> None:
+    ticket.status = models.TicketStatus.CLOTURE
+    ticket.closed_at = now
+    ticket.auto_closed_at = now  # Marquer comme clôture automatique
+
+    db.add(models.TicketHistory(
+        ticket_id=ticket.id,
+        old_status=models.TicketStatus.RESOLU,
+        new_status=models.TicketStatus.CLOTURE,
+        user_id=ticket.creator_id,  # Utiliser le créateur comme user_id pour l'historique
+        reason="Clôture automatique après 14 jours sans validation"
+    ))
+    db.add(models.Notification(
+        user_id=ticket.creator_id,
+        type=models.NotificationType.CLOTURE_AUTOMATIQUE,
+        ticket_id=ticket.id,
+        message=f"Votre ticket #{ticket.number} a été clôturé automatiquement après 14 jours sans validation. Vous pouvez le réouvrir dans les 7 prochains jours si nécessaire.",
+        read=False
+    ))
+    if ticket.technician_id:
+        db.add(models.Notification(
+            user_id=ticket.technician_id,
+            type=models.NotificationType.TICKET_CLOTURE,
+            ticket_id=ticket.id,
+            message=f"Le ticket #{ticket.number} a été clôturé automatiquement après 14 jours sans validation: {ticket.title}",
+            read=False
+        ))
+    if creator and creator.email and creator.email.strip():
+        emails.append(lambda: email_service.send_ticket_auto_closed_notification(
+            ticket_id=str(ticket.id),
+            ticket_number=ticket.number,
+            ticket_title=ticket.title,
+            creator_email=creator.email,
+            creator_name=creator.full_name
+        ))
+
+
+def _run_action(
+    db: Session, action: models.ScheduledAction, ticket: models.Ticket, creator, now: datetime,
+    emails: List[Callable[[], bool]]
+) -> None:
+    # Le ticket a quitté le statut RESOLU sans que l'action soit annulée (ex : UPDATE en masse)
+    if ticket is None or ticket.status != models.TicketStatus.RESOLU:
+        action.state = "cancelled"
+        return
+    if action.action_type == ActionType.CLOTURE_AUTOMATIQUE:
+        _auto_close_ticket(db, ticket, creator, now, emails)
+    else:
+        _send_validation_reminder(db, action, ticket, creator, now, emails)
+    action.state = "done"
+    action.executed_at = now
 
-def check_validation_reminders():
-    """
-    Vérifie les tickets résolus non validés et envoie des rappels
-    Rappels à 3, 7 et 10 jours après résolution
-    """
+
+def process_scheduled_actions() -> int:
+    """Exécute les actions planifiées échues ; renvoie le nombre d'actions traitées"""
     db: Session = SessionLocal()
+    processed = 0
     try:
-        # Récupérer tous les tickets résolus non clôturés
-        resolved_tickets = (
-            db.query(models.Ticket)
-            .filter(
-                models.Ticket.status == models.TicketStatus.RESOLU,
-                models.Ticket.resolved_at.isnot(None)
-            )
-            .all()
-        )
-        
-        now = datetime.utcnow()
-        
-        for ticket in resolved_tickets:
-            if not ticket.resolved_at:
-                continue
-                
-            days_since_resolution = (now - ticket.resolved_at).days
-            
-            # Vérifier si des rappels ont déjà été envoyés
-            existing_reminders = (
-                db.query(models.Notification)
+        while True:
+            now = datetime.utcnow()
+            actions = (
+                db.query(models.ScheduledAction)
                 .filter(
-                    models.Notification.ticket_id == ticket.id,
-                    models.Notification.user_id == ticket.creator_id,
-                    models.Notification.type.in_([
-                        models.NotificationType.RAPPEL_VALIDATION_1,
-                        models.NotificationType.RAPPEL_VALIDATION_2,
-                        models.NotificationType.RAPPEL_VALIDATION_3
-                    ])
+                    models.ScheduledAction.state == "pending",
+                    models.ScheduledAction.due_at <= now,
                 )
+                .order_by(models.ScheduledAction.due_at, models.ScheduledAction.id)
+                .limit(SCHEDULED_ACTIONS_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
                 .all()
             )
-            
-            reminder_numbers_sent = set()
-            for reminder in existing_reminders:
-                if reminder.type == models.NotificationType.RAPPEL_VALIDATION_1:
-                    reminder_numbers_sent.add(1)
-                elif reminder.type == models.NotificationType.RAPPEL_VALIDATION_2:
-                    reminder_numbers_sent.add(2)
-                elif reminder.type == models.NotificationType.RAPPEL_VALIDATION_3:
-                    reminder_numbers_sent.add(3)
-            
-            # Envoyer le premier rappel après 3 jours
-            if days_since_resolution >= 3 and 1 not in reminder_numbers_sent:
-                creator = db.query(models.User).filter(models.User.id == ticket.creator_id).first()
-                if creator and creator.email and creator.email.strip():
-                    # Créer la notification
-                    notification = models.Notification(
-                        user_id=ticket.creator_id,
-                        type=models.NotificationType.RAPPEL_VALIDATION_1,
-                        ticket_id=ticket.id,
-                        message=f"Rappel : Veuillez valider la résolution de votre ticket #{ticket.number}",
-                        read=False
-                    )
-                    db.add(notification)
-                    db.commit()
-                    
-                    # Envoyer l'email
-                    email_service.send_validation_reminder(
-                        ticket_id=str(ticket.id),
-                        ticket_number=ticket.number,
-                        ticket_title=ticket.title,
-                        creator_email=creator.email,
-                        creator_name=creator.full_name,
-                        reminder_number=1,
-                        days_since_resolution=days_since_resolution
-                    )
-            
-            # Envoyer le second rappel après 7 jours
-            elif days_since_resolution >= 7 and 2 not in reminder_numbers_sent:
-                creator = db.query(models.User).filter(models.User.id == ticket.creator_id).first()
-                if creator and creator.email and creator.email.strip():
-                    # Créer la notification
-                    notification = models.Notification(
-                        user_id=ticket.creator_id,
-                        type=models.NotificationType.RAPPEL_VALIDATION_2,
-                        ticket_id=ticket.id,
-                        message=f"Second rappel : Validation requise pour votre ticket #{ticket.number}",
-                        read=False
-                    )
-                    db.add(notification)
-                    db.commit()
-                    
-                    # Envoyer l'email
-                    email_service.send_validation_reminder(
-                        ticket_id=str(ticket.id),
-                        ticket_number=ticket.number,
-                        ticket_title=ticket.title,
-                        creator_email=creator.email,
-                        creator_name=creator.full_name,
-                        reminder_number=2,
-                        days_since_resolution=days_since_resolution
-                    )
-            
-            # Envoyer le troisième rappel après 10 jours
-            elif days_since_resolution >= 10 and 3 not in reminder_numbers_sent:
-                creator = db.query(models.User).filter(models.User.id == ticket.creator_id).first()
-                if creator and creator.email and creator.email.strip():
-                    # Créer la notification
-                    notification = models.Notification(
-                        user_id=ticket.creator_id,
-                        type=models.NotificationType.RAPPEL_VALIDATION_3,
-                        ticket_id=ticket.id,
-                        message=f"Dernier rappel : Veuillez valider votre ticket #{ticket.number}",
-                        read=False
-                    )
-                    db.add(notification)
-                    db.commit()
-                    
-                    # Envoyer l'email
-                    email_service.send_validation_reminder(
-                        ticket_id=str(ticket.id),
-                        ticket_number=ticket.number,
-                        ticket_title=ticket.title,
-                        creator_email=creator.email,
-                        creator_name=creator.full_name,
-                        reminder_number=3,
-                        days_since_resolution=days_since_resolution
-                    )
-    
-    except Exception as e:
-        print(f"Erreur lors de la vérification des rappels de validation: {str(e)}")
-        db.rollback()
-    finally:
-        db.close()
-
+            if not actions:
+                break
 
-def auto_close_unvalidated_tickets():
-    """
-    Clôture automatiquement les tickets résolus non validés après 14 jours
-    """
-    db: Session = SessionLocal()
-    try:
-        # Récupérer tous les tickets résolus non clôturés depuis plus de 14 jours
-        now = datetime.utcnow()
-        cutoff_date = now - timedelta(days=14)
-        
-        unvalidated_tickets = (
-            db.query(models.Ticket)
-            .filter(
-                models.Ticket.status == models.TicketStatus.RESOLU,
-                models.Ticket.resolved_at.isnot(None),
-                models.Ticket.resolved_at <= cutoff_date,
-                models.Ticket.closed_at.is_(None)  # Pas encore clôturé
-            )
-            .all()
-        )
-        
-        for ticket in unvalidated_tickets:
-            # Clôturer le ticket automatiquement
-            ticket.status = models.TicketStatus.CLOTURE
-            ticket.closed_at = now
-            ticket.auto_closed_at = now  # Marquer comme clôture automatique
-            
-            # Créer une entrée d'historique
-            history = models.TicketHistory(
-                ticket_id=ticket.id,
-                old_status=models.TicketStatus.RESOLU,
-                new_status=models.TicketStatus.CLOTURE,
-                user_id=ticket.creator_id,  # Utiliser le créateur comme user_id pour l'historique
-                reason="Clôture automatique après 14 jours sans validation"
-            )
-            db.add(history)
-            
-            # Créer une notification pour le créateur
-            notification = models.Notification(
-                user_id=ticket.creator_id,
-                type=models.NotificationType.CLOTURE_AUTOMATIQUE,
-                ticket_id=ticket.id,
-                message=f"Votre ticket #{ticket.number} a été clôturé automatiquement après 14 jours sans validation. Vous pouvez le réouvrir dans les 7 prochains jours si nécessaire.",
-                read=False
-            )
-            db.add(notification)
-            
-            # Récupérer le créateur pour l'email
-            creator = db.query(models.User).filter(models.User.id == ticket.creator_id).first()
-            if creator and creator.email and creator.email.strip():
-                # Envoyer l'email
-                email_service.send_ticket_auto_closed_notification(
-                    ticket_id=str(ticket.id),
-                    ticket_number=ticket.number,
-                    ticket_title=ticket.title,
-                    creator_email=creator.email,
-                    creator_name=creator.full_name
-                )
-            
-            # Notifier le technicien si assigné
-            if ticket.technician_id:
-                tech_notification = models.Notification(
-                    user_id=ticket.technician_id,
-                    type=models.NotificationType.TICKET_CLOTURE,
-                    ticket_id=ticket.id,
-                    message=f"Le ticket #{ticket.number} a été clôturé automatiquement après 14 jours sans validation: {ticket.title}",
-                    read=False
+            ticket_ids = {action.ticket_id for action in actions}
+            tickets: Dict[int, models.Ticket] = {
+                ticket.id: ticket
+                for ticket in db.query(models.Ticket)
+                .filter(models.Ticket.id.in_(ticket_ids))
+                .with_for_update()
+            }
+            creators = {
+                user.id: user
+                for user in db.query(models.User).filter(
+                    models.User.id.in_({ticket.creator_id for ticket in tickets.values()})
                 )
-                db.add(tech_notification)
-        
-        db.commit()
-        print(f"Clôture automatique: {len(unvalidated_tickets)} tickets clôturés")
-    
+            }
+
+            emails: List[Callable[[], bool]] = []
+            for action in actions:
+                ticket = tickets.get(action.ticket_id)
+                creator = creators.get(ticket.creator_id) if ticket else None
+                savepoint = db.begin_nested()
+                try:
+                    action_emails: List[Callable[[], bool]] = []
+                    _run_action(db, action, ticket, creator, now, action_emails)
+                    savepoint.commit()
+                    emails.extend(action_emails)
+                except Exception as e:
+                    savepoint.rollback()
+                    print(f"[SCHEDULER] Erreur lors de l'action {action.id} ({action.action_type.value}): {e}")
+                    action.state = "failed"
+                    action.last_error = str(e)
+                    action.executed_at = now
+            db.commit()
+            processed += len(actions)
+
+            # Emails envoyés uniquement une fois les actions enregistrées
+            for send in emails:
+                send()
+
+            if len(actions) < SCHEDULED_ACTIONS_BATCH_SIZE:
+                break
+        if processed:
+            print(f"[SCHEDULER] {processed} action(s) planifiée(s) traitée(s)")
     except Exception as e:
-        print(f"Erreur lors de la clôture automatique: {str(e)}")
+        print(f"[SCHEDULER] Erreur lors du traitement des actions planifiées: {str(e)}")
         db.rollback()
     finally:
         db.close()
-
-
-def run_scheduled_tasks():
-    """
-    Fonction principale pour exécuter toutes les tâches planifiées
-    À appeler périodiquement (ex: toutes les heures via cron ou APScheduler)
-    """
-    print(f"[{datetime.utcnow()}] Exécution des tâches planifiées...")
-    check_validation_reminders()
-    auto_close_unvalidated_tickets()
-    print(f"[{datetime.utcnow()}] Tâches planifiées terminées")
-
-
-
-
+    return processed
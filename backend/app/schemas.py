@@ -1,7 +1,7 @@
-from datetime import datetime
-from typing import List, Optional
+from datetime import date, datetime
+from typing import List, Literal, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, ValidationError, field_validator, model_validator
 
 from .models import TicketPriority, TicketStatus, TicketType, CommentType, NotificationType, TicketTypeModel, TicketCategory
 
@@ -91,12 +91,62 @@ class TicketAssign(BaseModel):
     reason: Optional[str] = None
     notes: Optional[str] = None  # Notes/instructions pour le technicien
 
+class TicketBulkAssignItem(BaseModel):
+    ticket_id: int
+    technician_id: int
+
+
+class TicketBulkAssign(BaseModel):
+    """Assignation groupée : chaque ticket est assigné au technicien indiqué, en une seule transaction"""
+    assignments: List[TicketBulkAssignItem]
+    reason: Optional[str] = None
+    notes: Optional[str] = None  # Instructions communes à tous les tickets
+
 class TicketDelegate(BaseModel):
     adjoint_id: int
     reason: Optional[str] = None
     notes: Optional[str] = None
 
 
+class AttachmentRead(BaseModel):
+    """Pièce jointe d'un ticket ou d'un commentaire (entrée de la colonne JSONB attachments)"""
+    id: str
+    sha256: str
+    filename: str
+    content_type: str
+    size: int
+    uploaded_by: int
+    uploaded_at: datetime
+    previews: List[str] = []  # Variants générés ("preview", "thumbnail"), voir attachment_previews.py
+    thumbnail_url: Optional[str] = None
+    preview_url: Optional[str] = None
+
+
+def _conforming_attachments(entries):
+    """
+    Entrées de la colonne JSONB attachments lisibles comme AttachmentRead. Les entrées antérieures au
+    stockage par empreinte (ex. {"name": ...} seul) ne sont pas téléchargeables : elles sont ignorées.
+    """
+    if entries is None:
+        return None
+    attachments = []
+    for entry in entries:
+        try:
+            attachments.append(AttachmentRead.model_validate(entry))
+        except ValidationError:
+            continue
+    return attachments
+
+
+def _set_preview_urls(attachments: Optional[List[AttachmentRead]], base_url: str) -> None:
+    """Renseigne les URLs des miniatures/aperçus disponibles à partir de l'URL de base des pièces jointes"""
+    for attachment in attachments or []:
+        if "thumbnail" in attachment.previews:
+            attachment.thumbnail_url = f"{base_url}/{attachment.id}/thumbnail"
+        if "preview" in attachment.previews:
+            attachment.preview_url = f"{base_url}/{attachment.id}/preview"
+
+
 class TicketRead(TicketBase):
     id: int
     number: int
@@ -111,8 +161,96 @@ class TicketRead(TicketBase):
     assigned_at: Optional[datetime] = None
     resolved_at: Optional[datetime] = None
     closed_at: Optional[datetime] = None
+    attachments: Optional[List[AttachmentRead]] = None
+    sla_response_due_at: Optional[datetime] = None  # Échéance SLA de prise en charge
+    sla_resolution_due_at: Optional[datetime] = None  # Échéance SLA de résolution
     # category est hérité de TicketBase
 
+    _attachments = field_validator("attachments", mode="before")(_conforming_attachments)
+
+    @model_validator(mode="after")
+    def _attachment_preview_urls(self):
+        _set_preview_urls(self.attachments, f"/tickets/{self.id}/attachments")
+        return self
+
+    class Config:
+        from_attributes = True
+
+
+class TicketDuplicateHint(BaseModel):
+    """Ticket ouvert similaire détecté à la création (doublon possible)"""
+    id: int
+    number: int
+    title: str
+    status: TicketStatus
+    created_at: datetime
+    similarity: float
+
+    class Config:
+        from_attributes = True
+
+
+class TicketCreated(TicketRead):
+    """Réponse de création : ticket créé + doublons possibles parmi les tickets ouverts récents"""
+    possible_duplicates: List[TicketDuplicateHint] = []
+
+
+class TicketSummary(BaseModel):
+    """
+    Projection allégée d'un ticket pour les vues liste (view=summary).
+    Seules ces colonnes sont lues en base : description, pièces jointes et feedback ne sont pas chargés.
+    """
+    id: int
+    number: int
+    title: str
+    type: TicketType
+    priority: TicketPriority
+    status: TicketStatus
+    category: Optional[str] = None
+    created_at: datetime
+    creator_id: int
+    creator_name: Optional[str]  # Nom complet du créateur (jointure)
+    technician_id: Optional[int] = None
+    technician_name: Optional[str]  # Nom complet du technicien (jointure)
+
+    class Config:
+        from_attributes = True
+
+
+class TicketSearchResult(BaseModel):
+    """Résultat de recherche plein texte, avec extraits surlignés (balises <b>)"""
+    id: int
+    number: int
+    title: str
+    type: TicketType
+    priority: TicketPriority
+    status: TicketStatus
+    category: Optional[str] = None
+    created_at: datetime
+    rank: float
+    title_highlight: str
+    description_highlight: str
+
+    class Config:
+        from_attributes = True
+
+
+class TicketSearchPage(BaseModel):
+    """Page de résultats ; next_cursor est à renvoyer dans le paramètre cursor pour la page suivante"""
+    items: List[TicketSearchResult]
+    next_cursor: Optional[str] = None
+
+
+class SlaPolicyBase(BaseModel):
+    priority: TicketPriority
+    type: Optional[TicketType] = None  # None = tous les types de la priorité
+    response_minutes: int = Field(..., gt=0)
+    resolution_minutes: int = Field(..., gt=0)
+
+
+class SlaPolicyRead(SlaPolicyBase):
+    id: int
+
     class Config:
         from_attributes = True
 
@@ -151,11 +289,27 @@ class CommentRead(BaseModel):
     content: str
     type: CommentType
     created_at: datetime
+    attachments: Optional[List[AttachmentRead]] = None
+    user: Optional[UserRead] = None  # Auteur du commentaire
+
+    _attachments = field_validator("attachments", mode="before")(_conforming_attachments)
+
+    @model_validator(mode="after")
+    def _attachment_preview_urls(self):
+        _set_preview_urls(self.attachments, f"/tickets/{self.ticket_id}/comments/{self.id}/attachments")
+        return self
 
     class Config:
         from_attributes = True
 
 
+class CommentPage(BaseModel):
+    """Page de commentaires ; next_cursor est à renvoyer dans le paramètre cursor pour la page suivante"""
+    items: List[CommentRead]
+    total: int
+    next_cursor: Optional[str] = None
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
@@ -200,16 +354,99 @@ class NotificationRead(BaseModel):
         from_attributes = True
 
 
+class NotificationPreferencesUpdate(BaseModel):
+    """Mode d'envoi des notifications par email"""
+    email_digest_mode: Literal["immediate", "interval", "daily"]
+    email_digest_interval_minutes: Optional[int] = Field(None, ge=5, le=1440)  # Mode interval uniquement
+
+
+class NotificationPreferencesRead(BaseModel):
+    email_digest_mode: str
+    email_digest_interval_minutes: Optional[int] = None
+    email_digest_next_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
 class TicketHistoryRead(BaseModel):
     """Schéma pour lire l'historique d'un ticket"""
     id: int
     ticket_id: int
     old_status: Optional[str] = None
     new_status: str
-    user_id: int
+    user_id: Optional[int] = None  # None pour une action automatique
     reason: Optional[str] = None
     changed_at: datetime
     user: Optional[UserRead] = None
 
     class Config:
         from_attributes = True
+
+
+class DailyStatsRow(BaseModel):
+    """Ligne d'agrégats : dimensions de regroupement demandées (les autres restent None) et compteurs sommés"""
+    day: Optional[date] = None
+    agency: Optional[str] = None
+    type: Optional[TicketType] = None
+    priority: Optional[TicketPriority] = None
+    category: Optional[str] = None
+    technician_id: Optional[int] = None
+    created_count: int
+    assigned_count: int
+    resolved_count: int
+    closed_count: int
+    rejected_count: int
+    reopened_count: int
+    resolution_seconds_sum: int
+    feedback_count: int
+    feedback_score_sum: int
+    avg_resolution_hours: Optional[float] = None
+    avg_feedback_score: Optional[float] = None
+
+
+class ReportCreate(BaseModel):
+    """Demande de génération de rapport (période inclusive)"""
+    report_type: str
+    period_start: date
+    period_end: date
+
+
+class ReportSummary(BaseModel):
+    """Métadonnées d'un rapport (sans les données)"""
+    id: int
+    title: str
+    report_type: str
+    creator_id: int
+    status: str
+    generated_at: Optional[datetime] = None
+    period_start: Optional[datetime] = None
+    period_end: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class ReportRead(ReportSummary):
+    data: dict
+
+
+class TicketFull(TicketRead):
+    """Détail complet d'un ticket : ticket, première page de commentaires et historique"""
+    comments: CommentPage
+    history: List[TicketHistoryRead]
+
+
+class ProfileSummary(BaseModel):
+    """Métadonnées d'un profil de requête enregistré (sans les piles)"""
+    id: str
+    trigger: Literal["on_demand", "sampled"]
+    method: str
+    path: str
+    route: Optional[str] = None
+    status_code: Optional[int] = None
+    created_at: datetime
+    duration_ms: float
+    interval_ms: float
+    samples: int
+    sampled_ms: float
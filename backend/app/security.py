@@ -9,6 +9,7 @@ import bcrypt
 from sqlalchemy.orm import Session
 
 from . import models, schemas
+from .config_cache import config_cache
 from .database import get_db
 
 SECRET_KEY = os.getenv("SECRET_KEY", "CHANGE_ME_SECRET_KEY_VERY_IMPORTANT_TO_CHANGE")
@@ -73,9 +74,8 @@ def authenticate_user(db: Session, username: str, password: str) -> Optional[mod
     return user
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
-) -> models.User:
+def user_from_token(db: Session, token: str) -> models.User:
+    """Utilisateur désigné par un jeton d'accès (401 si le jeton est invalide) ; synchrone"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -96,9 +96,20 @@ async def get_current_user(
     return user
 
 
+async def get_current_user(
+    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
+) -> models.User:
+    return user_from_token(db, token)
+
+
+def user_has_role(user: models.User, *role_names: str) -> bool:
+    """Vérifie le rôle d'un utilisateur via le registre des rôles (comparaison d'ids, sans charger user.role)"""
+    return user.role_id in config_cache.role_ids(*role_names)
+
+
 def require_role(*allowed_roles: str):
     def dependency(current_user: models.User = Depends(get_current_user)) -> models.User:
-        if current_user.role is None or current_user.role.name not in allowed_roles:
+        if not user_has_role(current_user, *allowed_roles):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Permission denied",
@@ -106,5 +117,3 @@ def require_role(*allowed_roles: str):
         return current_user
 
     return dependency
-
-
@@ -0,0 +1,292 @@
+"""
+Moteur SLA : échéances de prise en charge et de résolution des tickets, alertes et escalades
+
+À la création d'un ticket, ses échéances sont calculées depuis les objectifs de la table sla_policies
+(par priorité, éventuellement par type). Chaque ticket porte aussi sla_next_check_at, la date de la
+prochaine alerte à émettre (pré-alerte à SLA_WARNING_RATIO du délai, puis dépassement) ; elle est
+recalculée par un listener before_flush à chaque changement de statut, de priorité ou de type.
+
+Le job process_due_sla (toutes les SLA_CHECK_SECONDS secondes) ne lit que les tickets dont
+sla_next_check_at est échu, via un index partiel : le coût d'un passage est proportionnel au nombre
+d'alertes à émettre, pas au nombre de tickets ouverts. Les lignes sont réservées avec
+FOR UPDATE SKIP LOCKED, plusieurs processus peuvent donc exécuter le job sans doublon.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from . import models
+from .config_cache import config_cache
+from .database import SessionLocal
+
+SLA_CHECK_SECONDS = int(os.getenv("SLA_CHECK_SECONDS", "30"))
+SLA_WARNING_RATIO = float(os.getenv("SLA_WARNING_RATIO", "0.8"))
+SLA_BATCH_SIZE = int(os.getenv("SLA_BATCH_SIZE", "200"))
+SLA_POLICY_CACHE_SECONDS = int(os.getenv("SLA_POLICY_CACHE_SECONDS", "60"))
+
+# Objectifs par défaut (minutes) : utilisés si aucune politique n'est configurée pour la priorité
+DEFAULT_SLA_TARGETS: Dict[models.TicketPriority, Tuple[int, int]] = {
+    models.TicketPriority.CRITIQUE: (15, 4 * 60),
+    models.TicketPriority.HAUTE: (60, 8 * 60),
+    models.TicketPriority.MOYENNE: (4 * 60, 24 * 60),
+    models.TicketPriority.FAIBLE: (8 * 60, 72 * 60),
+}
+
+# Alertes déjà émises (colonne Ticket.sla_notified)
+SLA_RESPONSE_WARNING = 1
+SLA_RESPONSE_BREACH = 2
+SLA_RESOLUTION_WARNING = 4
+SLA_RESOLUTION_BREACH = 8
+
+RESPONSE_PENDING_STATUSES = (models.TicketStatus.EN_ATTENTE_ANALYSE,)
+RESOLUTION_PENDING_STATUSES = (
+    models.TicketStatus.EN_ATTENTE_ANALYSE,
+    models.TicketStatus.ASSIGNE_TECHNICIEN,
+    models.TicketStatus.EN_COURS,
+)
+
+
+class _PolicyCache:
+    """Objectifs SLA (priorité, type) -> (réponse, résolution) en minutes, rechargés au plus toutes les N secondes"""
+
+    def __init__(self):
+        self._targets: Dict[Tuple[models.TicketPriority, Optional[models.TicketType]], Tuple[int, int]] = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        self._loaded_at = 0.0
+
+    def targets(self, priority, ticket_type) -> Tuple[int, int]:
+        if time.monotonic() - self._loaded_at > SLA_POLICY_CACHE_SECONDS:
+            self._reload()
+        priority = models.TicketPriority(priority)
+        ticket_type = models.TicketType(ticket_type) if ticket_type else None
+        return (
+            self._targets.get((priority, ticket_type))
+            or self._targets.get((priority, None))
+            or DEFAULT_SLA_TARGETS[priority]
+        )
+
+    def _reload(self) -> None:
+        with self._lock:
+            db = SessionLocal()
+            try:
+                self._targets = {
+                    (policy.priority, policy.type): (policy.response_minutes, policy.resolution_minutes)
+                    for policy in db.query(models.SlaPolicy).all()
+                }
+            except Exception as e:
+                print(f"[SLA] Impossible de charger les politiques SLA, objectifs par défaut utilisés: {e}")
+            finally:
+                db.close()
+            self._loaded_at = time.monotonic()
+
+
+sla_policies = _PolicyCache()
+
+
+def apply_sla_deadlines(ticket: models.Ticket) -> None:
+    """Calcule les échéances du ticket depuis sa date de création, sa priorité et son type"""
+    created_at = ticket.created_at or datetime.utcnow()
+    response_minutes, resolution_minutes = sla_policies.targets(
+        ticket.priority or models.TicketPriority.MOYENNE, ticket.type
+    )
+    response_due_at = created_at + timedelta(minutes=response_minutes)
+    resolution_due_at = created_at + timedelta(minutes=resolution_minutes)
+    # Échéance modifiée (changement de priorité ou de type) : ses alertes seront émises à nouveau
+    if ticket.sla_response_due_at != response_due_at:
+        _reset_notified(ticket, SLA_RESPONSE_WARNING | SLA_RESPONSE_BREACH)
+    if ticket.sla_resolution_due_at != resolution_due_at:
+        _reset_notified(ticket, SLA_RESOLUTION_WARNING | SLA_RESOLUTION_BREACH)
+    ticket.sla_response_due_at = response_due_at
+    ticket.sla_resolution_due_at = resolution_due_at
+
+
+def _reset_notified(ticket: models.Ticket, bits: int) -> None:
+    ticket.sla_notified = (ticket.sla_notified or 0) & ~bits
+
+
+def _reset_reopened_steps(ticket: models.Ticket, old_status) -> None:
+    """Ticket réouvert (ex : RESOLU -> EN_COURS) : les alertes de l'étape qui reprend seront émises à nouveau"""
+    if ticket.status in RESPONSE_PENDING_STATUSES and old_status not in RESPONSE_PENDING_STATUSES:
+        _reset_notified(ticket, SLA_RESPONSE_WARNING | SLA_RESPONSE_BREACH)
+    if ticket.status in RESOLUTION_PENDING_STATUSES and old_status not in RESOLUTION_PENDING_STATUSES:
+        _reset_notified(ticket, SLA_RESOLUTION_WARNING | SLA_RESOLUTION_BREACH)
+
+
+def _warning_time(start: datetime, due: datetime) -> datetime:
+    return start + (due - start) * SLA_WARNING_RATIO
+
+
+def pending_sla_events(ticket: models.Ticket) -> List[Tuple[datetime, int]]:
+    """Alertes restant à émettre pour le ticket : (date d'échéance, bit SLA_*)"""
+    events = []
+    notified = ticket.sla_notified or 0
+    created_at = ticket.created_at or datetime.utcnow()
+    if ticket.status in RESPONSE_PENDING_STATUSES and ticket.sla_response_due_at:
+        if not notified & SLA_RESPONSE_WARNING:
+            events.append((_warning_time(created_at, ticket.sla_response_due_at), SLA_RESPONSE_WARNING))
+        if not notified & SLA_RESPONSE_BREACH:
+            events.append((ticket.sla_response_due_at, SLA_RESPONSE_BREACH))
+    if ticket.status in RESOLUTION_PENDING_STATUSES and ticket.sla_resolution_due_at:
+        if not notified & SLA_RESOLUTION_WARNING:
+            events.append((_warning_time(created_at, ticket.sla_resolution_due_at), SLA_RESOLUTION_WARNING))
+        if not notified & SLA_RESOLUTION_BREACH:
+            events.append((ticket.sla_resolution_due_at, SLA_RESOLUTION_BREACH))
+    return events
+
+
+def next_sla_check(ticket: models.Ticket) -> Optional[datetime]:
+    events = pending_sla_events(ticket)
+    return min(due for due, _ in events) if events else None
+
+
+def _sla_before_flush(session: Session, flush_context, instances) -> None:
+    for obj in session.new:
+        if isinstance(obj, models.Ticket):
+            if obj.created_at is None:
+                obj.created_at = datetime.utcnow()
+            apply_sla_deadlines(obj)
+            obj.sla_next_check_at = next_sla_check(obj)
+    for obj in session.dirty:
+        if not isinstance(obj, models.Ticket):
+            continue
+        state = inspect(obj)
+        status_history = state.attrs.status.history
+        deadlines_changed = state.attrs.priority.history.has_changes() or state.attrs.type.history.has_changes()
+        if not deadlines_changed and not status_history.has_changes():
+            continue
+        if deadlines_changed:
+            apply_sla_deadlines(obj)
+        if status_history.deleted:
+            _reset_reopened_steps(obj, status_history.deleted[0])
+        obj.sla_next_check_at = next_sla_check(obj)
+
+
+def _keep_previous_status(target, value, oldvalue, initiator) -> None:
+    pass
+
+
+def register_sla_listener() -> None:
+    event.listen(SessionLocal, "before_flush", _sla_before_flush)
+    # active_history : l'ancien statut est chargé même si le ticket a été expiré (commit) avant la
+    # modification, la réouverture est ainsi toujours détectée par _reset_reopened_steps
+    event.listen(models.Ticket.status, "set", _keep_previous_status, active_history=True)
+
+
+# --- Émission des alertes ---------------------------------------------------------------------------
+
+def _role_user_ids(db: Session, cache: Dict[str, List[int]], *role_names: str) -> List[int]:
+    key = ",".join(role_names)
+    if key not in cache:
+        cache[key] = [
+            user_id
+            for (user_id,) in db.query(models.User.id).filter(
+                models.User.role_id.in_(config_cache.role_ids(*role_names)),
+                models.User.actif == True
+            )
+        ]
+    return cache[key]
+
+
+def _notify(db: Session, user_ids: Iterable[int], notification_type, ticket: models.Ticket, message: str) -> None:
+    for user_id in set(user_ids):
+        db.add(models.Notification(
+            user_id=user_id,
+            type=notification_type,
+            ticket_id=ticket.id,
+            message=message,
+            read=False
+        ))
+
+
+def _fire_event(db: Session, ticket: models.Ticket, event_bit: int, recipients_cache: Dict[str, List[int]]) -> None:
+    if event_bit == SLA_RESPONSE_WARNING:
+        _notify(
+            db, _role_user_ids(db, recipients_cache, "Secrétaire DSI", "Adjoint DSI"),
+            models.NotificationType.TICKET_EN_ATTENTE, ticket,
+            f"Ticket #{ticket.number} toujours en attente d'assignation, échéance de prise en charge à "
+            f"{ticket.sla_response_due_at:%d/%m/%Y %H:%M} (UTC): {ticket.title}",
+        )
+    elif event_bit == SLA_RESPONSE_BREACH:
+        _notify(
+            db, _role_user_ids(db, recipients_cache, "Secrétaire DSI", "Adjoint DSI", "DSI"),
+            models.NotificationType.ESCALADE, ticket,
+            f"SLA dépassé : ticket #{ticket.number} ({ticket.priority.value}) non pris en charge dans les délais: {ticket.title}",
+        )
+    elif event_bit == SLA_RESOLUTION_WARNING:
+        recipients = [ticket.technician_id] if ticket.technician_id else _role_user_ids(
+            db, recipients_cache, "Secrétaire DSI", "Adjoint DSI"
+        )
+        _notify(
+            db, recipients, models.NotificationType.TICKET_EN_ATTENTE, ticket,
+            f"Le ticket #{ticket.number} doit être résolu avant le "
+            f"{ticket.sla_resolution_due_at:%d/%m/%Y %H:%M} (UTC): {ticket.title}",
+        )
+    elif event_bit == SLA_RESOLUTION_BREACH:
+        recipients = list(_role_user_ids(db, recipients_cache, "Adjoint DSI", "DSI"))
+        if ticket.technician_id:
+            recipients.append(ticket.technician_id)
+        _notify(
+            db, recipients, models.NotificationType.ESCALADE, ticket,
+            f"SLA dépassé : ticket #{ticket.number} ({ticket.priority.value}) non résolu dans les délais: {ticket.title}",
+        )
+
+
+def process_due_sla() -> int:
+    """Émet les alertes SLA échues ; renvoie le nombre de tickets traités"""
+    db: Session = SessionLocal()
+    processed = 0
+    recipients_cache: Dict[str, List[int]] = {}
+    try:
+        while True:
+            now = datetime.utcnow()
+            tickets = (
+                db.query(models.Ticket)
+                .filter(models.Ticket.sla_next_check_at <= now)
+                .order_by(models.Ticket.sla_next_check_at)
+                .limit(SLA_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            if not tickets:
+                break
+            for ticket in tickets:
+                # Plusieurs échéances peuvent être passées (ex : processus arrêté) : seule la plus grave
+                # de chaque étape est notifiée, les alertes antérieures sont marquées comme émises
+                due_events = sorted(bit for due, bit in pending_sla_events(ticket) if due <= now)
+                fired = 0
+                for bit in due_events:
+                    fired |= bit
+                if fired & SLA_RESPONSE_BREACH:
+                    _fire_event(db, ticket, SLA_RESPONSE_BREACH, recipients_cache)
+                elif fired & SLA_RESPONSE_WARNING:
+                    _fire_event(db, ticket, SLA_RESPONSE_WARNING, recipients_cache)
+                if fired & SLA_RESOLUTION_BREACH:
+                    _fire_event(db, ticket, SLA_RESOLUTION_BREACH, recipients_cache)
+                elif fired & SLA_RESOLUTION_WARNING:
+                    _fire_event(db, ticket, SLA_RESOLUTION_WARNING, recipients_cache)
+                if fired & SLA_RESPONSE_BREACH:
+                    fired |= SLA_RESPONSE_WARNING
+                if fired & SLA_RESOLUTION_BREACH:
+                    fired |= SLA_RESOLUTION_WARNING
+                ticket.sla_notified = (ticket.sla_notified or 0) | fired
+                ticket.sla_next_check_at = next_sla_check(ticket)
+            db.commit()
+            processed += len(tickets)
+            if len(tickets) < SLA_BATCH_SIZE:
+                break
+        if processed:
+            print(f"[SLA] {processed} ticket(s) traités")
+    except Exception as e:
+        print(f"[SLA] Erreur lors du traitement des échéances: {e}")
+        db.rollback()
+    finally:
+        db.close()
+    return processed
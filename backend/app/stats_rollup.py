@@ -0,0 +1,253 @@
+"""
+Agrégats journaliers des tickets (table ticket_daily_stats)
+
+Les compteurs sont mis à jour de façon incrémentale dans la même transaction que les écritures
+de tickets : un listener after_flush sur SessionLocal observe
+- les nouveaux tickets (created),
+- les nouvelles entrées d'historique qui changent de statut (assigned, resolved, closed, rejected, reopened),
+- les modifications de feedback_score (feedback).
+Aucun endpoint n'a donc à appeler explicitement ce module pour que les agrégats restent à jour.
+
+rebuild_daily_stats() recalcule les agrégats depuis tickets et ticket_history (script rebuild_ticket_daily_stats.py).
+"""
+from collections import Counter, defaultdict
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event, func, inspect, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+
+COUNTER_COLUMNS = [
+    "created_count",
+    "assigned_count",
+    "resolved_count",
+    "closed_count",
+    "rejected_count",
+    "reopened_count",
+    "resolution_seconds_sum",
+    "feedback_count",
+    "feedback_score_sum",
+]
+
+# Dimensions disponibles pour les regroupements (clé API -> colonne)
+GROUP_BY_COLUMNS = {
+    "day": "day",
+    "agency": "agency",
+    "type": "type",
+    "priority": "priority",
+    "category": "category",
+    "technician": "technician_id",
+}
+
+CLOSED_STATUSES = (models.TicketStatus.CLOTURE, models.TicketStatus.REJETE)
+OPEN_STATUSES = (
+    models.TicketStatus.EN_ATTENTE_ANALYSE,
+    models.TicketStatus.ASSIGNE_TECHNICIEN,
+    models.TicketStatus.EN_COURS,
+)
+
+RollupKey = Tuple[date, str, models.TicketType, models.TicketPriority, str, int]
+
+
+def _rollup_key(ticket: models.Ticket, day: date, technician_id: Optional[int]) -> RollupKey:
+    return (
+        day,
+        ticket.user_agency or "",
+        models.TicketType(ticket.type),
+        models.TicketPriority(ticket.priority),
+        ticket.category or "",
+        technician_id or 0,
+    )
+
+
+def transition_counters(old_status, new_status) -> Counter:
+    """Compteurs incrémentés par une transition de statut (même règle que rebuild_daily_stats)"""
+    counters = Counter()
+    if new_status == models.TicketStatus.ASSIGNE_TECHNICIEN:
+        counters["assigned_count"] += 1
+    elif new_status == models.TicketStatus.RESOLU:
+        counters["resolved_count"] += 1
+    elif new_status == models.TicketStatus.CLOTURE:
+        counters["closed_count"] += 1
+    elif new_status == models.TicketStatus.REJETE:
+        counters["rejected_count"] += 1
+    if old_status in CLOSED_STATUSES and new_status in OPEN_STATUSES:
+        counters["reopened_count"] += 1
+    return counters
+
+
+def apply_deltas(connection, deltas: Dict[RollupKey, Counter]) -> None:
+    """Ajoute les deltas aux lignes d'agrégats (INSERT ... ON CONFLICT DO UPDATE, une seule requête)"""
+    if not deltas:
+        return
+    table = models.TicketDailyStat.__table__
+    rows = []
+    for (day, agency, ticket_type, priority, category, technician_id), counters in deltas.items():
+        row = {
+            "day": day,
+            "agency": agency,
+            "type": ticket_type,
+            "priority": priority,
+            "category": category,
+            "technician_id": technician_id,
+        }
+        row.update({column: counters.get(column, 0) for column in COUNTER_COLUMNS})
+        rows.append(row)
+    stmt = pg_insert(table).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_ticket_daily_stats_key",
+        set_={column: table.c[column] + stmt.excluded[column] for column in COUNTER_COLUMNS},
+    )
+    connection.execute(stmt)
+
+
+def _rollup_after_flush(session: Session, flush_context) -> None:
+    deltas: Dict[RollupKey, Counter] = defaultdict(Counter)
+
+    for obj in session.new:
+        if isinstance(obj, models.Ticket):
+            created_at = obj.created_at or datetime.utcnow()
+            deltas[_rollup_key(obj, created_at.date(), None)]["created_count"] += 1
+        elif isinstance(obj, models.TicketHistory) and obj.old_status != obj.new_status:
+            counters = transition_counters(obj.old_status, obj.new_status)
+            if not counters:
+                continue
+            ticket = session.get(models.Ticket, obj.ticket_id)
+            if ticket is None:
+                continue
+            changed_at = obj.changed_at or datetime.utcnow()
+            if counters["resolved_count"] and ticket.created_at:
+                counters["resolution_seconds_sum"] += max(int((changed_at - ticket.created_at).total_seconds()), 0)
+            deltas[_rollup_key(ticket, changed_at.date(), ticket.technician_id)].update(counters)
+
+    for obj in session.dirty:
+        if not isinstance(obj, models.Ticket):
+            continue
+        feedback = inspect(obj).attrs.feedback_score.history
+        if not feedback.has_changes():
+            continue
+        new_score = feedback.added[0] if feedback.added else None
+        old_score = feedback.deleted[0] if feedback.deleted else None
+        # Même jour de rattachement que rebuild_daily_stats : COALESCE(closed_at, created_at)
+        day = (obj.closed_at or obj.created_at or datetime.utcnow()).date()
+        counters = deltas[_rollup_key(obj, day, obj.technician_id)]
+        counters["feedback_count"] += (new_score is not None) - (old_score is not None)
+        counters["feedback_score_sum"] += (new_score or 0) - (old_score or 0)
+
+    apply_deltas(session.connection(), deltas)
+
+
+def register_rollup_listener() -> None:
+    """Active la mise à jour incrémentale des agrégats pour toutes les sessions SessionLocal"""
+    if not event.contains(SessionLocal, "after_flush", _rollup_after_flush):
+        event.listen(SessionLocal, "after_flush", _rollup_after_flush)
+
+
+def rebuild_daily_stats(db: Session, start: Optional[date] = None) -> int:
+    """
+    Recalcule les agrégats depuis tickets et ticket_history (tous, ou à partir du jour start).
+    Les événements historiques sont rattachés aux dimensions actuelles du ticket (agence, priorité,
+    technicien...), l'historique ne conservant pas leur valeur au moment de la transition.
+    Retourne le nombre de lignes d'agrégats écrites.
+    """
+    s = models.TicketStatus
+    day_filter = "AND {column} >= :start" if start else ""
+    params = {"start": start} if start else {}
+
+    if start:
+        db.execute(text("DELETE FROM ticket_daily_stats WHERE day >= :start"), params)
+    else:
+        db.execute(text("DELETE FROM ticket_daily_stats"))
+
+    result = db.execute(text(f"""
+        INSERT INTO ticket_daily_stats (
+            day, agency, type, priority, category, technician_id,
+            created_count, assigned_count, resolved_count, closed_count, rejected_count, reopened_count,
+            resolution_seconds_sum, feedback_count, feedback_score_sum
+        )
+        SELECT day, agency, type, priority, category, technician_id,
+               SUM(created), SUM(assigned), SUM(resolved), SUM(closed), SUM(rejected), SUM(reopened),
+               SUM(resolution_seconds), SUM(feedback_count), SUM(feedback_score)
+        FROM (
+            SELECT t.created_at::date AS day, COALESCE(t.user_agency, '') AS agency, t.type, t.priority,
+                   COALESCE(t.category, '') AS category, 0 AS technician_id,
+                   1 AS created, 0 AS assigned, 0 AS resolved, 0 AS closed, 0 AS rejected, 0 AS reopened,
+                   0::bigint AS resolution_seconds, 0 AS feedback_count, 0 AS feedback_score
+            FROM tickets t
+            WHERE t.created_at IS NOT NULL {day_filter.format(column="t.created_at")}
+
+            UNION ALL
+
+            SELECT h.changed_at::date, COALESCE(t.user_agency, ''), t.type, t.priority,
+                   COALESCE(t.category, ''), COALESCE(t.technician_id, 0),
+                   0,
+                   (h.new_status = '{s.ASSIGNE_TECHNICIEN.name}')::int,
+                   (h.new_status = '{s.RESOLU.name}')::int,
+                   (h.new_status = '{s.CLOTURE.name}')::int,
+                   (h.new_status = '{s.REJETE.name}')::int,
+                   (h.old_status IN ('{s.CLOTURE.name}', '{s.REJETE.name}')
+                    AND h.new_status IN ('{s.EN_ATTENTE_ANALYSE.name}', '{s.ASSIGNE_TECHNICIEN.name}', '{s.EN_COURS.name}'))::int,
+                   CASE WHEN h.new_status = '{s.RESOLU.name}' AND t.created_at IS NOT NULL
+                        THEN GREATEST(EXTRACT(EPOCH FROM h.changed_at - t.created_at), 0)::bigint
+                        ELSE 0 END,
+                   0, 0
+            FROM ticket_history h
+            JOIN tickets t ON t.id = h.ticket_id
+            WHERE h.old_status IS DISTINCT FROM h.new_status
+              AND h.changed_at IS NOT NULL {day_filter.format(column="h.changed_at")}
+
+            UNION ALL
+
+            SELECT COALESCE(t.closed_at, t.created_at)::date, COALESCE(t.user_agency, ''), t.type, t.priority,
+                   COALESCE(t.category, ''), COALESCE(t.technician_id, 0),
+                   0, 0, 0, 0, 0, 0, 0, 1, t.feedback_score
+            FROM tickets t
+            WHERE t.feedback_score IS NOT NULL {day_filter.format(column="COALESCE(t.closed_at, t.created_at)")}
+        ) events
+        GROUP BY day, agency, type, priority, category, technician_id
+        HAVING SUM(created + assigned + resolved + closed + rejected + reopened + feedback_count) > 0
+    """), params)
+    db.commit()
+    return result.rowcount
+
+
+def aggregate_daily_stats(
+    db: Session,
+    start: date,
+    end: date,
+    group_by: List[str],
+    **filters,
+) -> List[dict]:
+    """
+    Somme les agrégats entre start et end (inclus), regroupés par les dimensions demandées
+    (clés de GROUP_BY_COLUMNS). Les filtres acceptent agency, type, priority, category, technician_id.
+    """
+    table = models.TicketDailyStat.__table__
+    group_columns = [table.c[GROUP_BY_COLUMNS[key]] for key in group_by]
+    query = db.query(
+        *group_columns,
+        *[func.sum(table.c[column]).label(column) for column in COUNTER_COLUMNS],
+    ).filter(table.c.day >= start, table.c.day <= end)
+    for column, value in filters.items():
+        if value is not None:
+            query = query.filter(table.c[column] == value)
+    if group_columns:
+        query = query.group_by(*group_columns).order_by(*group_columns)
+
+    result = []
+    for row in query.all():
+        item = dict(row._mapping)
+        resolved = item["resolved_count"] or 0
+        feedbacks = item["feedback_count"] or 0
+        item["avg_resolution_hours"] = (
+            round(item["resolution_seconds_sum"] / resolved / 3600, 1) if resolved else None
+        )
+        item["avg_feedback_score"] = (
+            round(item["feedback_score_sum"] / feedbacks, 2) if feedbacks else None
+        )
+        result.append(item)
+    return result
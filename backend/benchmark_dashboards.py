@@ -0,0 +1,356 @@
+"""
+Test de charge : trafic des tableaux de bord (DSI, secrétaire, technicien, utilisateur)
+
+Rejoue, contre un serveur démarré, les appels des pages du frontend avec des utilisateurs virtuels
+(un thread chacun, comptes lt_* créés par seed_load_test.py) :
+- DSIDashboard.tsx : /tickets/, /users/technicians puis les stats de chaque technicien (en parallèle,
+  6 connexions comme un navigateur), l'historique de chaque ticket délégué (séquentiel), notifications ;
+  toutes les 30 s : /tickets/ et notifications ; ouverture d'un ticket : /tickets/{id}/full
+- SecretaryDashboard.tsx : /tickets/, /users/technicians, notifications ; toutes les 30 s : /tickets/ et
+  notifications ; ouverture d'un ticket : /tickets/{id} puis son historique
+- TechnicianDashboard.tsx : /tickets/assigned, historique de chaque ticket rejeté, notifications ; toutes
+  les 30 s : notifications ; ouverture d'un ticket : ticket et historique (le tableau de bord ne lit pas
+  les commentaires, il n'en publie que)
+- UserDashboard.tsx : /tickets/me, types et catégories, historique de chaque ticket en cours,
+  notifications ; toutes les 30 s : notifications ; ouverture d'un ticket : ticket et historique
+
+Les utilisateurs virtuels démarrent à des instants répartis sur le premier intervalle de rafraîchissement.
+Rapporte, par endpoint (gabarit de route), le nombre de requêtes, les erreurs, le débit et les latences
+p50 / p95 / p99 (corps de réponse téléchargé, sans le décodage JSON côté client).
+
+Baselines : --save-baseline NOM enregistre les résultats dans benchmark_baselines/dashboards-NOM.json ;
+--compare NOM échoue (code de sortie 1) si le p95 d'un endpoint dépasse celui de la baseline de plus de
+--tolerance (et de plus de 5 ms), ou si son taux d'erreur augmente. Comparer des mesures prises sur la
+même machine et le même jeu de données.
+
+Nécessite requests et un accès à la base (identifiants des tickets ouverts par les utilisateurs virtuels).
+
+Usage :
+    python seed_load_test.py
+    python benchmark_dashboards.py --duration 300 --save-baseline avant
+    python benchmark_dashboards.py --duration 300 --compare avant
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from sqlalchemy import text
+
+from app.database import SessionLocal
+from seed_load_test import LOAD_TEST_PASSWORD, login_pattern
+
+BASE_URL = os.getenv("LOAD_TEST_BASE_URL", "http://localhost:8000")
+BASELINES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baselines")
+BROWSER_CONNECTIONS = 6  # Connexions simultanées par hôte d'un navigateur (HTTP/1.1)
+MIN_REGRESSION_MS = 5.0
+
+
+class Recorder:
+    """Latences et erreurs par endpoint, partagées par tous les utilisateurs virtuels"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.last_errors: Dict[str, str] = {}
+
+    def record(self, label: str, elapsed: float, error: Optional[str] = None) -> None:
+        with self._lock:
+            if error is None:
+                self.latencies[label].append(elapsed)
+            else:
+                self.errors[label] += 1
+                self.last_errors[label] = error
+
+    def summary(self, elapsed: float) -> Dict[str, dict]:
+        results = {}
+        for label in sorted(set(self.latencies) | set(self.errors)):
+            latencies = sorted(self.latencies.get(label, []))
+            count = len(latencies) + self.errors.get(label, 0)
+            results[label] = {
+                "count": count,
+                "errors": self.errors.get(label, 0),
+                "throughput": round(count / elapsed, 3),
+                "p50_ms": _percentile_ms(latencies, 50),
+                "p95_ms": _percentile_ms(latencies, 95),
+                "p99_ms": _percentile_ms(latencies, 99),
+            }
+        return results
+
+
+def _percentile_ms(latencies: List[float], percentile: int) -> Optional[float]:
+    if not latencies:
+        return None
+    if len(latencies) == 1:
+        return round(latencies[0] * 1000, 2)
+    return round(statistics.quantiles(latencies, n=100, method="inclusive")[percentile - 1] * 1000, 2)
+
+
+class VirtualUser(threading.Thread):
+    """Un onglet de tableau de bord ouvert : chargement initial, rafraîchissement périodique, consultations"""
+
+    def __init__(self, role: str, username: str, fixtures: dict, recorder: Recorder, stop: threading.Event, args):
+        super().__init__(name=f"vu-{username}", daemon=True)
+        self.role = role
+        self.username = username
+        self.fixtures = fixtures
+        self.recorder = recorder
+        self.stop_event = stop
+        self.args = args
+        self.random = random.Random(username)
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=BROWSER_CONNECTIONS))
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=BROWSER_CONNECTIONS))
+
+    def request(self, method: str, label: str, path: str, **kwargs) -> Optional[requests.Response]:
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, f"{BASE_URL}{path}", timeout=self.args.timeout, **kwargs)
+        except requests.RequestException as e:
+            self.recorder.record(f"{method} {label}", time.perf_counter() - start, type(e).__name__)
+            return None
+        elapsed = time.perf_counter() - start
+        error = None if response.ok else f"statut {response.status_code}"
+        self.recorder.record(f"{method} {label}", elapsed, error)
+        return response if response.ok else None
+
+    def get(self, label: str, path: Optional[str] = None, **kwargs) -> Optional[requests.Response]:
+        return self.request("GET", label, path or label, **kwargs)
+
+    def get_many(self, label: str, paths: List[str]) -> None:
+        """Appels lancés ensemble par la page (Promise.all, forEach async) : 6 connexions au plus"""
+        if not paths:
+            return
+        with ThreadPoolExecutor(max_workers=BROWSER_CONNECTIONS) as pool:
+            list(pool.map(lambda path: self.get(label, path), paths))
+
+    def json(self, response: Optional[requests.Response], default):
+        return response.json() if response is not None else default
+
+    # Scénarios
+
+    def load_notifications(self) -> None:
+        self.get("/notifications/")
+        self.get("/notifications/unread/count")
+
+    def initial_load(self) -> None:
+        if self.role == "dsi":
+            self.get("/auth/me")
+            self.get("/tickets/")
+            technicians = self.json(self.get("/users/technicians"), [])
+            self.get_many("/users/technicians/{technician_id}/stats",
+                          [f"/users/technicians/{t['id']}/stats" for t in technicians])
+            # Vérification, ticket par ticket, des délégations faites par le DSI connecté (boucle séquentielle)
+            for ticket_id in self.fixtures["delegated"][:self.args.max_history_fetches]:
+                if self.stop_event.is_set():
+                    return
+                self.get("/tickets/{ticket_id}/history", f"/tickets/{ticket_id}/history")
+        elif self.role == "secretary":
+            self.get("/tickets/")
+            self.get("/users/technicians")
+            self.get("/auth/me")
+        elif self.role == "technician":
+            tickets = self.json(self.get("/tickets/assigned"), [])
+            self.get("/auth/me")
+            self.fixtures["own"] = [t["id"] for t in tickets[:200]]
+            rejected = [t["id"] for t in tickets if t["status"] == "rejete"][:self.args.max_history_fetches]
+            self.get_many("/tickets/{ticket_id}/history", [f"/tickets/{i}/history" for i in rejected])
+        else:
+            tickets = self.json(self.get("/tickets/me"), [])
+            self.get("/ticket-config/types")
+            self.get("/ticket-config/categories")
+            self.get("/auth/me")
+            self.fixtures["own"] = [t["id"] for t in tickets[:200]]
+            in_progress = [t["id"] for t in tickets if t["status"] == "en_cours"][:self.args.max_history_fetches]
+            self.get_many("/tickets/{ticket_id}/history", [f"/tickets/{i}/history" for i in in_progress])
+        self.load_notifications()
+
+    def poll(self) -> None:
+        if self.role in ("dsi", "secretary"):
+            self.get("/tickets/")
+        self.load_notifications()
+
+    def open_ticket(self) -> None:
+        tickets = self.fixtures["own"] if self.role in ("technician", "user") else self.fixtures["recent"]
+        if not tickets:
+            return
+        ticket_id = self.random.choice(tickets)
+        if self.role == "dsi":
+            self.get("/tickets/{ticket_id}/full", f"/tickets/{ticket_id}/full", params={"comments_limit": 200})
+            return
+        self.get("/tickets/{ticket_id}", f"/tickets/{ticket_id}")
+        self.get("/tickets/{ticket_id}/history", f"/tickets/{ticket_id}/history")
+
+    def run(self) -> None:
+        if self.stop_event.wait(self.random.uniform(0, self.args.poll_seconds)):
+            return
+        response = self.request("POST", "/auth/token", "/auth/token",
+                                data={"username": self.username, "password": LOAD_TEST_PASSWORD})
+        if response is None:
+            return
+        self.session.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+        self.initial_load()
+        while not self.stop_event.wait(self.args.poll_seconds):
+            self.poll()
+            if self.random.random() < self.args.open_rate:
+                self.open_ticket()
+
+
+ROLE_ACCOUNTS = {"dsi": "dsi", "secretary": "secretary", "technician": "tech", "user": "user"}
+
+
+def load_fixtures(max_history_fetches: int) -> dict:
+    """Comptes de charge par rôle et tickets consultés par l'équipe DSI"""
+    db = SessionLocal()
+    try:
+        accounts = {
+            role: db.execute(
+                text("SELECT username FROM users WHERE username LIKE :p AND actif ORDER BY id"),
+                {"p": login_pattern(prefix)},
+            ).scalars().all()
+            for role, prefix in ROLE_ACCOUNTS.items()
+        }
+        recent = db.execute(text("SELECT id FROM tickets ORDER BY created_at DESC LIMIT 500")).scalars().all()
+        # Ordre de la liste /tickets/ (plus récents d'abord), filtrée sur les tickets délégués
+        delegated = db.execute(text(
+            "SELECT id FROM tickets WHERE secretary_id IS NOT NULL ORDER BY created_at DESC LIMIT :n"
+        ), {"n": max_history_fetches}).scalars().all()
+        dataset = {
+            table: db.execute(text(f"SELECT reltuples::bigint FROM pg_class WHERE relname = '{table}'")).scalar()
+            for table in ("users", "tickets", "ticket_history", "notifications")
+        }
+        return {"accounts": accounts, "recent": recent, "delegated": delegated, "dataset": dataset}
+    finally:
+        db.close()
+
+
+def print_results(results: Dict[str, dict], elapsed: float) -> None:
+    print(f"\n{'endpoint':<52} {'requêtes':>8} {'erreurs':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    fmt = lambda value: f"{value:9.1f}" if value is not None else f"{'-':>9}"
+    for label, row in sorted(results.items(), key=lambda item: -item[1]["count"]):
+        print(f"{label:<52} {row['count']:>8} {row['errors']:>7} {row['throughput']:>8.2f} "
+              f"{fmt(row['p50_ms'])} {fmt(row['p95_ms'])} {fmt(row['p99_ms'])}")
+    total = sum(row["count"] for row in results.values())
+    errors = sum(row["errors"] for row in results.values())
+    print(f"{'total':<52} {total:>8} {errors:>7} {total / elapsed:>8.2f}")
+
+
+def compare(results: Dict[str, dict], baseline: dict, tolerance: float) -> List[str]:
+    regressions = []
+    for label, old in baseline["endpoints"].items():
+        new = results.get(label)
+        if new is None:
+            print(f"[INFO] {label} : absent de cette exécution")
+            continue
+        if old["p95_ms"] is not None and new["p95_ms"] is not None:
+            change = new["p95_ms"] / old["p95_ms"] - 1 if old["p95_ms"] else 0.0
+            line = f"{label} : p95 {old['p95_ms']:.1f} -> {new['p95_ms']:.1f} ms ({change:+.0%})"
+            if change > tolerance and new["p95_ms"] - old["p95_ms"] > MIN_REGRESSION_MS:
+                regressions.append(line)
+            else:
+                print(f"  {line}")
+        old_rate = old["errors"] / old["count"] if old["count"] else 0.0
+        new_rate = new["errors"] / new["count"] if new["count"] else 0.0
+        if new_rate > old_rate:
+            regressions.append(f"{label} : taux d'erreur {old_rate:.1%} -> {new_rate:.1%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge des tableaux de bord")
+    parser.add_argument("--dsi", type=int, default=2, help="utilisateurs virtuels DSI")
+    parser.add_argument("--secretaries", type=int, default=5, help="utilisateurs virtuels secrétaires DSI")
+    parser.add_argument("--technicians", type=int, default=40, help="utilisateurs virtuels techniciens")
+    parser.add_argument("--users", type=int, default=200, help="utilisateurs virtuels utilisateurs")
+    parser.add_argument("--duration", type=float, default=300, help="durée de la mesure (s)")
+    parser.add_argument("--poll-seconds", type=float, default=30, help="intervalle de rafraîchissement des pages (s)")
+    parser.add_argument("--open-rate", type=float, default=0.5, help="probabilité d'ouvrir un ticket par rafraîchissement")
+    parser.add_argument("--max-history-fetches", type=int, default=100,
+                        help="plafond des historiques chargés ticket par ticket au chargement d'une page")
+    parser.add_argument("--timeout", type=float, default=120, help="délai maximal d'une requête (s)")
+    parser.add_argument("--save-baseline", metavar="NOM", help="enregistrer les résultats comme baseline")
+    parser.add_argument("--compare", metavar="NOM", help="comparer à une baseline enregistrée")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="hausse du p95 tolérée face à la baseline")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(os.path.join(BASELINES_DIR, f"dashboards-{args.compare}.json"), encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    fixtures = load_fixtures(args.max_history_fetches)
+    counts = {"dsi": args.dsi, "secretary": args.secretaries, "technician": args.technicians, "user": args.users}
+    missing = [role for role, count in counts.items() if count and not fixtures["accounts"][role]]
+    if missing:
+        print(f"ERREUR: aucun compte de charge pour {', '.join(missing)} (lancer seed_load_test.py)")
+        sys.exit(1)
+
+    recorder = Recorder()
+    stop = threading.Event()
+    virtual_users = [
+        VirtualUser(role, fixtures["accounts"][role][i % len(fixtures["accounts"][role])],
+                    {"recent": fixtures["recent"], "delegated": fixtures["delegated"], "own": []},
+                    recorder, stop, args)
+        for role, count in counts.items()
+        for i in range(count)
+    ]
+    print(f"{len(virtual_users)} utilisateurs virtuels ({', '.join(f'{c} {r}' for r, c in counts.items())}) "
+          f"contre {BASE_URL} pendant {args.duration:.0f} s, rafraîchissement toutes les {args.poll_seconds:.0f} s")
+    print(f"Jeu de données (estimation) : {fixtures['dataset']}")
+
+    start = time.perf_counter()
+    for virtual_user in virtual_users:
+        virtual_user.start()
+    try:
+        stop.wait(args.duration)
+    except KeyboardInterrupt:
+        print("Interrompu : résultats partiels")
+    stop.set()
+    # Les requêtes en cours sont terminées (et comptées) avant le calcul des résultats
+    for virtual_user in virtual_users:
+        virtual_user.join(args.timeout)
+    elapsed = time.perf_counter() - start
+
+    results = recorder.summary(elapsed)
+    print_results(results, elapsed)
+    for label, error in sorted(recorder.last_errors.items()):
+        print(f"[ERREUR] {label} : {recorder.errors[label]} erreur(s), dernière : {error}")
+
+    if args.save_baseline:
+        os.makedirs(BASELINES_DIR, exist_ok=True)
+        path = os.path.join(BASELINES_DIR, f"dashboards-{args.save_baseline}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "name": args.save_baseline,
+                "created_at": datetime.utcnow().isoformat(),
+                "base_url": BASE_URL,
+                "elapsed_seconds": round(elapsed, 1),
+                "parameters": {k: v for k, v in vars(args).items() if k not in ("save_baseline", "compare")},
+                "dataset": fixtures["dataset"],
+                "endpoints": results,
+            }, f, indent=2, ensure_ascii=False)
+        print(f"OK - Baseline enregistrée : {path}")
+
+    if baseline is not None:
+        print(f"\nComparaison à la baseline {baseline['name']} ({baseline['created_at']}, tolérance p95 {args.tolerance:.0%}) :")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            for regression in regressions:
+                print(f"[REGRESSION] {regression}")
+            sys.exit(1)
+        print("[OK] Aucune régression face à la baseline")
+
+
+if __name__ == "__main__":
+    main()
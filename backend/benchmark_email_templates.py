@@ -0,0 +1,70 @@
+"""
+Benchmark du rendu des emails (app/email_templates.py), sans SMTP ni base de données
+
+Mesure la compilation des gabarits, le débit de rendu de chaque gabarit d'événement, puis compare
+pour un nouveau ticket notifié à N destinataires (Secrétaires, Adjoints, DSI, Admin) le rendu
+individuel et le pré-rendu par rôle (render_for_recipients).
+
+Usage :
+    python benchmark_email_templates.py [nb_rendus] [nb_destinataires]
+"""
+import sys
+import time
+
+from app.email_service import email_service
+from app.email_templates import EmailTemplateEngine, email_templates
+
+TICKET = {"ticket_id": "4242", "ticket_number": 4242, "ticket_title": "Imprimante du 2e étage hors service"}
+EVENTS = {
+    "ticket_created": {"creator_name": "Awa Diallo"},
+    "ticket_created_actions": {"creator_name": "Awa Diallo"},
+    "ticket_assigned": {"recipient_name": "Moussa Ba", "priority": "haute", "notes": "Voir avec l'utilisateur"},
+    "ticket_resolved": {"recipient_name": "Awa Diallo", "resolution_summary": "Toner remplacé"},
+    "validation_reminder": {"recipient_name": "Awa Diallo", "reminder_number": 2, "days_since_resolution": 7},
+    "comment_added": {"recipient_name": "Awa Diallo", "commenter_name": "Moussa Ba", "comment_content": "Pièce commandée"},
+    "technician_changed": {"recipient_name": "Awa Diallo", "old_technician_name": "Moussa Ba", "new_technician_name": "Fatou Sarr"},
+}
+ROLES = ["Secrétaire DSI", "Adjoint DSI", "DSI", "Admin"]
+
+
+def timed(fn, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        fn()
+    return time.perf_counter() - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    recipient_count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    start = time.perf_counter()
+    template_count = EmailTemplateEngine().compile_all()
+    print(f"Compilation de {template_count} gabarits : {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    email_templates.compile_all()
+    print(f"\nRendu ({count} par gabarit, objet + texte + HTML) :")
+    for name, extra in EVENTS.items():
+        elapsed = timed(lambda: email_service.render(name, role="Admin", **TICKET, **extra), count)
+        print(f"  {name:<26} {elapsed / count * 1e6:8.1f} µs/rendu  ({count / elapsed:,.0f} rendus/s)")
+
+    recipients = [(f"user{i}@entreprise.com", ROLES[i % len(ROLES)]) for i in range(recipient_count)]
+    context = email_service._template_context(creator_name="Awa Diallo", **TICKET)
+    rounds = max(1, count // recipient_count)
+
+    per_recipient = timed(
+        lambda: [email_service.render("ticket_created_actions", role=role, creator_name="Awa Diallo", **TICKET)
+                 for _, role in recipients],
+        rounds,
+    ) / rounds
+    grouped = timed(
+        lambda: email_templates.render_for_recipients("ticket_created_actions", context, recipients),
+        rounds,
+    ) / rounds
+    print(f"\nNouveau ticket notifié à {recipient_count} destinataires ({len(ROLES)} rôles) :")
+    print(f"  rendu par destinataire : {per_recipient * 1000:8.2f} ms")
+    print(f"  pré-rendu par rôle     : {grouped * 1000:8.2f} ms  (x{per_recipient / grouped:.0f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Benchmark des transports SMTP : smtplib sur threadpool vs transport asyncio (app/email_transport.py)
+
+Démarre un serveur aiosmtpd local qui simule la latence d'un relais (délai avant la réponse au DATA),
+puis envoie N messages :
+- smtplib : un worker par envoi sur un ThreadPoolExecutor de 40 threads (taille du threadpool
+  d'arrière-plan de Starlette), comme les BackgroundTasks actuelles
+- async : AsyncSmtpTransport, concurrence bornée par EMAIL_MAX_CONCURRENCY_PER_HOST, un seul thread
+
+Rapporte le débit (messages / s) et le nombre maximal de threads actifs pendant l'envoi.
+Nécessite aiosmtpd (pip install aiosmtpd), non requis en production.
+
+Usage :
+    python benchmark_email_transport.py [nb_messages] [latence_relais_ms] [concurrence_async]
+"""
+import asyncio
+import smtplib
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from aiosmtpd.controller import Controller
+
+from app.email_service import email_service
+from app.email_transport import AsyncSmtpTransport, SmtpSettings
+
+HOST = "127.0.0.1"
+PORT = 8025
+THREADPOOL_SIZE = 40
+
+
+class SlowRelay:
+    """Relais SMTP qui accepte tout après un délai (latence réseau / antispam du relais)"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.latency)
+        self.received += 1
+        return "250 Message accepted for delivery"
+
+
+class ThreadSampler:
+    """Relève le nombre maximal de threads actifs pendant une mesure"""
+
+    def __init__(self):
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, threading.active_count())
+            time.sleep(0.005)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def build_messages(count):
+    return [
+        email_service._build_message(
+            [f"user{i}@entreprise.com"],
+            f"Nouveau ticket #{i}",
+            "Un nouveau ticket a été créé.",
+            "<p>Un nouveau ticket a été créé.</p>",
+        )
+        for i in range(count)
+    ]
+
+
+def send_with_smtplib(message):
+    server = smtplib.SMTP(HOST, PORT, timeout=30)
+    server.send_message(message)
+    server.quit()
+
+
+def run_smtplib(messages):
+    with ThreadSampler() as sampler, ThreadPoolExecutor(max_workers=THREADPOOL_SIZE) as pool:
+        start = time.perf_counter()
+        wait([pool.submit(send_with_smtplib, message) for message in messages])
+        elapsed = time.perf_counter() - start
+    return elapsed, sampler.peak
+
+
+def run_async(messages, concurrency):
+    transport = AsyncSmtpTransport(max_concurrency_per_host=concurrency)
+    settings = SmtpSettings(
+        host=HOST, port=PORT, username="", password="", start_tls=False, implicit_tls=False, verify_ssl=False
+    )
+    with ThreadSampler() as sampler:
+        start = time.perf_counter()
+        futures = [transport.submit(settings, message, [message["To"]]) for message in messages]
+        wait(futures)
+        elapsed = time.perf_counter() - start
+    errors = sum(1 for future in futures if future.exception())
+    if errors:
+        print(f"  {errors} erreur(s) d'envoi, ex : {next(f.exception() for f in futures if f.exception())}")
+    return elapsed, sampler.peak
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 50
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+
+    relay = SlowRelay(latency_ms / 1000)
+    controller = Controller(relay, hostname=HOST, port=PORT)
+    controller.start()
+    try:
+        baseline_threads = threading.active_count()
+        print(f"{count} messages, latence du relais {latency_ms:.0f} ms, threads au repos : {baseline_threads}")
+
+        elapsed, peak = run_smtplib(build_messages(count))
+        print(f"  {f'smtplib ({THREADPOOL_SIZE} workers)':<24}: {count / elapsed:8.1f} messages/s  threads max : {peak}")
+
+        elapsed, peak = run_async(build_messages(count), concurrency)
+        print(f"  {f'async (concurrence {concurrency})':<24}: {count / elapsed:8.1f} messages/s  threads max : {peak}")
+
+        print(f"Messages reçus par le relais : {relay.received}")
+    finally:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Benchmark du surcoût des métriques (app/metrics.py), sans PostgreSQL
+
+Deux applications FastAPI identiques, l'une avec MetricsMiddleware, QueryStatsMiddleware et le comptage
+des requêtes SQL (app/query_stats.py), l'autre sans. Chaque requête exécute un endpoint synchrone représentatif (5 requêtes SQL sur SQLite en
+mémoire suivies chacune d'un aller-retour PostgreSQL simulé, sérialisation d'une liste de tickets) ou
+un endpoint vide (pire cas : le surcoût n'est rapporté à aucun travail utile). Les requêtes sont envoyées directement à l'application ASGI,
+par lots courts alternés (sans / avec) pour neutraliser la dérive de la machine ; on compare les
+médianes des lots.
+
+Objectif : moins de 2 % de latence supplémentaire sur l'endpoint représentatif.
+
+Usage :
+    python benchmark_metrics.py [nb_requetes_par_lot] [nb_lots] [aller_retour_sql_ms]
+"""
+import asyncio
+import gc
+import statistics
+import sys
+import time
+from datetime import datetime
+from typing import List
+
+from fastapi import FastAPI
+from pydantic import BaseModel
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.pool import StaticPool
+
+from app.metrics import MetricsMiddleware
+from app.query_stats import QueryStatsMiddleware, _after_cursor_execute, _before_cursor_execute
+
+OVERHEAD_TARGET = 0.02
+# Aller-retour réseau d'une requête PostgreSQL (SQLite en mémoire n'en a pas)
+ROUNDTRIP_SECONDS = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.0003
+
+engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+with engine.begin() as conn:
+    conn.execute(text("CREATE TABLE tickets (id INTEGER PRIMARY KEY, title TEXT, status TEXT, created_at TEXT)"))
+    conn.execute(
+        text("INSERT INTO tickets (title, status, created_at) VALUES (:title, :status, :created_at)"),
+        [{"title": f"Ticket {i}", "status": "en_cours", "created_at": datetime.utcnow().isoformat()} for i in range(500)],
+    )
+
+
+class TicketRow(BaseModel):
+    id: int
+    title: str
+    status: str
+    created_at: str
+
+
+def build_app(with_metrics: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/tickets/{ticket_id}/list", response_model=List[TicketRow])
+    def list_tickets(ticket_id: int):
+        with engine.connect() as conn:
+            for _ in range(4):
+                conn.execute(text("SELECT count(*) FROM tickets WHERE status = 'en_cours'")).scalar()
+                time.sleep(ROUNDTRIP_SECONDS)
+            rows = conn.execute(text("SELECT id, title, status, created_at FROM tickets LIMIT 50")).mappings().all()
+            time.sleep(ROUNDTRIP_SECONDS)
+        return [dict(row) for row in rows]
+
+    @app.get("/ping")
+    def ping():
+        return {"ok": True}
+
+    if with_metrics:
+        app.add_middleware(QueryStatsMiddleware, debug=False)
+        app.add_middleware(MetricsMiddleware)
+    return app
+
+
+async def call(app, path: str) -> None:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start" and message["status"] != 200:
+            raise RuntimeError(f"{path} : statut {message['status']}")
+
+    await app(scope, receive, send)
+
+
+async def run_series(app, path: str, count: int) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        await call(app, path)
+    return (time.perf_counter() - start) / count
+
+
+async def measure(path: str, count: int, batches: int):
+    plain, instrumented = build_app(False), build_app(True)
+    await run_series(plain, path, count * 4)  # Échauffement
+    await run_series(instrumented, path, count * 4)
+    plain_times, instrumented_times = [], []
+
+    async def run_plain():
+        gc.collect()
+        plain_times.append(await run_series(plain, path, count))
+
+    async def run_instrumented():
+        gc.collect()
+        # Comptage des requêtes SQL actif uniquement pendant les lots instrumentés
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        instrumented_times.append(await run_series(instrumented, path, count))
+        event.remove(engine, "before_cursor_execute", _before_cursor_execute)
+        event.remove(engine, "after_cursor_execute", _after_cursor_execute)
+
+    for batch in range(batches):
+        # Ordre alterné (ABBA) : aucune des deux applications ne passe toujours en premier
+        first, second = (run_plain, run_instrumented) if batch % 2 == 0 else (run_instrumented, run_plain)
+        await first()
+        await second()
+    return statistics.median(plain_times), statistics.median(instrumented_times)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    batches = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+    print(
+        f"{batches} lots alternés de {count} requêtes par application (médiane des lots), "
+        f"aller-retour SQL simulé {ROUNDTRIP_SECONDS * 1000:.2f} ms"
+    )
+    for label, path in (("endpoint représentatif", "/tickets/1/list"), ("endpoint vide", "/ping")):
+        plain, instrumented = asyncio.run(measure(path, count, batches))
+        overhead = instrumented - plain
+        print(
+            f"  {label:<22}: sans {plain * 1e6:8.1f} µs  avec {instrumented * 1e6:8.1f} µs  "
+            f"surcoût {overhead * 1e6:6.1f} µs ({overhead / plain:+.1%})"
+        )
+        if path != "/ping":
+            print(f"  objectif < {OVERHEAD_TARGET:.0%} : {'atteint' if overhead / plain < OVERHEAD_TARGET else 'NON atteint'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+"""
+Vérification des budgets de requêtes SQL par route (QUERY_BUDGETS dans app/query_stats.py)
+
+Appelle chaque route de app/routers sur un jeu de données fixe (utilisateurs de chaque rôle, techniciens
+avec historique, notifications), en parcourant le cycle de vie d'un ticket, et lit le nombre de requêtes
+SQL de chaque réponse (en-tête X-DB-Query-Count). Échoue (code de sortie 1) si :
+- une route dépasse son budget (N+1 introduit, relation chargée paresseusement, ...) ;
+- une route n'a pas de budget, ou n'est pas appelée par ce script ;
+- un appel ne renvoie pas le statut attendu.
+Une route nettement sous son budget est signalée : abaisser le budget fige l'amélioration.
+
+Même parcours que tests/test_query_budgets.py (pytest, base de test recréée à chaque exécution),
+lancé ici sur la base configurée, initialisée par init_db.py. Aucun email n'est envoyé.
+
+Usage :
+    python check_query_budgets.py            # vérification
+    python check_query_budgets.py --print    # affiche les comptes mesurés au format de QUERY_BUDGETS
+"""
+import io
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+os.environ["QUERY_STATS_DEBUG"] = "true"
+os.environ["EMAIL_ENABLED"] = "false"
+os.environ["METRICS_TOKEN"] = ""
+os.environ["METRICS_PUBLIC"] = "true"
+
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+from PIL import Image
+from sqlalchemy import func
+
+from app import models
+from app.database import SessionLocal
+from app.main import app
+from app.query_stats import QUERY_BUDGETS
+from app.security import get_password_hash
+
+PASSWORD = "budget-check-123"
+TECHNICIAN_COUNT = 6
+STATS_TICKET_COUNT = 8  # Tickets résolus/clôturés du technicien des statistiques
+NOTIFICATION_COUNT = 12
+# Écart signalé entre le budget et la mesure (le budget peut être abaissé)
+SLACK_REPORTED = 2
+
+
+# --- Jeu de données --------------------------------------------------------------------------------
+
+def get_or_create_user(db, username: str, role_name: str, full_name: str, **fields) -> models.User:
+    user = db.query(models.User).filter(models.User.username == username).first()
+    if user:
+        return user
+    role = db.query(models.Role).filter(models.Role.name == role_name).one()
+    user = models.User(
+        username=username,
+        full_name=full_name,
+        email=f"{username}@budget.local",
+        agency="Siège",
+        password_hash=get_password_hash(PASSWORD),
+        role_id=role.id,
+        actif=True,
+        **fields,
+    )
+    db.add(user)
+    db.flush()
+    return user
+
+
+def seed() -> dict:
+    """Utilisateurs de référence (créés une fois), tickets de statistiques et notifications"""
+    db = SessionLocal()
+    try:
+        users = {
+            "user": get_or_create_user(db, "qb_user", "Utilisateur", "Budget Utilisateur"),
+            "secretary": get_or_create_user(db, "qb_secretary", "Secrétaire DSI", "Budget Secrétaire"),
+            "adjoint": get_or_create_user(db, "qb_adjoint", "Adjoint DSI", "Budget Adjoint"),
+            "dsi": get_or_create_user(db, "qb_dsi", "DSI", "Budget DSI"),
+            "admin": get_or_create_user(db, "qb_admin", "Admin", "Budget Admin"),
+        }
+        technicians = [
+            get_or_create_user(db, f"qb_tech{i}", "Technicien", f"Budget Technicien {i}", specialization="materiel")
+            for i in range(TECHNICIAN_COUNT)
+        ]
+        # Le dernier technicien porte les statistiques : ses tickets ne changent pas d'une exécution à l'autre
+        stats_technician = technicians[-1]
+        if not db.query(models.Ticket).filter(models.Ticket.technician_id == stats_technician.id).count():
+            now = datetime.utcnow()
+            last_number = db.query(func.max(models.Ticket.number)).scalar() or 0
+            for i in range(STATS_TICKET_COUNT):
+                created = now - timedelta(days=10 + i)
+                closed = i % 2 == 0
+                ticket = models.Ticket(
+                    number=last_number + i + 1,
+                    title=f"Référence statistiques {i}",
+                    description="Ticket de référence pour check_query_budgets.py",
+                    type=models.TicketType.MATERIEL,
+                    priority=models.TicketPriority.MOYENNE,
+                    status=models.TicketStatus.CLOTURE if closed else models.TicketStatus.RESOLU,
+                    creator_id=users["user"].id,
+                    technician_id=stats_technician.id,
+                    created_at=created,
+                    assigned_at=created + timedelta(hours=1),
+                    resolved_at=created + timedelta(days=2),
+                    closed_at=created + timedelta(days=3) if closed else None,
+                )
+                db.add(ticket)
+                db.flush()
+                db.add(models.TicketHistory(
+                    ticket_id=ticket.id,
+                    old_status=models.TicketStatus.ASSIGNE_TECHNICIEN,
+                    new_status=models.TicketStatus.EN_COURS,
+                    user_id=stats_technician.id,
+                    changed_at=created + timedelta(hours=2),
+                ))
+        pending = (
+            db.query(models.Notification)
+            .filter(models.Notification.user_id == users["user"].id, models.Notification.read == False)
+            .count()
+        )
+        for i in range(pending, NOTIFICATION_COUNT):
+            db.add(models.Notification(
+                user_id=users["user"].id,
+                type=models.NotificationType.TICKET_CREE,
+                message=f"Notification de référence {i}",
+                read=False,
+            ))
+        db.commit()
+        return {
+            **{name: user.id for name, user in users.items()},
+            "technicians": [technician.id for technician in technicians[:-1]],
+            "stats_technician": stats_technician.id,
+        }
+    finally:
+        db.close()
+
+
+def set_ticket_state(ticket_id: int, **fields) -> None:
+    """Prépare un état que l'API n'atteint qu'avec le temps (clôture automatique, ...)"""
+    db = SessionLocal()
+    try:
+        db.query(models.Ticket).filter(models.Ticket.id == ticket_id).update(fields)
+        db.commit()
+    finally:
+        db.close()
+
+
+def png_bytes() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), (30, 120, 200)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+# --- Appels ----------------------------------------------------------------------------------------
+
+class BudgetRun:
+    def __init__(self, client: TestClient, ids: dict):
+        self.client = client
+        self.ids = ids
+        self.tokens = {}
+        self.measured = {}
+        self.errors = []
+
+    def login(self, name: str, username: str) -> None:
+        response = self.call("POST", "/auth/token", None, data={"username": username, "password": PASSWORD})
+        self.tokens[name] = response.json()["access_token"]
+
+    def call(self, method: str, route: str, as_user, expected=(200,), path=None, **kwargs):
+        url = route.format(**(path or {}))
+        headers = kwargs.pop("headers", {})
+        if as_user:
+            headers["Authorization"] = f"Bearer {self.tokens[as_user]}"
+        response = self.client.request(method, url, headers=headers, **kwargs)
+        if response.status_code not in expected:
+            self.errors.append(f"{method} {url} : statut {response.status_code} ({response.text[:200]})")
+        count = int(response.headers.get("x-db-query-count", "-1"))
+        key = (method, route)
+        self.measured[key] = max(self.measured.get(key, 0), count)
+        return response
+
+    def run(self) -> None:
+        ids = self.ids
+        tech, tech2, tech3 = ids["technicians"][:3]
+        self.login("user", "qb_user")
+        for name in ("secretary", "adjoint", "dsi", "admin"):
+            self.login(name, f"qb_{name}")
+        for i, technician_id in enumerate(ids["technicians"][:3]):
+            self.login(f"tech{i}", f"qb_tech{i}")
+
+        # Authentification et configuration
+        suffix = uuid.uuid4().hex[:8]
+        self.call("POST", "/auth/register", None, json={
+            "full_name": "Budget Inscription", "email": f"qb_reg_{suffix}@budget.local", "username": f"qb_reg_{suffix}",
+            "password": PASSWORD, "role_id": self.roles()["Utilisateur"],
+        })
+        self.call("GET", "/auth/me", "user")
+        self.call("GET", "/auth/roles", "user")
+        self.call("GET", "/ticket-config/types", "user")
+        self.call("GET", "/ticket-config/categories", "user", params={"type_code": "materiel"})
+        policies = self.call("GET", "/ticket-config/sla-policies", "secretary").json()
+        self.call("PUT", "/ticket-config/sla-policies", "dsi", json=[
+            {key: policy[key] for key in ("priority", "type", "response_minutes", "resolution_minutes")}
+            for policy in policies
+        ] or [{"priority": "moyenne", "type": None, "response_minutes": 60, "resolution_minutes": 480}])
+        self.call("GET", "/settings/email", "dsi")
+        self.call("PUT", "/settings/email", "dsi", json={"sender_name": "Système de Gestion des Tickets"})
+        self.call("POST", "/settings/email/test", "dsi", expected=(500,), params={"test_email": "qb@budget.local"})
+        self.call("GET", "/metrics", None)
+
+        # Création, modification, suppression
+        tickets = [self.create_ticket(f"Budget {suffix} #{i}") for i in range(8)]
+        main, to_delete, to_edit, rejected, bulk1, bulk2, escalated, auto_closed = tickets
+        self.call("PUT", "/tickets/{ticket_id}", "user", path={"ticket_id": to_edit}, json={"title": "Budget modifié"})
+        self.call("DELETE", "/tickets/{ticket_id}", "user", expected=(204,), path={"ticket_id": to_delete})
+
+        # Listes et recherche
+        for view in ("full", "summary"):
+            self.call("GET", "/tickets/me", "user", params={"view": view})
+            self.call("GET", "/tickets/", "secretary", params={"view": view})
+        self.call("GET", "/tickets/search", "user", params={"q": "Budget"})
+        self.call("GET", "/tickets/export", "secretary", params={"format": "csv"})
+
+        # Cycle de vie complet : assignation, prise en charge, commentaires, résolution, validation
+        self.call("PUT", "/tickets/{ticket_id}/assign", "secretary", path={"ticket_id": main},
+                  json={"technician_id": tech, "notes": "Voir avec l'utilisateur"})
+        self.call("GET", "/tickets/assigned", "tech0", params={"view": "full"})
+        self.call("PUT", "/tickets/{ticket_id}/accept-assignment", "tech0", path={"ticket_id": main})
+        self.call("PUT", "/tickets/{ticket_id}/status", "tech0", path={"ticket_id": main}, json={"status": "en_cours"})
+        comment = self.call("POST", "/tickets/{ticket_id}/comments", "tech0", path={"ticket_id": main},
+                            json={"ticket_id": main, "content": "Pièce commandée", "type": "technique"}).json()
+        image = png_bytes()
+        attachment = self.call(
+            "POST", "/tickets/{ticket_id}/attachments", "tech0", expected=(201,), path={"ticket_id": main},
+            files={"file": ("capture.png", image, "image/png")},
+        ).json()
+        comment_attachment = self.call(
+            "POST", "/tickets/{ticket_id}/comments/{comment_id}/attachments", "tech0", expected=(201,),
+            path={"ticket_id": main, "comment_id": comment["id"]}, files={"file": ("photo.png", image, "image/png")},
+        ).json()
+        paths = {"ticket_id": main, "attachment_id": attachment["id"], "variant": "thumbnail"}
+        self.call("GET", "/tickets/{ticket_id}/attachments/{attachment_id}", "user", path=paths)
+        self.call("GET", "/tickets/{ticket_id}/attachments/{attachment_id}/{variant}", "user",
+                  expected=(200, 202, 404), path=paths)
+        paths = {**paths, "comment_id": comment["id"], "attachment_id": comment_attachment["id"]}
+        self.call("GET", "/tickets/{ticket_id}/comments/{comment_id}/attachments/{attachment_id}", "user", path=paths)
+        self.call("GET", "/tickets/{ticket_id}/comments/{comment_id}/attachments/{attachment_id}/{variant}", "user",
+                  expected=(200, 202, 404), path=paths)
+        self.call("GET", "/tickets/{ticket_id}", "user", path={"ticket_id": main})
+        self.call("GET", "/tickets/{ticket_id}/full", "user", path={"ticket_id": main})
+        # Ticket sans commentaire : le total de la première page vide ne coûte pas de requête
+        self.call("GET", "/tickets/{ticket_id}/full", "user", path={"ticket_id": bulk1})
+        self.call("GET", "/tickets/{ticket_id}/comments", "user", path={"ticket_id": main})
+        self.call("GET", "/tickets/{ticket_id}/history", "user", path={"ticket_id": main})
+        self.call("PUT", "/tickets/{ticket_id}/status", "tech0", path={"ticket_id": main},
+                  json={"status": "resolu", "resolution_summary": "Toner remplacé"})
+        self.call("PUT", "/tickets/{ticket_id}/validate", "user", path={"ticket_id": main}, json={"validated": True})
+        self.call("PUT", "/tickets/{ticket_id}/feedback", "user", path={"ticket_id": main}, json={"score": 5})
+
+        # Refus d'assignation, réassignation, escalade, délégation
+        self.call("PUT", "/tickets/{ticket_id}/assign", "secretary", path={"ticket_id": rejected},
+                  json={"technician_id": tech2})
+        self.call("PUT", "/tickets/{ticket_id}/reassign", "secretary", path={"ticket_id": rejected},
+                  json={"technician_id": tech3, "reason": "Spécialité"})
+        self.call("PUT", "/tickets/{ticket_id}/reject-assignment", "tech2", path={"ticket_id": rejected},
+                  params={"reason": "Hors de mon périmètre"})
+        self.call("PUT", "/tickets/{ticket_id}/escalate", "adjoint", path={"ticket_id": escalated})
+        self.call("PUT", "/tickets/{ticket_id}/delegate-adjoint", "dsi", path={"ticket_id": escalated},
+                  json={"adjoint_id": ids["adjoint"], "reason": "Arbitrage"})
+        self.call("POST", "/tickets/assign-bulk", "secretary", json={"assignments": [
+            {"ticket_id": bulk1, "technician_id": tech2}, {"ticket_id": bulk2, "technician_id": tech3},
+        ]})
+
+        # Réouvertures : ticket rejeté (secrétariat) et ticket clôturé automatiquement (créateur)
+        set_ticket_state(rejected, status=models.TicketStatus.REJETE)
+        self.call("PUT", "/tickets/{ticket_id}/reopen", "secretary", path={"ticket_id": rejected},
+                  json={"technician_id": tech, "reason": "Nouvelle analyse"})
+        set_ticket_state(auto_closed, status=models.TicketStatus.CLOTURE, technician_id=tech,
+                         auto_closed_at=datetime.utcnow(), closed_at=datetime.utcnow())
+        self.call("PUT", "/tickets/{ticket_id}/reopen-by-user", "user", path={"ticket_id": auto_closed})
+
+        # Utilisateurs
+        self.call("GET", "/users/technicians", "secretary")
+        self.call("GET", "/users/technicians/{technician_id}/stats", "secretary",
+                  path={"technician_id": ids["stats_technician"]})
+        created = self.call("POST", "/users/", "admin", json={
+            "full_name": "Budget Création", "email": f"qb_new_{suffix}@budget.local", "username": f"qb_new_{suffix}",
+            "password": PASSWORD, "role_id": self.roles()["Utilisateur"],
+        }).json()
+        self.call("GET", "/users/", "admin")
+        self.call("GET", "/users/{user_id}", "admin", path={"user_id": created["id"]})
+        self.call("PUT", "/users/{user_id}", "admin", path={"user_id": created["id"]}, json={"phone": "0102030405"})
+        self.call("POST", "/users/{user_id}/reset-password", "admin", path={"user_id": created["id"]}, json={})
+        self.call("DELETE", "/users/{user_id}", "admin", expected=(200, 204), path={"user_id": created["id"]})
+
+        # Notifications
+        notifications = self.call("GET", "/notifications/", "user").json()
+        self.call("GET", "/notifications/unread/count", "user")
+        self.call("GET", "/notifications/preferences", "user")
+        self.call("PUT", "/notifications/preferences", "user", json={"email_digest_mode": "immediate"})
+        self.call("PUT", "/notifications/{notification_id}/read", "user",
+                  path={"notification_id": notifications[0]["id"]})
+        self.call("PUT", "/notifications/read-all", "user")
+
+        # Statistiques et rapports
+        self.call("GET", "/stats/daily", "secretary", params={"group_by": ["day", "technician"]})
+        today = datetime.utcnow().date()
+        report = self.call("POST", "/reports/", "adjoint", expected=(202,), json={
+            "report_type": "performance", "period_start": str(today - timedelta(days=30)), "period_end": str(today),
+        }).json()
+        self.call("GET", "/reports/", "adjoint")
+        self.call("GET", "/reports/{report_id}", "adjoint", path={"report_id": report["id"]})
+
+        # Profilage à la demande (administrateurs uniquement) : le profil ne change pas le nombre de requêtes
+        profiled = self.call("GET", "/users/technicians", "admin", headers={"X-Profile": "1"})
+        self.call("GET", "/auth/me", "user", expected=(403,), headers={"X-Profile": "1"})
+        self.call("GET", "/profiles/", "admin")
+        self.call("GET", "/profiles/{profile_id}", "admin", path={"profile_id": profiled.headers["x-profile-id"]},
+                  params={"format": "collapsed"})
+
+    def create_ticket(self, title: str) -> int:
+        response = self.call("POST", "/tickets/", "user", json={
+            "title": title, "description": "Imprimante du 2e étage hors service", "type": "materiel",
+            "priority": "moyenne", "category": None,
+        })
+        return response.json()["id"]
+
+    @staticmethod
+    def roles() -> dict:
+        db = SessionLocal()
+        try:
+            return {role.name: role.id for role in db.query(models.Role)}
+        finally:
+            db.close()
+
+
+def main():
+    print_only = "--print" in sys.argv
+    ids = seed()
+    with TestClient(app) as client:
+        run = BudgetRun(client, ids)
+        run.run()
+
+    routes = {
+        (method, route.path)
+        for route in app.routes if isinstance(route, APIRoute)
+        for method in route.methods
+    }
+    if print_only:
+        for key in sorted(routes):
+            print(f"    {key!r}: {run.measured.get(key, '?')},")
+        for error in run.errors:
+            print(f"[ERREUR] {error}")
+        return
+
+    failures = list(run.errors)
+    for key in sorted(routes):
+        method, path = key
+        budget = QUERY_BUDGETS.get(key)
+        count = run.measured.get(key)
+        if budget is None:
+            failures.append(f"{method} {path} : aucun budget dans QUERY_BUDGETS")
+        elif count is None:
+            failures.append(f"{method} {path} : route non appelée par check_query_budgets.py")
+        elif count > budget:
+            failures.append(f"{method} {path} : {count} requêtes SQL pour un budget de {budget}")
+        elif budget - count >= SLACK_REPORTED:
+            print(f"[INFO] {method} {path} : {count} requêtes pour un budget de {budget} (budget à abaisser)")
+    for key in sorted(set(QUERY_BUDGETS) - routes):
+        print(f"[INFO] Budget sans route : {key[0]} {key[1]}")
+
+    print(f"{len(run.measured)} routes mesurées")
+    if failures:
+        for failure in failures:
+            print(f"[ERREUR] {failure}")
+        sys.exit(1)
+    print("[OK] Toutes les routes respectent leur budget de requêtes SQL")
+
+
+if __name__ == "__main__":
+    main()
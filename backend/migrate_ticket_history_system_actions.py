@@ -0,0 +1,43 @@
+"""
+Script de migration : rend nullable la colonne user_id de ticket_history
+(actions automatiques, comme l'assignation automatique, enregistrées sans auteur)
+"""
+from sqlalchemy import text
+from app.database import engine
+
+
+def migrate_database():
+    """Supprime la contrainte NOT NULL de ticket_history.user_id"""
+    try:
+        print("Début de la migration...")
+
+        with engine.connect() as conn:
+            result = conn.execute(text("""
+                SELECT is_nullable
+                FROM information_schema.columns
+                WHERE table_name = 'ticket_history' AND column_name = 'user_id'
+            """))
+            is_nullable = result.scalar()
+
+            if is_nullable == 'NO':
+                print("Suppression de la contrainte NOT NULL sur 'ticket_history.user_id'...")
+                conn.execute(text("ALTER TABLE ticket_history ALTER COLUMN user_id DROP NOT NULL"))
+                # Assignations automatiques déjà enregistrées au nom du créateur du ticket
+                result = conn.execute(text("""
+                    UPDATE ticket_history
+                    SET user_id = NULL
+                    WHERE reason LIKE 'Assignation automatique%'
+                """))
+                conn.commit()
+                print(f"OK - Colonne 'user_id' nullable ({result.rowcount} assignation(s) automatique(s) corrigée(s))")
+            else:
+                print("OK - La colonne 'user_id' de 'ticket_history' est déjà nullable")
+
+        print("\nMigration terminée avec succès !")
+
+    except Exception as e:
+        print(f"ERREUR lors de la migration: {e}")
+
+
+if __name__ == "__main__":
+    migrate_database()
@@ -0,0 +1,37 @@
+"""
+Script de (re)construction des agrégats journaliers des tickets (table ticket_daily_stats)
+
+Usage :
+    python rebuild_ticket_daily_stats.py              # reconstruit tout l'historique
+    python rebuild_ticket_daily_stats.py 2025-01-01   # reconstruit à partir de cette date
+"""
+import sys
+from datetime import date
+
+from sqlalchemy import text
+
+from app import models
+from app.database import SessionLocal, engine
+from app.stats_rollup import rebuild_daily_stats
+
+
+def main():
+    start = date.fromisoformat(sys.argv[1]) if len(sys.argv) > 1 else None
+    db = SessionLocal()
+    try:
+        # Créer la table si elle n'existe pas encore
+        models.TicketDailyStat.__table__.create(bind=engine, checkfirst=True)
+        # La reconstruction complète peut dépasser le statement_timeout par défaut de l'application
+        db.execute(text("SET statement_timeout = 0"))
+        print(f"Reconstruction des agrégats {'depuis ' + start.isoformat() if start else 'complète'}...")
+        rows = rebuild_daily_stats(db, start)
+        print(f"OK - {rows} lignes d'agrégats écrites")
+    except Exception as e:
+        print(f"ERREUR lors de la reconstruction: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+Jeu de données de charge pour benchmark_dashboards.py
+
+Crée, directement en SQL (INSERT ... SELECT generate_series, par lots), un volume réaliste :
+- 5 000 utilisateurs : 4 700 utilisateurs, 250 techniciens, 30 secrétaires, 10 adjoints, 5 DSI, 5 admins
+  (identifiants lt_<rôle>_<n>, mot de passe LOAD_TEST_PASSWORD)
+- 1 000 000 de tickets : 70 % clôturés et 10 % résolus répartis sur 3 ans, tickets ouverts des 30 derniers jours
+- 5 000 000 de lignes d'historique (cycle de vie de chaque ticket)
+- 10 000 000 de notifications : moitié pour l'équipe DSI (nouveaux tickets), 30 % pour les techniciens,
+  20 % pour les utilisateurs ; 10 % non lues
+
+puis ANALYZE et reconstruction de ticket_daily_stats.
+
+À lancer sur une base dédiée (initialisée par init_db.py et les scripts de migration) : les identifiants de
+tickets créés doivent être contigus. Le volume complet occupe environ 3 Go et se crée en quelques minutes
+(davantage si les triggers de recherche plein texte sont installés) ; --scale réduit tous les volumes
+(--scale 0.01 : 10 000 tickets, 50 utilisateurs).
+
+Usage :
+    python seed_load_test.py [--scale 1.0]
+    python seed_load_test.py --drop            # supprime les données de charge
+"""
+import argparse
+import time
+
+from sqlalchemy import text
+
+from app import models
+from app.database import SessionLocal, engine
+from app.security import get_password_hash
+from app.stats_rollup import rebuild_daily_stats
+
+LOAD_TEST_PASSWORD = "charge-123"
+LOAD_TEST_PREFIX = "lt_"
+
+# (rôle, préfixe des identifiants, nombre pour --scale 1)
+USER_PLAN = [
+    ("Utilisateur", "user", 4700),
+    ("Technicien", "tech", 250),
+    ("Secrétaire DSI", "secretary", 30),
+    ("Adjoint DSI", "adjoint", 10),
+    ("DSI", "dsi", 5),
+    ("Admin", "admin", 5),
+]
+TICKETS = 1_000_000
+HISTORY_ROWS = 5_000_000
+NOTIFICATIONS = 10_000_000
+BATCH_SIZE = 100_000
+
+AGENCIES = ["Siège", "Agence Paris", "Agence Lyon", "Agence Marseille", "Agence Lille", "Agence Nantes",
+            "Agence Bordeaux", "Agence Toulouse", "Agence IT"]
+TITLES = ["Imprimante hors service", "Écran qui clignote", "Mot de passe expiré", "Accès VPN impossible",
+          "Application métier lente", "Boîte mail pleine", "Poste qui ne démarre plus", "Demande de logiciel",
+          "Erreur à l'ouverture du fichier", "Scanner non reconnu", "Téléphone IP sans tonalité",
+          "Lenteur réseau à l'étage"]
+LIFECYCLE = ["EN_ATTENTE_ANALYSE", "ASSIGNE_TECHNICIEN", "EN_COURS", "RESOLU", "CLOTURE"]
+
+
+def login_pattern(prefix: str = "") -> str:
+    """Motif LIKE des identifiants de charge (les _ des identifiants ne sont pas des jokers)"""
+    login = LOAD_TEST_PREFIX + (f"{prefix}_" if prefix else "")
+    return login.replace("_", "\\_") + "%"
+
+
+LOAD_TEST_USERS = f"SELECT id FROM users WHERE username LIKE '{login_pattern()}'"
+LOAD_TEST_TICKETS = f"SELECT id FROM tickets WHERE creator_id IN ({LOAD_TEST_USERS})"
+
+
+def scaled(count: int, scale: float) -> int:
+    return max(1, round(count * scale))
+
+
+def user_ids(conn, prefix: str) -> list:
+    return conn.execute(
+        text("SELECT id FROM users WHERE username LIKE :p ORDER BY id"), {"p": login_pattern(prefix)}
+    ).scalars().all()
+
+
+def seed_users(conn, scale: float) -> None:
+    password_hash = get_password_hash(LOAD_TEST_PASSWORD)  # Un seul hash bcrypt pour tous les comptes
+    roles = dict(conn.execute(text("SELECT name, id FROM roles")).all())
+    for role_name, prefix, count in USER_PLAN:
+        conn.execute(text("""
+            INSERT INTO users (full_name, email, agency, actif, specialization, max_tickets_capacity, created_at,
+                               email_digest_mode, email_digest_last_notification_id, username, password_hash, role_id)
+            SELECT :label || ' ' || g, :login || g || '@charge.local',
+                   (CAST(:agencies AS text[]))[1 + g % cardinality(CAST(:agencies AS text[]))], true,
+                   CASE WHEN :technician THEN (ARRAY['materiel', 'applicatif'])[1 + g % 2] END,
+                   CASE WHEN :technician THEN 5 END,
+                   now() - random() * interval '3 years', 'immediate', 0, :login || g, :password_hash, :role_id
+            FROM generate_series(1, :count) g
+        """), {
+            "label": f"Charge {role_name}", "login": f"{LOAD_TEST_PREFIX}{prefix}_", "agencies": AGENCIES,
+            "technician": prefix == "tech", "password_hash": password_hash, "role_id": roles[role_name],
+            "count": scaled(count, scale),
+        })
+        print(f"OK - {scaled(count, scale)} comptes {role_name} ({LOAD_TEST_PREFIX}{prefix}_1 ...)")
+
+
+def seed_tickets(conn, count: int) -> None:
+    creators = conn.execute(text(
+        "SELECT id, coalesce(agency, '') FROM users WHERE username LIKE :p ORDER BY id"
+    ), {"p": login_pattern("user")}).all()
+    categories = conn.execute(text("""
+        SELECT c.name, upper(t.code) FROM ticket_categories c JOIN ticket_types t ON t.id = c.ticket_type_id
+        WHERE c.is_active
+    """)).all()
+    params = {
+        "creators": [row[0] for row in creators], "agencies": [row[1] for row in creators],
+        "techs": user_ids(conn, "tech"), "secretaries": user_ids(conn, "secretary"),
+        "categories": [row[0] for row in categories] or ["Autre matériel"],
+        "types": [row[1] for row in categories] or ["MATERIEL"],
+        "titles": TITLES,
+        "number_offset": conn.execute(text("SELECT coalesce(max(number), 0) FROM tickets")).scalar(),
+    }
+    for start in range(1, count + 1, BATCH_SIZE):
+        started = time.perf_counter()
+        conn.execute(text("""
+            INSERT INTO tickets (number, title, description, type, priority, status, category, creator_id,
+                                 technician_id, secretary_id, user_agency, created_at, assigned_at, resolved_at,
+                                 closed_at, feedback_score, sla_notified)
+            SELECT :number_offset + g,
+                   (CAST(:titles AS text[]))[1 + g % cardinality(CAST(:titles AS text[]))] || ' #' || g,
+                   'Ticket généré pour les tests de charge',
+                   CAST((CAST(:types AS text[]))[c] AS tickettype),
+                   CAST(CASE WHEN p < 0.2 THEN 'FAIBLE' WHEN p < 0.7 THEN 'MOYENNE' WHEN p < 0.95 THEN 'HAUTE'
+                        ELSE 'CRITIQUE' END AS ticketpriority),
+                   CAST(s AS ticketstatus),
+                   (CAST(:categories AS text[]))[c],
+                   (CAST(:creators AS int[]))[u],
+                   CASE WHEN s <> 'EN_ATTENTE_ANALYSE'
+                        THEN (CAST(:techs AS int[]))[1 + floor(random() * cardinality(CAST(:techs AS int[])))::int] END,
+                   CASE WHEN s <> 'EN_ATTENTE_ANALYSE'
+                        THEN (CAST(:secretaries AS int[]))[1 + floor(random() * cardinality(CAST(:secretaries AS int[])))::int] END,
+                   nullif((CAST(:agencies AS text[]))[u], ''),
+                   created_at,
+                   CASE WHEN s <> 'EN_ATTENTE_ANALYSE' THEN created_at + assign_delay END,
+                   CASE WHEN s IN ('RESOLU', 'CLOTURE') THEN created_at + assign_delay + resolve_delay END,
+                   CASE WHEN s = 'CLOTURE' THEN created_at + assign_delay + resolve_delay + interval '1 day' END,
+                   CASE WHEN s = 'CLOTURE' AND random() < 0.6 THEN 2 + floor(random() * 4)::int END,
+                   0
+            FROM (
+                SELECT g, r, p, s,
+                       1 + floor(random() * cardinality(CAST(:creators AS int[])))::int AS u,
+                       1 + floor(random() * cardinality(CAST(:categories AS text[])))::int AS c,
+                       -- Tickets ouverts récents, tickets résolus ou clôturés répartis sur 3 ans
+                       CASE WHEN s IN ('RESOLU', 'CLOTURE') THEN now() - interval '2 days' - random() * interval '3 years'
+                            ELSE now() - random() * interval '30 days' END AS created_at,
+                       random() * interval '4 hours' AS assign_delay,
+                       random() * interval '3 days' AS resolve_delay
+                FROM (
+                    SELECT g, r, random() AS p,
+                           CASE WHEN r < 0.70 THEN 'CLOTURE' WHEN r < 0.80 THEN 'RESOLU' WHEN r < 0.88 THEN 'EN_COURS'
+                                WHEN r < 0.93 THEN 'ASSIGNE_TECHNICIEN' WHEN r < 0.98 THEN 'EN_ATTENTE_ANALYSE'
+                                ELSE 'REJETE' END AS s
+                    FROM (SELECT g, random() AS r FROM generate_series(:start, :end) g) draws
+                ) statuses
+            ) tickets_plan
+        """), {**params, "start": start, "end": min(start + BATCH_SIZE - 1, count)})
+        conn.commit()
+        print(f"  tickets {min(start + BATCH_SIZE - 1, count)}/{count} ({time.perf_counter() - started:.1f} s)")
+
+
+def load_test_ticket_range(conn) -> tuple:
+    first, last, count = conn.execute(text(f"""
+        SELECT min(id), max(id), count(*) FROM tickets WHERE id IN ({LOAD_TEST_TICKETS})
+    """)).one()
+    if count and last - first + 1 != count:
+        raise RuntimeError("Identifiants des tickets de charge non contigus : utiliser une base dédiée")
+    return first, last, count
+
+
+def seed_history(conn, rows: int) -> None:
+    first, last, tickets = load_test_ticket_range(conn)
+    per_ticket = max(1, round(rows / tickets))
+    batch_tickets = max(1, BATCH_SIZE // per_ticket)
+    for start in range(first, last + 1, batch_tickets):
+        conn.execute(text("""
+            INSERT INTO ticket_history (ticket_id, old_status, new_status, user_id, reason, changed_at)
+            SELECT t.id,
+                   CASE WHEN k > 1 THEN CAST((CAST(:lifecycle AS text[]))[1 + (k - 2) % 5] AS ticketstatus) END,
+                   CAST((CAST(:lifecycle AS text[]))[1 + (k - 1) % 5] AS ticketstatus),
+                   CASE (k - 1) % 5 WHEN 0 THEN t.creator_id WHEN 1 THEN coalesce(t.secretary_id, t.creator_id)
+                        ELSE coalesce(t.technician_id, t.creator_id) END,
+                   NULL,
+                   t.created_at + (k - 1) * interval '6 hours'
+            FROM tickets t CROSS JOIN generate_series(1, :per_ticket) k
+            WHERE t.id BETWEEN :start AND :end
+        """), {"lifecycle": LIFECYCLE, "per_ticket": per_ticket, "start": start,
+               "end": min(start + batch_tickets - 1, last)})
+        conn.commit()
+        print(f"  historique : tickets {min(start + batch_tickets, last + 1) - first}/{tickets}")
+
+
+def seed_notifications(conn, count: int) -> None:
+    first, last, _ = load_test_ticket_range(conn)
+    staff = []
+    for prefix in ("secretary", "adjoint", "dsi", "admin"):
+        staff += user_ids(conn, prefix)
+    params = {"staff": staff, "techs": user_ids(conn, "tech"), "users": user_ids(conn, "user"),
+              "first": first, "tickets": last - first + 1}
+    for start in range(1, count + 1, BATCH_SIZE):
+        conn.execute(text("""
+            INSERT INTO notifications (user_id, type, ticket_id, message, read, created_at, read_at)
+            SELECT CASE WHEN r < 0.5 THEN (CAST(:staff AS int[]))[1 + floor(random() * cardinality(CAST(:staff AS int[])))::int]
+                        WHEN r < 0.8 THEN (CAST(:techs AS int[]))[1 + floor(random() * cardinality(CAST(:techs AS int[])))::int]
+                        ELSE (CAST(:users AS int[]))[1 + floor(random() * cardinality(CAST(:users AS int[])))::int] END,
+                   CAST(CASE WHEN r < 0.5 THEN 'NOUVEAU_TICKET' WHEN r < 0.8 THEN 'ASSIGNATION'
+                        ELSE (ARRAY['TICKET_EN_COURS', 'TICKET_RESOLU', 'TICKET_CLOTURE'])[1 + g % 3] END
+                        AS notificationtype),
+                   ticket_id,
+                   'Ticket #' || ticket_id || ' : notification générée pour les tests de charge',
+                   NOT unread, created_at,
+                   CASE WHEN NOT unread THEN created_at + interval '1 hour' END
+            FROM (
+                SELECT g, random() AS r, random() < 0.1 AS unread,
+                       :first + floor(random() * :tickets)::int AS ticket_id,
+                       now() - random() * interval '3 years' AS created_at
+                FROM generate_series(:start, :end) g
+            ) notifications_plan
+        """), {**params, "start": start, "end": min(start + BATCH_SIZE - 1, count)})
+        conn.commit()
+        print(f"  notifications {min(start + BATCH_SIZE - 1, count)}/{count}")
+
+
+def rebuild_rollup() -> None:
+    db = SessionLocal()
+    try:
+        db.execute(text("SET statement_timeout = 0"))
+        print(f"OK - {rebuild_daily_stats(db)} lignes d'agrégats journaliers")
+    finally:
+        db.close()
+
+
+def drop(conn) -> None:
+    """Supprime les données de charge (et ce qui s'y rattache)"""
+    for label, statement in [
+        ("notifications", f"DELETE FROM notifications WHERE user_id IN ({LOAD_TEST_USERS}) OR ticket_id IN ({LOAD_TEST_TICKETS})"),
+        ("historique", f"DELETE FROM ticket_history WHERE ticket_id IN ({LOAD_TEST_TICKETS}) OR user_id IN ({LOAD_TEST_USERS})"),
+        ("commentaires", f"DELETE FROM comments WHERE ticket_id IN ({LOAD_TEST_TICKETS}) OR user_id IN ({LOAD_TEST_USERS})"),
+        ("tickets", f"DELETE FROM tickets WHERE creator_id IN ({LOAD_TEST_USERS})"),
+        ("rapports", f"DELETE FROM reports WHERE creator_id IN ({LOAD_TEST_USERS})"),
+        ("utilisateurs", f"DELETE FROM users WHERE id IN ({LOAD_TEST_USERS})"),
+    ]:
+        deleted = conn.execute(text(statement)).rowcount
+        conn.commit()
+        print(f"OK - {deleted} {label} supprimé(s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Jeu de données de charge (benchmark_dashboards.py)")
+    parser.add_argument("--scale", type=float, default=1.0, help="facteur appliqué à tous les volumes")
+    parser.add_argument("--drop", action="store_true", help="supprimer les données de charge")
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        conn.execute(text("SET statement_timeout = 0"))
+        if args.drop:
+            drop(conn)
+            rebuild_rollup()
+            return
+        if conn.execute(text(f"SELECT EXISTS ({LOAD_TEST_USERS})")).scalar():
+            print("ERREUR: des données de charge existent déjà (python seed_load_test.py --drop pour les supprimer)")
+            return
+
+        started = time.perf_counter()
+        seed_users(conn, args.scale)
+        conn.commit()
+        print(f"Tickets ({scaled(TICKETS, args.scale)})...")
+        seed_tickets(conn, scaled(TICKETS, args.scale))
+        print(f"Historique (~{scaled(HISTORY_ROWS, args.scale)} lignes)...")
+        seed_history(conn, scaled(HISTORY_ROWS, args.scale))
+        print(f"Notifications ({scaled(NOTIFICATIONS, args.scale)})...")
+        seed_notifications(conn, scaled(NOTIFICATIONS, args.scale))
+        for table in ("users", "tickets", "ticket_history", "notifications"):
+            conn.execute(text(f"ANALYZE {table}"))
+        conn.commit()
+    rebuild_rollup()
+    print(f"OK - Données de charge créées en {time.perf_counter() - started:.0f} s "
+          f"(mot de passe des comptes {LOAD_TEST_PREFIX}* : {LOAD_TEST_PASSWORD})")
+
+
+if __name__ == "__main__":
+    main()
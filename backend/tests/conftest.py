@@ -0,0 +1,83 @@
+"""
+Configuration des tests : base PostgreSQL dédiée (TEST_POSTGRES_DB, tickets_test par défaut)
+
+Les tables sont recréées à chaque session de tests (init_db.py : rôles, types et catégories), puis
+peuplées par le jeu de données fixe de check_query_budgets.py. Les tests sont ignorés si la base
+de test n'est pas joignable. Aucun email n'est envoyé.
+"""
+import os
+
+TEST_POSTGRES_DB = os.getenv("TEST_POSTGRES_DB", "tickets_test")
+if TEST_POSTGRES_DB == os.getenv("POSTGRES_DB", "tickets_db"):
+    raise RuntimeError("TEST_POSTGRES_DB doit désigner une base dédiée : ses tables sont recréées par les tests")
+# Avant tout import de app : la connexion est configurée à l'import de app.database
+os.environ["POSTGRES_DB"] = TEST_POSTGRES_DB
+os.environ["QUERY_STATS_DEBUG"] = "true"
+os.environ["EMAIL_ENABLED"] = "false"
+os.environ["METRICS_TOKEN"] = ""
+os.environ["METRICS_PUBLIC"] = "true"
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app import query_stats
+from app.database import Base, SessionLocal, engine
+
+
+@pytest.fixture(scope="session")
+def database():
+    """Schéma recréé et données de référence (rôles, types et catégories de tickets)"""
+    from init_db import init_roles, init_ticket_types_and_categories
+
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except OperationalError as e:
+        pytest.skip(f"Base de test {TEST_POSTGRES_DB} indisponible : {e.orig}")
+
+    with engine.connect() as conn:
+        try:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            conn.commit()
+        except Exception:
+            # Sans pg_trgm, la détection des doublons ne signale rien (voir routers/tickets.py)
+            conn.rollback()
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        init_roles(db)
+        init_ticket_types_and_categories(db)
+    finally:
+        db.close()
+    yield engine
+
+
+@pytest.fixture(scope="session")
+def client(database):
+    from app.main import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def db(database):
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def assert_max_queries():
+    """
+    Budget de requêtes SQL d'un bloc de code applicatif (app/query_stats.py)
+
+        with assert_max_queries(4, "list_technicians"):
+            list_technicians(db=db, current_user=admin)
+    """
+    return query_stats.assert_max_queries
@@ -0,0 +1,52 @@
+"""
+Exports de tickets (app/exports.py) : un texte saisi par un utilisateur n'est jamais exporté comme formule
+"""
+import csv
+import io
+import uuid
+
+import pytest
+from openpyxl import load_workbook
+from sqlalchemy import func
+
+from app import models
+from app.exports import EXPORT_COLUMNS, iter_csv, iter_xlsx
+from check_query_budgets import get_or_create_user
+
+FORMULA_TITLES = ["=1+1", "+1+1", "-1+1", "@SUM(A1:A2)", "=HYPERLINK(\"http://exemple.invalid\",\"Cliquez\")"]
+
+
+@pytest.fixture
+def formula_tickets(db):
+    creator = get_or_create_user(db, "export_user", "Utilisateur", "Export Utilisateur")
+    number = db.query(func.max(models.Ticket.number)).scalar() or 0
+    tickets = []
+    for offset, title in enumerate(FORMULA_TITLES, start=1):
+        ticket = models.Ticket(
+            number=number + offset,
+            title=title,
+            description=f"Export {uuid.uuid4().hex}",
+            type=models.TicketType.APPLICATIF,
+            priority=models.TicketPriority.FAIBLE,
+            status=models.TicketStatus.EN_ATTENTE_ANALYSE,
+            creator_id=creator.id,
+        )
+        db.add(ticket)
+        tickets.append(ticket)
+    db.commit()
+    return [models.Ticket.id.in_([ticket.id for ticket in tickets])]
+
+
+def test_csv_export_escapes_formulas(formula_tickets):
+    content = b"".join(iter_csv(formula_tickets)).decode("utf-8-sig")
+    rows = list(csv.DictReader(io.StringIO(content)))
+    assert [row["title"] for row in rows] == ["'" + title for title in FORMULA_TITLES]
+
+
+def test_xlsx_export_writes_formulas_as_text(formula_tickets):
+    workbook = load_workbook(io.BytesIO(b"".join(iter_xlsx(formula_tickets))))
+    sheet = workbook.worksheets[0]
+    title_column = EXPORT_COLUMNS.index("title") + 1
+    cells = [sheet.cell(row=row, column=title_column) for row in range(2, sheet.max_row + 1)]
+    assert [cell.value for cell in cells] == FORMULA_TITLES
+    assert {cell.data_type for cell in cells} == {"s"}
@@ -0,0 +1,154 @@
+"""
+Budgets de requêtes SQL par route (QUERY_BUDGETS dans app/query_stats.py)
+
+Le parcours de check_query_budgets.py est exécuté sur le jeu de données fixe, puis une seconde fois
+après avoir multiplié membres de la DSI, techniciens et tickets : chaque route doit respecter son
+budget dans les deux cas, un budget ne dépend pas du contenu des tables.
+"""
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import BackgroundTasks
+from fastapi.routing import APIRoute
+from sqlalchemy import func
+
+from app import models, schemas
+from app.database import SessionLocal
+from app.main import app
+from app.query_stats import QUERY_BUDGETS, track_queries
+from app.routers.tickets import create_ticket
+from app.routers.users import get_technician_stats, list_all_users, list_technicians
+from check_query_budgets import BudgetRun, get_or_create_user, seed
+
+GROWTH = 20  # Utilisateurs et tickets ajoutés par grow_dataset
+
+
+def grow_dataset(db, ids: dict) -> None:
+    """Ajoute des membres de la DSI, des techniciens chargés et des tickets résolus au technicien des statistiques"""
+    prefix = f"qb_growth_{uuid.uuid4().hex[:6]}"
+    now = datetime.utcnow()
+    number = db.query(func.max(models.Ticket.number)).scalar() or 0
+    for i in range(GROWTH):
+        get_or_create_user(db, f"{prefix}_dsi{i}", "DSI", f"Croissance DSI {i}")
+        technician = get_or_create_user(
+            db, f"{prefix}_tech{i}", "Technicien", f"Croissance Technicien {i}", specialization="applicatif"
+        )
+        for technician_id, status in (
+            (technician.id, models.TicketStatus.EN_COURS),
+            (ids["stats_technician"], models.TicketStatus.RESOLU),
+        ):
+            number += 1
+            ticket = models.Ticket(
+                number=number,
+                title=f"Croissance {prefix} {number}",
+                description="Ticket ajouté par grow_dataset",
+                type=models.TicketType.APPLICATIF,
+                priority=models.TicketPriority.FAIBLE,
+                status=status,
+                creator_id=ids["user"],
+                technician_id=technician_id,
+                created_at=now - timedelta(days=5),
+                assigned_at=now - timedelta(days=5, hours=-1),
+                resolved_at=now - timedelta(days=1) if status == models.TicketStatus.RESOLU else None,
+            )
+            db.add(ticket)
+            db.flush()
+            db.add(models.TicketHistory(
+                ticket_id=ticket.id,
+                old_status=models.TicketStatus.ASSIGNE_TECHNICIEN,
+                new_status=models.TicketStatus.EN_COURS,
+                user_id=technician_id,
+                changed_at=now - timedelta(days=4),
+            ))
+    db.commit()
+
+
+@pytest.fixture(scope="session")
+def budget_ids(client):
+    return seed()
+
+
+@pytest.fixture(scope="session")
+def budget_runs(client, budget_ids):
+    """Parcours complet sur le jeu de données fixe, puis sur le jeu de données agrandi"""
+    runs = []
+    for grow in (False, True):
+        if grow:
+            db = SessionLocal()
+            try:
+                grow_dataset(db, budget_ids)
+            finally:
+                db.close()
+        run = BudgetRun(client, budget_ids)
+        run.run()
+        runs.append(run)
+    return runs
+
+
+def test_scenario_statuses(budget_runs):
+    errors = [error for run in budget_runs for error in run.errors]
+    assert not errors, "\n".join(errors)
+
+
+def test_every_route_has_budget():
+    routes = {
+        (method, route.path)
+        for route in app.routes if isinstance(route, APIRoute)
+        for method in route.methods
+    }
+    assert sorted(routes - set(QUERY_BUDGETS)) == [], "routes sans budget dans QUERY_BUDGETS"
+    assert sorted(set(QUERY_BUDGETS) - routes) == [], "budgets sans route"
+
+
+@pytest.mark.parametrize("method, route", sorted(QUERY_BUDGETS))
+def test_route_within_budget(budget_runs, method, route):
+    budget = QUERY_BUDGETS[(method, route)]
+    for dataset, run in zip(("fixe", "agrandi"), budget_runs):
+        count = run.measured.get((method, route))
+        assert count is not None, f"{method} {route} : route non appelée par le parcours"
+        assert count <= budget, (
+            f"{method} {route} : {count} requêtes SQL pour un budget de {budget} (jeu de données {dataset})"
+        )
+
+
+def test_list_routes_do_not_scale_with_data(db, budget_ids, assert_max_queries):
+    """Même nombre de requêtes avant et après l'ajout d'utilisateurs et de tickets (appels directs)"""
+    user = db.get(models.User, budget_ids["user"])
+    admin = db.get(models.User, budget_ids["admin"])
+
+    calls = {
+        "create_ticket": lambda: create_ticket(
+            ticket_in=schemas.TicketCreate(
+                title=f"Écran noir {uuid.uuid4().hex}", description="Écran noir au démarrage",
+                type=models.TicketType.MATERIEL, priority=models.TicketPriority.MOYENNE,
+            ),
+            background_tasks=BackgroundTasks(),
+            db=db,
+            current_user=user,
+        ),
+        "list_technicians": lambda: list_technicians(db=db, current_user=admin),
+        "get_technician_stats": lambda: get_technician_stats(
+            technician_id=budget_ids["stats_technician"], db=db, current_user=admin
+        ),
+        "list_all_users": lambda: list_all_users(db=db, current_user=admin),
+    }
+
+    before = {}
+    for name, call in calls.items():
+        # Utilisateurs authentifiés rechargés hors du bloc mesuré, comme par get_current_user
+        db.expire_all()
+        db.refresh(user)
+        db.refresh(admin)
+        with track_queries() as stats:
+            call()
+        before[name] = stats.count
+
+    grow_dataset(db, budget_ids)
+
+    for name, call in calls.items():
+        db.expire_all()
+        db.refresh(user)
+        db.refresh(admin)
+        with assert_max_queries(before[name], name):
+            call()
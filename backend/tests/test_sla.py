@@ -0,0 +1,79 @@
+"""
+Moteur SLA (app/sla.py) : alertes émises à nouveau quand une échéance est recalculée ou un ticket réouvert
+"""
+import pytest
+from sqlalchemy import func
+
+import app.main  # noqa: F401 - enregistre le listener before_flush du moteur SLA
+from app import models
+from app.sla import (
+    SLA_RESOLUTION_BREACH,
+    SLA_RESOLUTION_WARNING,
+    SLA_RESPONSE_BREACH,
+    SLA_RESPONSE_WARNING,
+)
+from check_query_budgets import get_or_create_user
+
+ALL_SLA_BITS = SLA_RESPONSE_WARNING | SLA_RESPONSE_BREACH | SLA_RESOLUTION_WARNING | SLA_RESOLUTION_BREACH
+
+
+@pytest.fixture
+def ticket(db):
+    creator = get_or_create_user(db, "sla_user", "Utilisateur", "SLA Utilisateur")
+    ticket = models.Ticket(
+        number=(db.query(func.max(models.Ticket.number)).scalar() or 0) + 1,
+        title="Imprimante hors service",
+        description="Échéances SLA",
+        type=models.TicketType.MATERIEL,
+        priority=models.TicketPriority.FAIBLE,
+        status=models.TicketStatus.EN_ATTENTE_ANALYSE,
+        creator_id=creator.id,
+    )
+    db.add(ticket)
+    db.commit()
+    return ticket
+
+
+def test_priority_change_resets_notified_alerts(db, ticket):
+    ticket.sla_notified = ALL_SLA_BITS
+    db.commit()
+    response_due_at = ticket.sla_response_due_at
+
+    ticket.priority = models.TicketPriority.CRITIQUE
+    db.commit()
+
+    assert ticket.sla_response_due_at < response_due_at
+    assert ticket.sla_notified == 0
+    assert ticket.sla_next_check_at is not None
+
+
+def test_unchanged_deadlines_keep_notified_alerts(db, ticket):
+    ticket.sla_notified = ALL_SLA_BITS
+    ticket.status = models.TicketStatus.ASSIGNE_TECHNICIEN
+    db.commit()
+
+    assert ticket.sla_notified == ALL_SLA_BITS
+
+
+def test_reopen_resets_resolution_alerts(db, ticket):
+    ticket.status = models.TicketStatus.RESOLU
+    ticket.sla_notified = ALL_SLA_BITS
+    db.commit()
+    assert ticket.sla_next_check_at is None
+
+    ticket.status = models.TicketStatus.EN_COURS
+    db.commit()
+
+    assert ticket.sla_notified == SLA_RESPONSE_WARNING | SLA_RESPONSE_BREACH
+    assert ticket.sla_next_check_at is not None
+
+
+def test_reopen_to_analysis_resets_response_alerts(db, ticket):
+    ticket.status = models.TicketStatus.CLOTURE
+    ticket.sla_notified = ALL_SLA_BITS
+    db.commit()
+
+    ticket.status = models.TicketStatus.EN_ATTENTE_ANALYSE
+    db.commit()
+
+    assert ticket.sla_notified == 0
@@ -2108,7 +2108,7 @@ function DSIDashboard({ token }: DSIDashboardProps) {
 
   async function loadTicketDetails(ticketId: string) {
     try {
-      const res = await fetch(`http://localhost:8000/tickets/${ticketId}`, {
+      const res = await fetch(`http://localhost:8000/tickets/${ticketId}/full?comments_limit=200`, {
         headers: {
           Authorization: `Bearer ${token}`,
         },
@@ -2116,8 +2116,8 @@ function DSIDashboard({ token }: DSIDashboardProps) {
       if (res.ok) {
         const data = await res.json();
         setTicketDetails(data);
-        await loadTicketHistory(ticketId);
-        await loadTicketComments(ticketId);
+        setTicketHistory(Array.isArray(data?.history) ? data.history : []);
+        setTicketComments(Array.isArray(data?.comments?.items) ? data.comments.items : []);
         setViewTicketDetails(ticketId);
       } else {
         alert("Erreur lors du chargement des détails du ticket");
@@ -2129,14 +2129,14 @@ function DSIDashboard({ token }: DSIDashboardProps) {
 
   async function loadTicketComments(ticketId: string) {
     try {
-      const res = await fetch(`http://localhost:8000/tickets/${ticketId}/comments`, {
+      const res = await fetch(`http://localhost:8000/tickets/${ticketId}/comments?limit=200`, {
         headers: {
           Authorization: `Bearer ${token}`,
         },
       });
       if (res.ok) {
         const data = await res.json();
-        setTicketComments(Array.isArray(data) ? data : []);
+        setTicketComments(Array.isArray(data?.items) ? data.items : []);
       } else {
         setTicketComments([]);
       }